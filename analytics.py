@@ -0,0 +1,230 @@
+# 学情分析汇总表的增量维护与读取
+#
+# WrongQuestion / Task / PracticeHistory 的 ORM 增删改在同一事务内同步更新汇总表
+# （StudentTopicStat、StudentTaskStat、StudentWeeklyPractice），页面只读取按学生预聚合的行。
+# 更新在 before_update 中处理，此时 UPDATE 尚未执行，可以读到原行。
+# 错题的知识点在录入时解析一次并保存在 WrongQuestion.topic，增减都按该列计数，题库之后的变化不会造成偏差。
+# 批量 Query.update/delete 与 Core 语句不会触发 ORM 事件，可用 flask rebuild-analytics 全量重算修正偏差。
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, event, func, insert, select, update
+from sqlalchemy.orm.attributes import get_history
+
+from exts import db
+from models import (PracticeHistory, Question, StudentTaskStat, StudentTopicStat, StudentWeeklyPractice, Task,
+                    WrongQuestion, upsert_increment, week_start)
+
+UNCATEGORIZED_TOPIC = '未分类'
+
+
+def _old_values(connection, target, keys):
+    """在 before_update 中取更新前的值；相关字段都未修改时返回 None
+
+    提交后属性已过期，再赋值时不会加载旧值（history.deleted 为空），因此直接从数据库读取原行
+    """
+    if not any(get_history(target, key).has_changes() for key in keys):
+        return None
+    table = target.__table__
+    return tuple(connection.execute(
+        select(*[table.c[key] for key in keys]).where(table.c.id == target.id)
+    ).one())
+
+
+def _topic_for(connection, question_text):
+    # 按题目内容对应到题库中的知识点（ix_questions_question_text）
+    if not question_text:
+        return UNCATEGORIZED_TOPIC
+    topic = connection.execute(
+        select(func.min(Question.topic)).where(Question.question_text == question_text)
+    ).scalar()
+    return topic or UNCATEGORIZED_TOPIC
+
+
+def _add_wrong(connection, student_id, topic, delta):
+    if student_id is None:
+        return
+    upsert_increment(connection, StudentTopicStat.__table__,
+                     {'student_id': student_id, 'topic': topic or UNCATEGORIZED_TOPIC},
+                     {'wrong_count': delta})
+
+
+def _add_task(connection, student_id, completed, delta):
+    if student_id is None:
+        return
+    upsert_increment(connection, StudentTaskStat.__table__, {'student_id': student_id},
+                     {'task_count': delta, 'completed_count': delta if completed else 0})
+
+
+def _add_practice(connection, student_id, day, delta):
+    if student_id is None or day is None or not delta:
+        return
+    upsert_increment(connection, StudentWeeklyPractice.__table__,
+                     {'student_id': student_id, 'week_start': week_start(day)}, {'count': delta})
+
+
+@event.listens_for(WrongQuestion, 'before_insert')
+def _wrong_question_resolve_topic(mapper, connection, target):
+    if target.topic is None:
+        target.topic = _topic_for(connection, target.question_text)
+
+
+@event.listens_for(WrongQuestion, 'after_insert')
+def _wrong_question_inserted(mapper, connection, target):
+    _add_wrong(connection, target.student_id, target.topic, 1)
+
+
+@event.listens_for(WrongQuestion, 'after_delete')
+def _wrong_question_deleted(mapper, connection, target):
+    _add_wrong(connection, target.student_id, target.topic, -1)
+
+
+@event.listens_for(WrongQuestion, 'before_update')
+def _wrong_question_updated(mapper, connection, target):
+    old = _old_values(connection, target, ('student_id', 'question_text', 'topic'))
+    if old is None:
+        return
+    # 修改了题目内容而没有显式指定知识点时，按新内容重新解析
+    if old[1] != target.question_text and not get_history(target, 'topic').has_changes():
+        target.topic = _topic_for(connection, target.question_text)
+    if (old[0], old[2] or UNCATEGORIZED_TOPIC) != (target.student_id, target.topic or UNCATEGORIZED_TOPIC):
+        _add_wrong(connection, old[0], old[2], -1)
+        _add_wrong(connection, target.student_id, target.topic, 1)
+
+
+@event.listens_for(Task, 'after_insert')
+def _task_inserted(mapper, connection, target):
+    _add_task(connection, target.student_id, target.completed, 1)
+
+
+@event.listens_for(Task, 'after_delete')
+def _task_deleted(mapper, connection, target):
+    _add_task(connection, target.student_id, target.completed, -1)
+
+
+@event.listens_for(Task, 'before_update')
+def _task_updated(mapper, connection, target):
+    old = _old_values(connection, target, ('student_id', 'completed'))
+    if old is not None and (old[0], bool(old[1])) != (target.student_id, bool(target.completed)):
+        _add_task(connection, old[0], old[1], -1)
+        _add_task(connection, target.student_id, target.completed, 1)
+
+
+@event.listens_for(PracticeHistory, 'after_insert')
+def _practice_inserted(mapper, connection, target):
+    _add_practice(connection, target.student_id, target.date, target.count or 0)
+
+
+@event.listens_for(PracticeHistory, 'after_delete')
+def _practice_deleted(mapper, connection, target):
+    _add_practice(connection, target.student_id, target.date, -(target.count or 0))
+
+
+@event.listens_for(PracticeHistory, 'before_update')
+def _practice_updated(mapper, connection, target):
+    old = _old_values(connection, target, ('student_id', 'date', 'count'))
+    if old is not None:
+        _add_practice(connection, old[0], old[1], -(old[2] or 0))
+        _add_practice(connection, target.student_id, target.date, target.count or 0)
+
+
+def resolve_missing_topics() -> int:
+    """为没有知识点的错题（批量写入、旧数据）按题目内容补上知识点，返回更新的行数"""
+    bank_topic = select(func.min(Question.topic)) \
+        .where(Question.question_text == WrongQuestion.question_text).scalar_subquery()
+    return db.session.execute(
+        update(WrongQuestion).where(WrongQuestion.topic.is_(None))
+        .values(topic=func.coalesce(bank_topic, UNCATEGORIZED_TOPIC))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def rebuild_summaries() -> Dict[str, int]:
+    """从明细表全量重算三张汇总表，返回各表行数；错题按已保存的知识点统计，缺失的先补上"""
+    session = db.session
+    resolve_missing_topics()
+    for model in (StudentTopicStat, StudentTaskStat, StudentWeeklyPractice):
+        session.execute(model.__table__.delete())
+
+    session.execute(insert(StudentTopicStat).from_select(
+        ['student_id', 'topic', 'wrong_count'],
+        select(WrongQuestion.student_id, WrongQuestion.topic, func.count(WrongQuestion.id))
+        .group_by(WrongQuestion.student_id, WrongQuestion.topic)
+    ))
+
+    session.execute(insert(StudentTaskStat).from_select(
+        ['student_id', 'task_count', 'completed_count'],
+        select(Task.student_id, func.count(Task.id), func.sum(case((Task.completed.is_(True), 1), else_=0)))
+        .group_by(Task.student_id)
+    ))
+
+    # 各数据库计算周起始日的函数不同，按天聚合后在内存中归并到周
+    weekly = defaultdict(int)
+    rows = session.execute(
+        select(PracticeHistory.student_id, PracticeHistory.date, func.sum(PracticeHistory.count))
+        .where(PracticeHistory.student_id.isnot(None), PracticeHistory.date.isnot(None))
+        .group_by(PracticeHistory.student_id, PracticeHistory.date)
+    )
+    for student_id, day, total in rows:
+        weekly[(student_id, week_start(day))] += int(total or 0)
+    if weekly:
+        session.execute(insert(StudentWeeklyPractice), [
+            {'student_id': student_id, 'week_start': start, 'count': count}
+            for (student_id, start), count in weekly.items()
+        ])
+    session.commit()
+
+    return {model.__tablename__: session.query(func.count()).select_from(model).scalar()
+            for model in (StudentTopicStat, StudentTaskStat, StudentWeeklyPractice)}
+
+
+def _filter_students(query, column, student_ids: Optional[Iterable[int]]):
+    return query if student_ids is None else query.filter(column.in_(list(student_ids)))
+
+
+def topic_wrong_counts(student_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, int]]:
+    """{student_id: {知识点: 错题数}}"""
+    query = _filter_students(StudentTopicStat.query.filter(StudentTopicStat.wrong_count > 0),
+                             StudentTopicStat.student_id, student_ids)
+    result = defaultdict(dict)
+    for row in query:
+        result[row.student_id][row.topic] = row.wrong_count
+    return dict(result)
+
+
+def class_topic_totals(student_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+    """全班各知识点的错题总数与涉及人数，按错题数降序"""
+    query = db.session.query(
+        StudentTopicStat.topic,
+        func.sum(StudentTopicStat.wrong_count),
+        func.count(StudentTopicStat.student_id)
+    ).filter(StudentTopicStat.wrong_count > 0)
+    query = _filter_students(query, StudentTopicStat.student_id, student_ids)
+    rows = query.group_by(StudentTopicStat.topic).order_by(func.sum(StudentTopicStat.wrong_count).desc()).all()
+    return [{'topic': topic, 'wrong_count': int(total), 'students': students} for topic, total, students in rows]
+
+
+def task_completion(student_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict]:
+    """{student_id: {"task_count", "completed_count", "completion_rate"}}"""
+    query = _filter_students(StudentTaskStat.query, StudentTaskStat.student_id, student_ids)
+    return {
+        row.student_id: {'task_count': row.task_count, 'completed_count': row.completed_count,
+                         'completion_rate': round(row.completion_rate, 4)}
+        for row in query
+    }
+
+
+def weekly_practice_totals(student_ids: Optional[Iterable[int]] = None, weeks: int = 8) -> Dict:
+    """最近 weeks 周的练习总次数：{"labels": [周一日期...], "data": {student_id: [...]}}，缺失补 0"""
+    current = week_start(PracticeHistory._today())
+    starts = [current - timedelta(weeks=i) for i in range(weeks - 1, -1, -1)]
+    query = StudentWeeklyPractice.query.filter(StudentWeeklyPractice.week_start >= starts[0])
+    query = _filter_students(query, StudentWeeklyPractice.student_id, student_ids)
+
+    counts = {(row.student_id, row.week_start): row.count for row in query}
+    ids = list(student_ids) if student_ids is not None else sorted({key[0] for key in counts})
+    return {
+        'labels': [start.strftime('%m-%d') for start in starts],
+        'data': {student_id: [counts.get((student_id, start), 0) for start in starts] for student_id in ids},
+    }
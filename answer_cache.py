@@ -0,0 +1,177 @@
+# 大模型回答的语义缓存：问题向量与历史问题的余弦相似度超过阈值时直接返回已有回答
+#
+# 问题用 BookImporter 的同一个模型编码，存入一个小的 faiss 内积索引；
+# 每条缓存记录生成回答时引用的 contents id，教材重新导入（旧内容被删除）后对应缓存失效。
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from lazy_import import lazy_import
+
+faiss = lazy_import("faiss")
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    content_ids: List[int]
+    created_at: float = field(default_factory=time.monotonic)
+    hits: int = 0
+
+
+class SemanticAnswerCache:
+    """容量有界（LRU 淘汰）、带 TTL 的语义回答缓存；线程安全"""
+
+    def __init__(self, importer, threshold: float = 0.92, max_size: int = 2048, ttl: Optional[float] = 86400):
+        self.importer = importer
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._index = None
+        self._entries = OrderedDict()
+        # content id -> 引用它的缓存 id，用于按内容批量失效
+        self._by_content = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        importer.removal_listeners.append(self.invalidate_contents)
+
+    @classmethod
+    def from_config(cls, importer) -> "SemanticAnswerCache":
+        import config
+        return cls(importer, config.ANSWER_CACHE_THRESHOLD, config.ANSWER_CACHE_SIZE, config.ANSWER_CACHE_TTL)
+
+    def _embed(self, question: str) -> np.ndarray:
+        # 归一化后内积即余弦相似度
+        vector = self.importer._encode_queries([question])
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _expired(self, entry: CachedAnswer) -> bool:
+        return self.ttl is not None and time.monotonic() - entry.created_at > self.ttl
+
+    def _remove(self, entry_ids: List[int]):
+        entry_ids = [entry_id for entry_id in entry_ids if entry_id in self._entries]
+        if not entry_ids:
+            return
+        for entry_id in entry_ids:
+            entry = self._entries.pop(entry_id)
+            for content_id in entry.content_ids:
+                refs = self._by_content.get(content_id)
+                if refs is not None:
+                    refs.discard(entry_id)
+                    if not refs:
+                        del self._by_content[content_id]
+        self._index.remove_ids(np.array(entry_ids, dtype=np.int64))
+
+    def get(self, question: str) -> Optional[CachedAnswer]:
+        """返回相似度超过阈值的缓存回答；过期或引用内容已不存在的记录顺带清除"""
+        with self._lock:
+            if self._index is None or not self._entries:
+                self.misses += 1
+                return None
+        vector = self._embed(question)
+        with self._lock:
+            similarities, ids = self._index.search(vector, 1)
+            entry_id = int(ids[0][0])
+            entry = self._entries.get(entry_id)
+            if entry is None or similarities[0][0] < self.threshold:
+                self.misses += 1
+                return None
+            if self._expired(entry):
+                self._remove([entry_id])
+                self.misses += 1
+                return None
+        # 教材可能由其他进程重新导入，命中时再确认引用的内容仍然存在（content id 不会复用）
+        if len(self.importer.db.existing_content_ids(entry.content_ids)) != len(entry.content_ids):
+            with self._lock:
+                self._remove([entry_id])
+                self.misses += 1
+            return None
+        with self._lock:
+            if entry_id in self._entries:
+                self._entries.move_to_end(entry_id)
+            entry.hits += 1
+            self.hits += 1
+        return entry
+
+    def put(self, question: str, answer: str, content_ids: List[int]):
+        if self.max_size <= 0 or not answer:
+            return
+        vector = self._embed(question)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            content_ids = sorted(set(int(cid) for cid in content_ids))
+            self._entries[entry_id] = CachedAnswer(question, answer, content_ids)
+            for content_id in content_ids:
+                self._by_content.setdefault(content_id, set()).add(entry_id)
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+
+            # 先清除过期记录，仍超出容量时按最近最少使用淘汰
+            stale = {eid for eid, entry in self._entries.items() if self._expired(entry)}
+            overflow = len(self._entries) - len(stale) - self.max_size
+            for eid in self._entries:
+                if overflow <= 0:
+                    break
+                if eid not in stale:
+                    stale.add(eid)
+                    overflow -= 1
+            self._remove(list(stale))
+
+    def invalidate_contents(self, content_ids: List[int]) -> int:
+        """使引用了这些内容的缓存全部失效，返回失效条数"""
+        with self._lock:
+            entry_ids = set()
+            for content_id in content_ids:
+                entry_ids.update(self._by_content.get(int(content_id), ()))
+            self._remove(list(entry_ids))
+        return len(entry_ids)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_content.clear()
+            if self._index is not None:
+                self._index.reset()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """知识库就绪后返回进程内共享的回答缓存，未就绪时返回 None（不使用缓存）"""
+    global _answer_cache
+    if _answer_cache is None:
+        import knowledge_base
+        try:
+            searcher = knowledge_base.get_searcher(timeout=0)
+        except knowledge_base.KnowledgeBaseNotReady:
+            return None
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = SemanticAnswerCache.from_config(searcher.importer)
+    return _answer_cache
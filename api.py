@@ -0,0 +1,70 @@
+# 错题本、任务列表、题库浏览的 JSON 分页接口（游标分页，见 pagination.py）
+from flask import Blueprint, g, jsonify, request
+
+from models import Question, Student, Task, Teacher, WrongQuestion
+from pagination import InvalidCursor, keyset_page, parse_limit
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+
+class ApiError(Exception):
+    """由 errorhandler 转为 {'error': ...} 响应"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _target_student_id():
+    """学生只能查看自己的数据；教师通过 ?student_id= 指定学生，未指定时返回 400"""
+    if isinstance(g.user, Student):
+        return g.user.id
+    if isinstance(g.user, Teacher):
+        student_id = request.args.get('student_id', type=int)
+        if student_id is None:
+            raise ApiError('请通过 student_id 参数指定学生')
+        return student_id
+    raise ApiError('请先登录', 401)
+
+
+@bp.errorhandler(ApiError)
+def api_error(e):
+    return jsonify({'error': str(e)}), e.status
+
+
+@bp.errorhandler(InvalidCursor)
+def invalid_cursor(e):
+    return jsonify({'error': str(e)}), 400
+
+
+@bp.route('/wrong-questions')
+def wrong_questions():
+    student_id = _target_student_id()
+    query = WrongQuestion.query.filter(WrongQuestion.student_id == student_id)
+    page = keyset_page(query, [WrongQuestion.recorded_at, WrongQuestion.id],
+                       request.args.get('cursor'), parse_limit(request.args.get('limit')))
+    return jsonify(page)
+
+
+@bp.route('/tasks')
+def tasks():
+    student_id = _target_student_id()
+    query = Task.query.filter(Task.student_id == student_id)
+    completed = request.args.get('completed')
+    if completed in ('0', '1', 'true', 'false'):
+        query = query.filter(Task.completed == (completed in ('1', 'true')))
+    page = keyset_page(query, [Task.id], request.args.get('cursor'), parse_limit(request.args.get('limit')))
+    return jsonify(page)
+
+
+@bp.route('/questions')
+def questions():
+    if g.user is None:
+        return jsonify({'error': '请先登录'}), 401
+    query = Question.query
+    if request.args.get('topic'):
+        query = query.filter(Question.topic == request.args['topic'])
+    if request.args.get('type'):
+        query = query.filter(Question.type == request.args['type'])
+    page = keyset_page(query, [Question.id], request.args.get('cursor'), parse_limit(request.args.get('limit')))
+    return jsonify(page)
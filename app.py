@@ -1,10 +1,14 @@
-from flask import Flask, render_template, g, session,redirect,url_for,request
-from flask_login import LoginManager
+from flask import Flask, render_template, g, redirect,url_for,request
 
 import os
 from config import *
 from exts import db
 from flask_migrate import Migrate
+import knowledge_base
+import spark_client
+import identity
+import commands
+import metrics
 
 from dotenv import load_dotenv
 
@@ -14,9 +18,7 @@ load_dotenv()  # 加载 .env 文件中的环境变量
 from blueprints.auth import bp as auth_bp
 from blueprints.student import bp as student_bp
 from blueprints.teacher import bp as teacher_bp
-
-# 模型导入
-from models import Student, Teacher
+from api import bp as api_bp
 
 # 初始化 Flask 应用
 app = Flask(__name__)
@@ -33,9 +35,12 @@ app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD
 db.init_app(app)
 migrate = Migrate(app, db)
 
+# 请求/SQL/检索/大模型耗时统计与 /metrics，需先于下面的 before_request 钩子注册
+metrics.init_app(app)
+
 
-login_manager = LoginManager()
-login_manager.init_app(app)
+# flask-login 与 g.user 的身份解析（每个请求只查询一次用户），见 identity.init_app
+login_manager = identity.init_app(app)
 login_manager.login_view = 'auth.login'  # 设置未登录时跳转的视图
 
 
@@ -44,43 +49,17 @@ app.register_blueprint(auth_bp)
 app.register_blueprint(student_bp)
 
 app.register_blueprint(teacher_bp)
+app.register_blueprint(api_bp)
+
+# flask rebuild-analytics 等维护命令；表结构迁移使用 flask db upgrade
+commands.init_app(app)
+
+# 知识库检索器在后台初始化，不阻塞启动；/ready 报告是否就绪
+knowledge_base.init_app(app)
+spark_client.init_app(app)
 
 # 确保上传目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-@login_manager.user_loader
-def load_user(user_id):
-    # 从 session 获取 user_type 来决定加载哪个模型
-    user_type = session.get('user_type')
-
-    if user_type == 'teacher':
-        return Teacher.query.get(int(user_id))
-    elif user_type == 'student':
-        return Student.query.get(int(user_id))
-    else:
-        # 如果没有 user_type，默认尝试加载教师或学生（可选）
-        teacher = Teacher.query.get(int(user_id))
-        if teacher:
-            return teacher
-        return Student.query.get(int(user_id))
-
-
-# 请求前钩子：用户身份绑定到 g 对象
-@app.before_request
-def my_before_request():
-    user_id = session.get("user_id")
-    user_type = session.get("user_type")  # 'teacher' or 'student'
-
-    if user_id and user_type:
-        if user_type == 'teacher':
-            user = Teacher.query.get(user_id)
-        elif user_type == 'student':
-            user = Student.query.get(user_id)
-        else:
-            user = None
-    else:
-        user = None
-
-    g.user = user
 
 @app.route('/')
 def root():
@@ -0,0 +1,324 @@
+# 性能基准测试：检索流水线（解析、导入、建索引、检索）与主要 web 接口
+#
+# 生成指定规模的合成教材与学生数据，在 SQLite 上运行，结果写成 JSON 以便不同提交之间对比。
+#
+# 用法示例：
+#   python benchmark.py --blocks 1000 --students 100 --json bench.json
+#   python benchmark.py --blocks 100000 --students 10000 --index-type ivfpq --skip-web
+#   python benchmark.py --students 100000 --skip-retrieval
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+WORDS = (
+    "tensor gradient layer model training loss optimizer batch epoch keras dataset pipeline "
+    "convolution pooling dropout activation embedding attention transformer sequence recurrent "
+    "regularization overfitting validation accuracy precision recall checkpoint graph eager "
+    "function variable shape broadcast matrix vector derivative backpropagation learning rate "
+    "neuron weight bias softmax sigmoid relu normalization inference deployment serving"
+).split()
+TOPICS = ["张量基础", "自动微分", "Keras 模型", "数据管道", "卷积网络", "循环网络", "模型部署", "优化器"]
+SECTIONS_PER_CHAPTER = 25
+CHAPTERS_PER_BOOK = 10
+# 每个小节为一个标题块 + 一个正文块，另加每章一个标题块
+BLOCKS_PER_BOOK = CHAPTERS_PER_BOOK * (1 + 2 * SECTIONS_PER_CHAPTER)
+
+
+def _sentence(rng, length: int) -> str:
+    return " ".join(WORDS[i] for i in rng.integers(0, len(WORDS), size=length))
+
+
+def _latency_stats(samples_ms) -> dict:
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "count": int(samples.size),
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "max_ms": round(float(samples.max()), 3),
+    }
+
+
+def make_book(rng, book_no: int) -> str:
+    lines = [f"第 {book_no} 册 合成教材", ""]
+    for chapter in range(1, CHAPTERS_PER_BOOK + 1):
+        lines.append(f"# {chapter} {_sentence(rng, 3)}")
+        for section in range(1, SECTIONS_PER_CHAPTER + 1):
+            lines.append(f"## {chapter}.{section} {_sentence(rng, 4)}")
+            lines.append(_sentence(rng, int(rng.integers(40, 120))))
+            lines.append("")
+    return "\n".join(lines)
+
+
+# ---- 检索流水线 ----
+
+def bench_retrieval(workdir: str, blocks: int, queries: int, k: int, index_type: str, seed: int) -> dict:
+    from faiss_indexer import BookContentParser, BookImporter, IndexConfig
+
+    rng = np.random.default_rng(seed)
+    num_books = max(1, -(-blocks // BLOCKS_PER_BOOK))
+    books = [make_book(rng, i) for i in range(num_books)]
+    results = {"books": num_books}
+
+    parser = BookContentParser()
+    start = time.perf_counter()
+    parsed = sum(1 for book in books for _ in parser.iter_book_rows(book.split("\n")))
+    seconds = time.perf_counter() - start
+    results["parse"] = {"blocks": parsed, "seconds": round(seconds, 3),
+                        "blocks_per_second": round(parsed / seconds, 1) if seconds else None}
+
+    defaults = IndexConfig.from_config()
+    index_config = IndexConfig(index_type=index_type, nlist=defaults.nlist, nprobe=defaults.nprobe,
+                               hnsw_m=defaults.hnsw_m, ef_construction=defaults.ef_construction,
+                               ef_search=defaults.ef_search, pq_m=defaults.pq_m, pq_nbits=defaults.pq_nbits)
+    importer = BookImporter(os.path.join(workdir, "books.db"), index_config=index_config)
+    try:
+        start = time.perf_counter()
+        for i, book in enumerate(books):
+            importer.import_book(f"合成教材 {i}", "", book, update_index=False)
+        seconds = time.perf_counter() - start
+        results["import_book"] = {"seconds": round(seconds, 3),
+                                  "blocks_per_second": round(parsed / seconds, 1) if seconds else None}
+
+        start = time.perf_counter()
+        importer.build_faiss_index()
+        results["build_faiss_index"] = {"seconds": round(time.perf_counter() - start, 3),
+                                        "vectors": int(importer.faiss_index.ntotal)}
+
+        # 再次构建时向量全部命中缓存，体现纯建索引的耗时
+        start = time.perf_counter()
+        importer.build_faiss_index(save=False)
+        results["rebuild_faiss_index_cached_embeddings"] = {"seconds": round(time.perf_counter() - start, 3)}
+
+        query_texts = [_sentence(rng, int(rng.integers(3, 10))) for _ in range(queries)]
+        for label, filters in (("search", None), ("search_filtered", {"book_id": 1})):
+            importer.query_embedding_cache.clear()
+            importer.search_result_cache.clear()
+            cold = []
+            for text in query_texts:
+                t0 = time.perf_counter()
+                importer.search_batch([text], k=k, filters=filters)
+                cold.append((time.perf_counter() - t0) * 1000)
+            warm = []
+            for text in query_texts:
+                t0 = time.perf_counter()
+                importer.search_batch([text], k=k, filters=filters)
+                warm.append((time.perf_counter() - t0) * 1000)
+            results[label] = {"cold": _latency_stats(cold), "cached": _latency_stats(warm)}
+
+        start = time.perf_counter()
+        importer.search_batch(query_texts, k=k)
+        results["search_batch"] = {"queries": len(query_texts), "seconds": round(time.perf_counter() - start, 3)}
+    finally:
+        importer.close()
+    return results
+
+
+# ---- web 接口 ----
+
+def create_bench_app(db_uri: str):
+    """以 SQLite 组装应用中可独立运行的部分：身份解析、JSON 分页接口，以及教师看板使用的数据层"""
+    from flask import Flask, jsonify
+
+    import analytics
+    import dashboard_queries
+    import identity
+    from api import bp as api_bp
+    from exts import db
+    from models import PracticeHistory
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=db_uri, SECRET_KEY="benchmark", TESTING=True)
+    db.init_app(app)
+    identity.init_app(app)
+    app.register_blueprint(api_bp)
+
+    # 教师学情分析页的数据组合：班级前 50 名学生的计数、知识点分布和近 7 天练习
+    @app.route("/bench/teacher/overview")
+    def teacher_overview():
+        summaries = dashboard_queries.student_summaries(limit=50)
+        student_ids = [summary.student_id for summary in summaries]
+        return jsonify({
+            "students": [summary.__dict__ for summary in summaries],
+            "topics": analytics.class_topic_totals(student_ids),
+            "completion": analytics.task_completion(student_ids),
+            "weekly": PracticeHistory.get_weekly_practice_for_students(student_ids),
+        })
+
+    @app.route("/bench/teacher/students")
+    def teacher_students():
+        overviews = dashboard_queries.load_student_overviews(range(1, 51))
+        return jsonify([{"id": o.student.id, "wrong": len(o.wrong_questions), "tasks": len(o.tasks),
+                         "topics": o.topics} for o in overviews])
+
+    return app
+
+
+def seed_students(app, students: int, wrong_per_student: int, tasks_per_student: int,
+                  questions: int, seed: int) -> dict:
+    import analytics
+    from exts import db
+    from models import PracticeHistory, Question, Student, Task, Teacher, WrongQuestion
+
+    rng = np.random.default_rng(seed)
+    chunk = 5000
+    timings = {}
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+
+        def bulk(model, rows):
+            for i in range(0, len(rows), chunk):
+                db.session.execute(db.insert(model), rows[i:i + chunk])
+
+        bulk(Teacher, [{"id": 1, "name": "teacher", "email": "t@example.com", "password": "x", "teacher_id": "T1"}])
+        question_texts = [f"{_sentence(rng, 8)}？" for _ in range(questions)]
+        bulk(Question, [{"id": i + 1, "question_text": text, "topic": TOPICS[i % len(TOPICS)],
+                         "correct_answer": "A", "type": "选择题" if i % 2 else "简答题"}
+                        for i, text in enumerate(question_texts)])
+        bulk(Student, [{"id": s, "name": f"学生{s}", "email": f"s{s}@example.com", "password": "x",
+                        "student_id": f"S{s}"} for s in range(1, students + 1)])
+
+        now = datetime.utcnow()
+        today = date.today()
+        for start_id in range(1, students + 1, 1000):
+            ids = range(start_id, min(start_id + 1000, students + 1))
+            picks = rng.integers(0, questions, size=(len(ids), wrong_per_student))
+            bulk(WrongQuestion, [
+                {"student_id": s, "question_text": question_texts[q], "correct_answer": "A", "error_reason": "概念混淆",
+                 "topic": TOPICS[q % len(TOPICS)], "recorded_at": now - timedelta(minutes=int(j * 37 + s % 60))}
+                for s, row in zip(ids, picks) for j, q in enumerate(row)
+            ])
+            bulk(Task, [{"student_id": s, "name": f"任务{j}", "completed": bool(j % 3 == 0),
+                         "created_at": now - timedelta(hours=j)} for s in ids for j in range(tasks_per_student)])
+            bulk(PracticeHistory, [{"student_id": s, "date": today - timedelta(days=d), "count": int(c)}
+                                   for s in ids for d, c in enumerate(rng.integers(0, 6, size=28)) if c])
+        db.session.commit()
+        timings["seed_seconds"] = round(time.perf_counter() - start, 3)
+
+        # 批量写入不触发 ORM 事件，统一重算汇总表
+        start = time.perf_counter()
+        timings["summary_rows"] = analytics.rebuild_summaries()
+        timings["rebuild_analytics_seconds"] = round(time.perf_counter() - start, 3)
+    return timings
+
+
+def bench_web(workdir: str, students: int, wrong_per_student: int, tasks_per_student: int,
+              questions: int, requests_per_endpoint: int, seed: int) -> dict:
+    from sqlalchemy import event
+
+    from exts import db
+    from identity import login_test_client
+
+    app = create_bench_app(f"sqlite:///{os.path.join(workdir, 'app.db')}")
+    results = {"seed": seed_students(app, students, wrong_per_student, tasks_per_student, questions, seed)}
+    rng = np.random.default_rng(seed + 1)
+
+    query_count = [0]
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *args: query_count.__setitem__(0, query_count[0] + 1))
+
+    def run(client, path_fn):
+        latencies, queries = [], []
+        for _ in range(requests_per_endpoint):
+            path = path_fn()
+            query_count[0] = 0
+            t0 = time.perf_counter()
+            response = client.get(path)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            queries.append(query_count[0])
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} 返回 {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        stats = _latency_stats(latencies)
+        stats["sql_queries_per_request"] = round(float(np.mean(queries)), 2)
+        return stats
+
+    endpoints = {}
+    student_client = app.test_client()
+    student_id = int(rng.integers(1, students + 1))
+    login_test_client(student_client, "student", student_id)
+    first_page = student_client.get("/api/wrong-questions?limit=20").get_json()
+    cursor = first_page["next_cursor"] or ""
+    endpoints["student_wrong_questions_first_page"] = run(student_client, lambda: "/api/wrong-questions?limit=20")
+    endpoints["student_wrong_questions_next_page"] = run(
+        student_client, lambda: f"/api/wrong-questions?limit=20&cursor={cursor}")
+    endpoints["student_tasks_open"] = run(student_client, lambda: "/api/tasks?completed=0&limit=20")
+    endpoints["student_question_bank_by_topic"] = run(
+        student_client, lambda: f"/api/questions?topic={TOPICS[int(rng.integers(len(TOPICS)))]}&limit=20")
+
+    teacher_client = app.test_client()
+    login_test_client(teacher_client, "teacher", 1)
+    endpoints["teacher_student_wrong_questions"] = run(
+        teacher_client, lambda: f"/api/wrong-questions?student_id={int(rng.integers(1, students + 1))}&limit=20")
+    endpoints["teacher_overview"] = run(teacher_client, lambda: "/bench/teacher/overview")
+    endpoints["teacher_students"] = run(teacher_client, lambda: "/bench/teacher/students")
+    results["endpoints"] = endpoints
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索流水线与 web 接口基准测试")
+    parser.add_argument("--blocks", type=int, default=1000, help="合成教材内容块总数（1k ~ 1M）")
+    parser.add_argument("--students", type=int, default=100, help="合成学生数（100 ~ 100k）")
+    parser.add_argument("--wrong-per-student", type=int, default=20)
+    parser.add_argument("--tasks-per-student", type=int, default=10)
+    parser.add_argument("--questions", type=int, default=2000, help="题库题目数")
+    parser.add_argument("--queries", type=int, default=200, help="检索查询条数")
+    parser.add_argument("--requests", type=int, default=50, help="每个接口的请求次数")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--index-type", default="flat", help="flat / ivf / hnsw / ivfpq")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="数据文件目录，默认使用临时目录并在结束后删除")
+    parser.add_argument("--skip-retrieval", action="store_true")
+    parser.add_argument("--skip-web", action="store_true")
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="edu_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {key: value for key, value in vars(args).items() if key not in ("json", "workdir")},
+        }
+    }
+    try:
+        if not args.skip_retrieval:
+            report["retrieval"] = bench_retrieval(workdir, args.blocks, args.queries, args.k, args.index_type,
+                                                  args.seed)
+        if not args.skip_web:
+            report["web"] = bench_web(workdir, args.students, args.wrong_per_student, args.tasks_per_student,
+                                      args.questions, args.requests, args.seed)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# flask 命令行维护命令，例如：flask rebuild-analytics、flask recommend-topics、flask dedup-questions
+# 表结构变更由 Flask-Migrate 管理（migrations/），部署时执行 flask db upgrade
+import click
+
+import analytics
+
+
+def init_app(app):
+    @app.cli.command('rebuild-analytics')
+    def rebuild_analytics_command():
+        """从错题、任务、练习明细全量重算学情分析汇总表"""
+        for table, rows in analytics.rebuild_summaries().items():
+            click.echo(f"{table}: {rows} 行")
+
+    @app.cli.command('recommend-topics')
+    @click.option('--force', is_flag=True, help='忽略错题指纹，全部重新计算')
+    def recommend_topics_command(force):
+        """为全部学生批量更新知识点推荐（错题未变化的学生跳过）"""
+        from recommender import recommend_for_students
+        results = recommend_for_students(force=force)
+        click.echo(f"已更新 {len(results)} 名学生的推荐")
+
+    @app.cli.command('dedup-questions')
+    @click.option('--threshold', default=0.95, show_default=True, help='余弦相似度阈值')
+    @click.option('--index-type', default='flat', show_default=True, help='flat / ivf / ivfpq')
+    @click.option('--report', help='重复簇写入 JSON Lines 文件')
+    @click.option('--merge', is_flag=True, help='合并重复题目，学生关联改指向保留的题目')
+    def dedup_questions_command(threshold, index_type, report, merge):
+        """检测题库中的近似重复题目"""
+        import dedup
+        import knowledge_base
+        from faiss_indexer import IndexConfig
+
+        encoder = knowledge_base.get_importer()
+        clusters = dedup.write_report(dedup.find_near_duplicates(
+            dedup.question_batches(), encoder, threshold, IndexConfig(index_type=index_type),
+            dedup.fetch_question_texts
+        ), report)
+        click.echo(f"发现 {len(clusters)} 个重复簇，共 {sum(len(c['duplicates']) for c in clusters)} 道重复题目")
+        if merge and clusters:
+            click.echo(f"已合并删除 {dedup.merge_question_duplicates(clusters)} 道题目")
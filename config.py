@@ -36,7 +36,32 @@ CHATGLM_MODEL_PATH = os.path.join(basedir, 'models', 'chatglm_6b')
 # 知识库路径
 KNOWLEDGE_BASE_PATH = os.path.join(basedir, 'knowledge_base')
 
-SPARKAI_URL = 'wss://spark-api.xf-yun.com/v3.5/chat'
+# 知识库数据库，检索器在应用启动后于后台线程中初始化
+KNOWLEDGE_BASE_DB = os.environ.get('KNOWLEDGE_BASE_DB', os.path.join(basedir, 'faiss', 'tensorflow_books.db'))
+
+# 知识库向量索引：flat（精确检索）/ ivf / hnsw / ivfpq（压缩向量，省内存）
+# 修改索引类型后需重建索引（FaissBookSearcher(rebuild=True)）
+FAISS_INDEX_TYPE = os.environ.get('FAISS_INDEX_TYPE', 'flat')
+FAISS_NLIST = int(os.environ.get('FAISS_NLIST', 1024))  # IVF 聚类中心数
+FAISS_NPROBE = int(os.environ.get('FAISS_NPROBE', 16))  # IVF 检索时探测的聚类数
+FAISS_HNSW_M = int(os.environ.get('FAISS_HNSW_M', 32))
+FAISS_HNSW_EF_CONSTRUCTION = int(os.environ.get('FAISS_HNSW_EF_CONSTRUCTION', 40))
+FAISS_HNSW_EF_SEARCH = int(os.environ.get('FAISS_HNSW_EF_SEARCH', 64))
+FAISS_PQ_M = int(os.environ.get('FAISS_PQ_M', 16))  # PQ 子空间数，需整除向量维度
+FAISS_PQ_NBITS = int(os.environ.get('FAISS_PQ_NBITS', 8))
+
+# 检索缓存：查询向量与检索结果的 LRU 容量及过期时间（秒）
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get('QUERY_EMBEDDING_CACHE_SIZE', 2048))
+SEARCH_RESULT_CACHE_SIZE = int(os.environ.get('SEARCH_RESULT_CACHE_SIZE', 2048))
+QUERY_CACHE_TTL = int(os.environ.get('QUERY_CACHE_TTL', 3600))
+
+# 共享向量编码服务（embedding_server.py）：socket 存在时各 worker 通过它编码，否则各自加载模型
+EMBEDDING_SERVER_SOCKET = os.environ.get('EMBEDDING_SERVER_SOCKET', os.path.join(basedir, 'run', 'embedding.sock'))
+EMBEDDING_MAX_BATCH_SIZE = int(os.environ.get('EMBEDDING_MAX_BATCH_SIZE', 64))
+EMBEDDING_MAX_WAIT_MS = float(os.environ.get('EMBEDDING_MAX_WAIT_MS', 5))
+
+# 可通过环境变量指向本地的模拟 websocket 服务（spark_dev_server.py）进行联调
+SPARKAI_URL = os.environ.get('SPARKAI_URL', 'wss://spark-api.xf-yun.com/v3.5/chat')
 
 # 替换为你自己的 AppID、API Key、Secret
 SPARKAI_APP_ID = '1bb6ca2f'
@@ -46,4 +71,26 @@ SPARKAI_API_SECRET = 'ZWM5OWY1NWJmOGM3MGZjZTRkYjE0ZWJj'
 # domain值
 SPARKAI_DOMAIN = 'generalv3.5'
 
+# 流式问答（spark_client.py）：全局并发上限、排队等待、首 token 与整段回复超时（秒）、预热连接数
+SPARKAI_MAX_CONCURRENCY = int(os.environ.get('SPARKAI_MAX_CONCURRENCY', 8))
+SPARKAI_QUEUE_TIMEOUT = float(os.environ.get('SPARKAI_QUEUE_TIMEOUT', 10))
+SPARKAI_FIRST_TOKEN_TIMEOUT = float(os.environ.get('SPARKAI_FIRST_TOKEN_TIMEOUT', 10))
+SPARKAI_REQUEST_TIMEOUT = float(os.environ.get('SPARKAI_REQUEST_TIMEOUT', 60))
+SPARKAI_WARM_CONNECTIONS = int(os.environ.get('SPARKAI_WARM_CONNECTIONS', 2))
+
+# 语义回答缓存（answer_cache.py）：问题余弦相似度阈值、最大条数、有效期（秒）
+ANSWER_CACHE_THRESHOLD = float(os.environ.get('ANSWER_CACHE_THRESHOLD', 0.92))
+ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', 2048))
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', 86400))
+
+# 登录用户的进程内缓存（identity.py）：TTL 秒数，0 表示不缓存，每个请求仍只查询一次
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 0))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 4096))
+
+# 慢请求性能分析：大于 0 时对每个请求开启 cProfile，耗时超过该值（毫秒）的请求写入 PROFILE_DIR；0 表示关闭
+PROFILE_SLOW_REQUEST_MS = float(os.environ.get('PROFILE_SLOW_REQUEST_MS', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(basedir, 'profiles'))
+# 响应中附带 Server-Timing 头（SQL 条数与各阶段耗时，浏览器开发者工具可见）；默认只在调试模式下开启
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', '').lower() in ('1', 'true', 'yes')
+
 response_format={ "type": "json_object" }
\ No newline at end of file
@@ -0,0 +1,137 @@
+# 教师端学情分析/测评页面的数据访问层
+#
+# 按学生遍历时直接访问 wrong_questions / tasks / recommended_topics 会逐个触发懒加载（1+3N 次查询），
+# 这里用 selectin 预加载和聚合子查询，让查询次数与学生人数无关。
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import selectinload
+
+from exts import db
+from models import RecommendedTopic, Student, Task, WrongQuestion
+
+
+@dataclass
+class StudentOverview:
+    student: Student
+    wrong_questions: List[WrongQuestion]
+    tasks: List[Task]
+    latest_topics: Optional[RecommendedTopic] = None
+
+    @property
+    def topics(self) -> list:
+        """最近一次推荐的知识点列表（topics_json 解析失败时为空）"""
+        if self.latest_topics is None or not self.latest_topics.topics_json:
+            return []
+        try:
+            return json.loads(self.latest_topics.topics_json)
+        except ValueError:
+            return []
+
+
+@dataclass
+class StudentSummary:
+    student_id: int
+    name: str
+    student_no: str
+    wrong_count: int = 0
+    task_count: int = 0
+    completed_task_count: int = 0
+    last_wrong_at: Optional[datetime] = None
+
+
+def latest_recommended_topics(student_ids: Iterable[int]) -> Dict[int, RecommendedTopic]:
+    """一次查询取回每个学生最近的推荐记录，返回 {student_id: RecommendedTopic}"""
+    student_ids = list(student_ids)
+    if not student_ids:
+        return {}
+    latest = db.session.query(
+        RecommendedTopic.student_id,
+        func.max(RecommendedTopic.updated_at).label('updated_at')
+    ).filter(RecommendedTopic.student_id.in_(student_ids)).group_by(RecommendedTopic.student_id).subquery()
+
+    rows = RecommendedTopic.query.join(latest, and_(
+        RecommendedTopic.student_id == latest.c.student_id,
+        RecommendedTopic.updated_at == latest.c.updated_at
+    )).order_by(RecommendedTopic.id).all()
+    # 同一时间有多条时取 id 最大的一条
+    return {row.student_id: row for row in rows}
+
+
+def load_student_overviews(student_ids: Optional[Iterable[int]] = None) -> List[StudentOverview]:
+    """加载学生及其错题、任务和最近推荐，固定 4 次查询（学生、错题、任务、推荐）
+
+    student_ids 为空时加载全部学生，结果按学生 id 排序
+    """
+    query = Student.query.options(
+        selectinload(Student.wrong_questions),
+        selectinload(Student.tasks),
+    ).order_by(Student.id)
+    if student_ids is not None:
+        student_ids = list(student_ids)
+        if not student_ids:
+            return []
+        query = query.filter(Student.id.in_(student_ids))
+    students = query.all()
+
+    topics = latest_recommended_topics([student.id for student in students])
+    return [
+        StudentOverview(
+            student=student,
+            wrong_questions=sorted(student.wrong_questions, key=lambda q: (q.recorded_at is None, q.recorded_at),
+                                   reverse=True),
+            tasks=list(student.tasks),
+            latest_topics=topics.get(student.id),
+        )
+        for student in students
+    ]
+
+
+def student_summaries(student_ids: Optional[Iterable[int]] = None,
+                      limit: Optional[int] = None) -> List[StudentSummary]:
+    """只需要计数的列表页使用：错题数、任务数、已完成任务数在数据库端聚合，单次查询
+
+    limit 为按学生 id 排序后的前 N 名，先在数据库端截取学生，聚合只统计这些学生
+    """
+    students = db.session.query(Student.id, Student.name, Student.student_id)
+    if student_ids is not None:
+        student_ids = list(student_ids)
+        if not student_ids:
+            return []
+        students = students.filter(Student.id.in_(student_ids))
+    students = students.order_by(Student.id)
+    if limit is not None:
+        students = students.limit(limit)
+    students = students.subquery()
+
+    wrong = db.session.query(
+        WrongQuestion.student_id,
+        func.count(WrongQuestion.id).label('wrong_count'),
+        func.max(WrongQuestion.recorded_at).label('last_wrong_at')
+    ).join(students, students.c.id == WrongQuestion.student_id).group_by(WrongQuestion.student_id).subquery()
+
+    tasks = db.session.query(
+        Task.student_id,
+        func.count(Task.id).label('task_count'),
+        func.sum(case((Task.completed.is_(True), 1), else_=0)).label('completed_task_count')
+    ).join(students, students.c.id == Task.student_id).group_by(Task.student_id).subquery()
+
+    query = db.session.query(
+        students.c.id, students.c.name, students.c.student_id,
+        wrong.c.wrong_count, wrong.c.last_wrong_at,
+        tasks.c.task_count, tasks.c.completed_task_count
+    ).outerjoin(wrong, wrong.c.student_id == students.c.id) \
+        .outerjoin(tasks, tasks.c.student_id == students.c.id) \
+        .order_by(students.c.id)
+
+    return [
+        StudentSummary(
+            student_id=row[0], name=row[1], student_no=row[2],
+            wrong_count=int(row[3] or 0), last_wrong_at=row[4],
+            task_count=int(row[5] or 0), completed_task_count=int(row[6] or 0),
+        )
+        for row in query.all()
+    ]
@@ -0,0 +1,265 @@
+# 题库与教材内容块的近似重复检测（批量任务）
+#
+# 两遍流式扫描：第一遍分批编码并写入 faiss 索引（ivf/ivfpq 时内存只与压缩后的向量有关），
+# 第二遍分批做 range_search，相似度超过阈值的两条记录用并查集合并成簇。
+# 向量按内容哈希缓存在知识库 SQLite 中，第二遍编码直接命中缓存。
+#
+# 用法示例：
+#   python dedup.py --db faiss/tensorflow_books.db --threshold 0.95 --report duplicates.jsonl
+#   python dedup.py --db faiss/tensorflow_books.db --merge --index-type ivfpq
+#   flask dedup-questions --threshold 0.95 --merge
+import argparse
+import json
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from faiss_indexer import BookImporter, IndexConfig, _base_index, apply_search_params, create_faiss_index
+from lazy_import import lazy_import
+
+faiss = lazy_import("faiss")
+
+Batches = Callable[[], Iterable[List[Tuple[int, str]]]]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+class _UnionFind:
+    """只记录出现在重复对中的 id，内存与重复数量成正比而不是与表大小成正比"""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while x != root:
+            self.parent[x], x = root, self.parent.get(x, x)
+        return root
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # 以较小（较早）的 id 作为簇的代表
+            self.parent[max(ra, rb)] = min(ra, rb)
+            self.parent.setdefault(min(ra, rb), min(ra, rb))
+
+    def clusters(self) -> Dict[int, List[int]]:
+        groups = {}
+        for x in list(self.parent):
+            groups.setdefault(self.find(x), []).append(x)
+        return {root: sorted(members) for root, members in groups.items() if len(members) > 1}
+
+
+def find_near_duplicates(batches: Batches, encoder, threshold: float = 0.95,
+                         index_config: Optional[IndexConfig] = None,
+                         fetch_texts: Optional[Callable[[List[int]], Dict[int, str]]] = None) -> Iterator[Dict]:
+    """返回近似重复簇：{"canonical": 最小 id, "duplicates": [...], "size": n}
+
+    batches 每次调用返回一个新的 [(id, text), ...] 批次迭代器（会被遍历两遍）；
+    threshold 为余弦相似度阈值。近似索引（ivf/ivfpq）的候选对会用精确向量复核，需要提供 fetch_texts。
+    """
+    index_config = index_config or IndexConfig()
+    if index_config.index_type == "hnsw":
+        raise ValueError("hnsw 索引不支持 range_search，请使用 flat / ivf / ivfpq")
+    # 单位向量间 L2 距离平方 = 2 - 2 * 余弦相似度
+    radius = 2.0 - 2.0 * threshold
+
+    index = None
+    train_size = index_config.train_size()
+    pending_ids, pending_vectors, pending_count = [], [], 0
+    for rows in batches():
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        vectors = _normalize(encoder.embed_contents([row[1] or "" for row in rows]))
+        if index is None:
+            pending_ids.append(ids)
+            pending_vectors.append(vectors)
+            pending_count += len(rows)
+            if pending_count < train_size:
+                continue
+            ids, vectors = np.concatenate(pending_ids), np.vstack(pending_vectors)
+            pending_ids, pending_vectors = [], []
+            index = create_faiss_index(vectors, index_config)
+        index.add_with_ids(vectors, ids)
+    if index is None and pending_vectors:
+        index = create_faiss_index(np.vstack(pending_vectors), index_config)
+        index.add_with_ids(np.vstack(pending_vectors), np.concatenate(pending_ids))
+    if index is None:
+        return
+    apply_search_params(index, index_config)
+    exact = isinstance(_base_index(index), faiss.IndexFlat)
+    if not exact and fetch_texts is None:
+        raise ValueError("近似索引需要提供 fetch_texts 以复核候选对")
+
+    groups = _UnionFind()
+    # 近似索引的 range_search 不对称（a 能查到 b 时 b 未必能查到 a），除自身外的结果都要保留；
+    # 两端都查到的同一对按 (较小 id, 较大 id) 去重，只复核一次
+    seen = set()
+    for rows in batches():
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        vectors = _normalize(encoder.embed_contents([row[1] or "" for row in rows]))
+        lims, distances, labels = index.range_search(vectors, radius)
+        pairs = []
+        for i, query_id in enumerate(ids):
+            for j in range(lims[i], lims[i + 1]):
+                neighbor = int(labels[j])
+                key = (min(int(query_id), neighbor), max(int(query_id), neighbor))
+                if neighbor != query_id and key not in seen:
+                    seen.add(key)
+                    pairs.append((i, neighbor))
+        if not pairs:
+            continue
+        if not exact:
+            # PQ 等近似距离可能误报，取回另一端文本（向量缓存命中）计算精确相似度
+            neighbor_ids = sorted({neighbor for _, neighbor in pairs})
+            texts = fetch_texts(neighbor_ids)
+            known = [neighbor for neighbor in neighbor_ids if neighbor in texts]
+            position = {neighbor: k for k, neighbor in enumerate(known)}
+            neighbor_vectors = _normalize(encoder.embed_contents([texts[n] or "" for n in known])) \
+                if known else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            pairs = [(i, n) for i, n in pairs
+                     if n in position and float(vectors[i] @ neighbor_vectors[position[n]]) >= threshold]
+        for i, neighbor in pairs:
+            groups.union(int(ids[i]), neighbor)
+
+    for canonical, members in sorted(groups.clusters().items()):
+        yield {"canonical": canonical, "duplicates": [m for m in members if m != canonical], "size": len(members)}
+
+
+# ---- 教材内容块（知识库 SQLite）----
+
+def content_batches(importer: BookImporter, content_type: Optional[str] = "text",
+                    batch_size: int = 1024) -> Batches:
+    sql, params = "SELECT id, content FROM contents", ()
+    if content_type:
+        sql, params = sql + " WHERE content_type = ?", (content_type,)
+    return lambda: importer.db.iter_batches(sql + " ORDER BY id", params, batch_size)
+
+
+def fetch_content_texts(importer: BookImporter) -> Callable[[List[int]], Dict[int, str]]:
+    return lambda ids: {cid: row[1] for cid, row in importer.db.get_contents(ids).items()}
+
+
+def merge_content_duplicates(importer: BookImporter, clusters: Iterable[Dict]) -> Tuple[int, int]:
+    """删除重复内容块：只在同一本书内合并，每本书保留簇中 id 最小的一条；仍被其他块作为父节点引用的块跳过
+
+    不同书中的相同段落各自保留，按书检索时不会丢失内容。删除在一个事务内完成，
+    faiss 索引与 removal_listeners（如语义回答缓存）只更新一次。返回 (删除数, 跳过数)
+    """
+    candidates = []
+    for cluster in clusters:
+        members = [cluster["canonical"], *cluster["duplicates"]]
+        books = {}
+        for cid, book_id in sorted(importer.db.get_book_ids(members).items()):
+            books.setdefault(book_id, []).append(cid)
+        for ids in books.values():
+            candidates.extend(ids[1:])
+
+    if not candidates:
+        return 0, 0
+    removed = importer.delete_contents(candidates)
+    return len(removed), len(candidates) - len(removed)
+
+
+# ---- 题库（应用数据库，需在 Flask 应用上下文中调用）----
+
+def question_batches(batch_size: int = 1024) -> Batches:
+    from models import Question
+
+    def batches():
+        # 按主键游标分批读取，不把整张表加载进内存
+        last_id = 0
+        while True:
+            rows = Question.query.with_entities(Question.id, Question.question_text) \
+                .filter(Question.id > last_id).order_by(Question.id).limit(batch_size).all()
+            if not rows:
+                return
+            yield [(row[0], row[1]) for row in rows]
+            last_id = rows[-1][0]
+    return batches
+
+
+def fetch_question_texts(ids: List[int]) -> Dict[int, str]:
+    from models import Question
+    return dict(Question.query.with_entities(Question.id, Question.question_text).filter(Question.id.in_(ids)))
+
+
+def merge_question_duplicates(clusters: Iterable[Dict]) -> int:
+    """把重复题目的 student_question 关联改指向保留的题目后删除重复题目，返回删除数
+
+    学生已同时关联保留题目和重复题目时，只去掉重复的那条关联，避免主键冲突
+    """
+    from exts import db
+    from models import Question, student_question
+
+    removed = 0
+    link = student_question
+    for cluster in clusters:
+        canonical, duplicates = cluster["canonical"], cluster["duplicates"]
+        linked = {row[0] for row in db.session.execute(
+            db.select(link.c.student_id).where(link.c.question_id == canonical))}
+        for duplicate in duplicates:
+            students = {row[0] for row in db.session.execute(
+                db.select(link.c.student_id).where(link.c.question_id == duplicate))}
+            if students & linked:
+                db.session.execute(link.delete().where(
+                    link.c.question_id == duplicate, link.c.student_id.in_(students & linked)))
+            db.session.execute(link.update().where(link.c.question_id == duplicate).values(question_id=canonical))
+            linked |= students
+        db.session.execute(Question.__table__.delete().where(Question.id.in_(duplicates)))
+        db.session.commit()
+        removed += len(duplicates)
+    return removed
+
+
+def write_report(clusters: Iterable[Dict], path: Optional[str]) -> List[Dict]:
+    """逐簇写入 JSON Lines 报告（path 为空时只收集），返回全部簇"""
+    collected = []
+    f = open(path, "w", encoding="utf-8") if path else None
+    try:
+        for cluster in clusters:
+            collected.append(cluster)
+            if f:
+                f.write(json.dumps(cluster, ensure_ascii=False) + "\n")
+    finally:
+        if f:
+            f.close()
+    return collected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="教材内容块近似重复检测与合并")
+    parser.add_argument("--db", default="faiss/tensorflow_books.db")
+    parser.add_argument("--threshold", type=float, default=0.95, help="余弦相似度阈值")
+    parser.add_argument("--content-type", default="text", help="只比较该类型的内容块，传空字符串表示全部")
+    parser.add_argument("--index-type", default="flat", help="flat / ivf / ivfpq（大表用 ivfpq 节省内存）")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--report", help="重复簇写入 JSON Lines 文件")
+    parser.add_argument("--merge", action="store_true", help="删除重复内容块，只保留每簇 id 最小的一条")
+    args = parser.parse_args()
+
+    defaults = IndexConfig.from_config()
+    index_config = IndexConfig(index_type=args.index_type, nlist=defaults.nlist, nprobe=defaults.nprobe,
+                               pq_m=defaults.pq_m, pq_nbits=defaults.pq_nbits)
+    importer = BookImporter(args.db)
+    try:
+        clusters = write_report(find_near_duplicates(
+            content_batches(importer, args.content_type or None, args.batch_size), importer,
+            args.threshold, index_config, fetch_content_texts(importer)
+        ), args.report)
+        duplicates = sum(len(cluster["duplicates"]) for cluster in clusters)
+        print(f"发现 {len(clusters)} 个重复簇，共 {duplicates} 条重复内容")
+        if args.merge and clusters:
+            removed, skipped = merge_content_duplicates(importer, clusters)
+            print(f"已删除 {removed} 条重复内容，{skipped} 条仍被引用为父节点而保留")
+    finally:
+        importer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# 本地向量编码服务：整机只加载一份 SentenceTransformer，
+# 把各 web worker 并发发来的 encode 请求合并成微批次统一编码。
+#
+# 启动：python embedding_server.py --socket run/embedding.sock --max-batch-size 64 --max-wait-ms 5
+#
+# 协议（Unix socket，长度前缀帧）：
+#   请求  [4 字节长度][JSON]             {"op": "encode", "texts": [...]} 或 {"op": "info"}
+#   响应  [4 字节长度][JSON 头][4 字节长度][float32 向量字节]
+#         头为 {"shape": [n, d]} / {"model_name": ..., "dim": ...} / {"error": ...}
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Union
+
+import numpy as np
+
+_LENGTH = struct.Struct("!I")
+
+
+class EmbeddingServerError(RuntimeError):
+    """编码服务返回错误（如单次请求编码失败）"""
+
+
+class EmbeddingServerUnavailable(EmbeddingServerError):
+    """无法连接编码服务或连接中断，调用方可回退到同一模型的进程内实例"""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _send_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (size,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return _recv_exact(sock, size)
+
+
+class MicroBatcher:
+    """收集并发请求，凑满 max_batch_size 条文本或等待 max_wait 秒后一次性编码"""
+
+    def __init__(self, model, max_batch_size: int = 64, max_wait: float = 0.005):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        future = Future()
+        self._requests.put((texts, future))
+        return future
+
+    def _collect(self):
+        batch = [self._requests.get()]
+        total = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while total < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            total += len(item[0])
+        return batch
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=self.max_batch_size, convert_to_numpy=True)
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                vectors = self._encode(texts)
+            except Exception:
+                # 合并编码失败时逐个请求重新编码，只有出错的请求收到异常，不连累同批次的其他请求
+                for request_texts, future in batch:
+                    try:
+                        future.set_result(self._encode(request_texts))
+                    except Exception as e:
+                        future.set_exception(e)
+                continue
+            offset = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+
+class _EncodeHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # 一个连接可连续发送多个请求，客户端断开时结束
+        while True:
+            try:
+                request = json.loads(_recv_frame(self.request).decode("utf-8"))
+            except (ConnectionError, OSError):
+                return
+            header, body = self._dispatch(request)
+            try:
+                _send_frame(self.request, json.dumps(header).encode("utf-8"))
+                _send_frame(self.request, body)
+            except OSError:
+                return
+
+    def _dispatch(self, request):
+        server = self.server
+        try:
+            if request.get("op") == "info":
+                return {"model_name": server.model_name, "dim": server.dim}, b""
+            vectors = server.batcher.submit(list(request["texts"])).result()
+            return {"shape": list(vectors.shape)}, vectors.tobytes()
+        except Exception as e:
+            return {"error": str(e)}, b""
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # 所有 web worker 可能同时建立连接，默认的 5 太小
+    request_queue_size = 128
+
+    def __init__(self, socket_path: str, model, model_name: str,
+                 max_batch_size: int = 64, max_wait: float = 0.005):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        socket_dir = os.path.dirname(socket_path)
+        if socket_dir:
+            os.makedirs(socket_dir, exist_ok=True)
+        super().__init__(socket_path, _EncodeHandler)
+        self.model_name = model_name
+        self.dim = int(model.get_sentence_embedding_dimension())
+        self.batcher = MicroBatcher(model, max_batch_size, max_wait)
+
+
+class EmbeddingClient:
+    """编码服务客户端，encode 接口与 SentenceTransformer.encode 兼容，可直接替换进程内模型
+
+    每个线程持有一条长连接，连接失败时抛出 EmbeddingServerError。
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _call(self, request: dict):
+        try:
+            sock = self._connection()
+            _send_frame(sock, json.dumps(request).encode("utf-8"))
+            header = json.loads(_recv_frame(sock).decode("utf-8"))
+            body = _recv_frame(sock)
+        except (OSError, ValueError) as e:
+            self.close()
+            raise EmbeddingServerUnavailable(f"编码服务不可用: {e}") from e
+        if "error" in header:
+            raise EmbeddingServerError(header["error"])
+        return header, body
+
+    def info(self) -> dict:
+        header, _ = self._call({"op": "info"})
+        return header
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.info()["dim"])
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: Optional[int] = None,
+               convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        # batch_size 由服务端的微批次设置决定，这里仅为兼容 SentenceTransformer 的签名
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        header, body = self._call({"op": "encode", "texts": texts})
+        vectors = np.frombuffer(body, dtype=np.float32).reshape(header["shape"])
+        return vectors[0] if single else vectors
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+
+def main():
+    import config
+    from faiss_indexer import load_embedding_model
+
+    parser = argparse.ArgumentParser(description="本地向量编码服务")
+    parser.add_argument("--socket", default=config.EMBEDDING_SERVER_SOCKET)
+    parser.add_argument("--max-batch-size", type=int, default=config.EMBEDDING_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=config.EMBEDDING_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    model, model_name = load_embedding_model()
+    server = EmbeddingServer(args.socket, model, model_name, args.max_batch_size, args.max_wait_ms / 1000)
+    print(f"向量编码服务已启动: {args.socket}（模型 {model_name}，最大批次 {args.max_batch_size}，"
+          f"最长等待 {args.max_wait_ms}ms）")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# 知识库向量索引基准测试：对比各索引类型相对 flat 精确检索的 recall@k、延迟与内存
+#
+# 用法示例：
+#   python faiss_benchmark.py --db faiss/tensorflow_books.db --types flat,ivf,hnsw,ivfpq
+#   python faiss_benchmark.py --synthetic 200000 --dim 384 --nlist 2048 --nprobe 32
+import argparse
+import json
+import os
+import resource
+import time
+
+import numpy as np
+import faiss
+
+from faiss_indexer import IndexConfig, create_faiss_index, apply_search_params, BookImporter
+
+
+def _rss_bytes() -> int:
+    # 当前常驻内存，Linux 下读取 /proc，其他平台退化为峰值内存
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def load_vectors_from_db(db_path: str) -> np.ndarray:
+    importer = BookImporter(db_path)
+    try:
+        chunks = [
+            importer.embed_contents([row[0] or "" for row in rows])
+            for rows in importer.db.iter_batches("SELECT content FROM contents ORDER BY id", batch_size=1024)
+        ]
+    finally:
+        importer.close()
+    if not chunks:
+        raise SystemExit("数据库无内容，无法进行基准测试")
+    return np.vstack(chunks)
+
+
+def make_queries(vectors: np.ndarray, num_queries: int, seed: int) -> np.ndarray:
+    # 以库内向量加少量噪声作为查询，模拟与教材内容相近的提问
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(vectors), size=num_queries)
+    noise = rng.normal(scale=vectors.std() * 0.1, size=(num_queries, vectors.shape[1]))
+    return np.ascontiguousarray(vectors[picks] + noise, dtype=np.float32)
+
+
+def recall_at_k(ground_truth: np.ndarray, ids: np.ndarray) -> float:
+    hits = sum(len(np.intersect1d(gt[gt != -1], found[found != -1])) for gt, found in zip(ground_truth, ids))
+    return hits / max(int((ground_truth != -1).sum()), 1)
+
+
+def benchmark_index(vectors: np.ndarray, queries: np.ndarray, ground_truth: np.ndarray,
+                    index_config: IndexConfig, k: int) -> dict:
+    ids = np.arange(len(vectors), dtype=np.int64)
+    train_size = index_config.train_size() or len(vectors)
+    rss_before = _rss_bytes()
+
+    start = time.perf_counter()
+    index = create_faiss_index(vectors[:train_size], index_config)
+    index.add_with_ids(vectors, ids)
+    build_seconds = time.perf_counter() - start
+    apply_search_params(index, index_config)
+
+    # 逐条查询以得到单次请求的延迟分布
+    latencies, found = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        _, result = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found.append(result[0])
+    latencies = np.array(latencies)
+
+    return {
+        "index_type": index_config.index_type,
+        "params": {"nlist": index_config.nlist, "nprobe": index_config.nprobe, "hnsw_m": index_config.hnsw_m,
+                   "ef_search": index_config.ef_search, "pq_m": index_config.pq_m, "pq_nbits": index_config.pq_nbits},
+        "recall_at_k": round(recall_at_k(ground_truth, np.array(found)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "build_seconds": round(build_seconds, 2),
+        "index_bytes": int(faiss.serialize_index(index).nbytes),
+        "rss_delta_bytes": _rss_bytes() - rss_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识库向量索引 recall/延迟/内存 基准测试")
+    parser.add_argument("--db", help="从教材数据库编码全部内容作为向量集")
+    parser.add_argument("--synthetic", type=int, default=100000, help="未指定 --db 时生成的随机向量数")
+    parser.add_argument("--dim", type=int, default=384, help="随机向量维度（all-MiniLM-L6-v2 为 384）")
+    parser.add_argument("--types", default="flat,ivf,hnsw,ivfpq", help="逗号分隔的索引类型")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    defaults = IndexConfig.from_config()
+    parser.add_argument("--nlist", type=int, default=defaults.nlist)
+    parser.add_argument("--nprobe", type=int, default=defaults.nprobe)
+    parser.add_argument("--hnsw-m", type=int, default=defaults.hnsw_m)
+    parser.add_argument("--ef-search", type=int, default=defaults.ef_search)
+    parser.add_argument("--pq-m", type=int, default=defaults.pq_m)
+    parser.add_argument("--pq-nbits", type=int, default=defaults.pq_nbits)
+    args = parser.parse_args()
+
+    if args.db:
+        vectors = load_vectors_from_db(args.db)
+    else:
+        rng = np.random.default_rng(args.seed)
+        vectors = rng.standard_normal((args.synthetic, args.dim), dtype=np.float32)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = make_queries(vectors, args.queries, args.seed)
+    print(f"向量数 {len(vectors)}，维度 {vectors.shape[1]}，查询数 {len(queries)}，k={args.k}")
+
+    # flat 精确检索作为 recall 的基准
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, ground_truth = exact.search(queries, args.k)
+    del exact
+
+    results = []
+    for index_type in args.types.split(","):
+        index_config = IndexConfig(
+            index_type=index_type.strip(), nlist=args.nlist, nprobe=args.nprobe, hnsw_m=args.hnsw_m,
+            ef_construction=defaults.ef_construction, ef_search=args.ef_search,
+            pq_m=args.pq_m, pq_nbits=args.pq_nbits,
+        )
+        result = benchmark_index(vectors, queries, ground_truth, index_config, args.k)
+        results.append(result)
+        print(f"{result['index_type']:>6}  recall@{args.k}={result['recall_at_k']:.4f}  "
+              f"p50={result['p50_ms']:.3f}ms  p99={result['p99_ms']:.3f}ms  "
+              f"build={result['build_seconds']:.2f}s  index={result['index_bytes'] / 2 ** 20:.1f}MB  "
+              f"rss+={result['rss_delta_bytes'] / 2 ** 20:.1f}MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"num_vectors": len(vectors), "dim": int(vectors.shape[1]), "k": args.k,
+                       "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
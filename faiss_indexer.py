@@ -1,38 +1,236 @@
 import re
+import hashlib
 import sqlite3
 import os
+import threading
+import weakref
+from urllib.request import pathname2url
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List, Dict, Tuple, Optional
-import faiss
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator, Set
 import time
-from sentence_transformers import SentenceTransformer
+
+import metrics
+from cache import LRUCache
+from embedding_server import EmbeddingClient, EmbeddingServerError, EmbeddingServerUnavailable
+from lazy_import import lazy_import
+
+# faiss 与 sentence_transformers（torch）导入耗时数秒，首次使用时再加载
+faiss = lazy_import("faiss")
+sentence_transformers = lazy_import("sentence_transformers")
+
+# 构建索引时每批编码的文本条数
+EMBEDDING_BATCH_SIZE = 64
+# 导入书籍时每次 executemany 写入的行数
+IMPORT_BATCH_SIZE = 1000
+# 每个 SQLite 连接缓存的预编译语句数
+SQLITE_CACHED_STATEMENTS = 256
+# 检索时可用的元数据过滤字段（均为 contents 表的列）
+FILTER_FIELDS = ('book_id', 'chapter', 'section', 'content_type')
+# 只有正文块写入向量索引；标题文字已保存在其下正文块的 title 列，不再单独占用 top-k 名额
+INDEXED_CONTENT_TYPE = 'text'
+# IVF 每个聚类中心至少需要的训练样本数（faiss 建议 39 个以上）
+IVF_MIN_POINTS_PER_CENTROID = 39
+# 训练样本的上限，超过后不再继续缓存
+MAX_TRAIN_SIZE = 100000
+
+
+def _config_value(name: str, default):
+    # 延迟导入 config，脚本单独运行时也能取到默认值
+    import config
+    return getattr(config, name, default)
+
+
+@dataclass
+class IndexConfig:
+    """向量索引类型及参数：flat（精确）/ ivf / hnsw / ivfpq（省内存）"""
+    index_type: str = "flat"
+    nlist: int = 1024
+    nprobe: int = 16
+    hnsw_m: int = 32
+    ef_construction: int = 40
+    ef_search: int = 64
+    pq_m: int = 16
+    pq_nbits: int = 8
+
+    @classmethod
+    def from_config(cls) -> "IndexConfig":
+        return cls(
+            index_type=_config_value('FAISS_INDEX_TYPE', cls.index_type),
+            nlist=_config_value('FAISS_NLIST', cls.nlist),
+            nprobe=_config_value('FAISS_NPROBE', cls.nprobe),
+            hnsw_m=_config_value('FAISS_HNSW_M', cls.hnsw_m),
+            ef_construction=_config_value('FAISS_HNSW_EF_CONSTRUCTION', cls.ef_construction),
+            ef_search=_config_value('FAISS_HNSW_EF_SEARCH', cls.ef_search),
+            pq_m=_config_value('FAISS_PQ_M', cls.pq_m),
+            pq_nbits=_config_value('FAISS_PQ_NBITS', cls.pq_nbits),
+        )
+
+    def train_size(self) -> int:
+        """构建索引前需要缓存的训练样本数，flat/hnsw 无需训练"""
+        if self.index_type == "ivf":
+            return min(self.nlist * IVF_MIN_POINTS_PER_CENTROID, MAX_TRAIN_SIZE)
+        if self.index_type == "ivfpq":
+            centroids = max(self.nlist, 2 ** self.pq_nbits)
+            return min(centroids * IVF_MIN_POINTS_PER_CENTROID, MAX_TRAIN_SIZE)
+        return 0
+
+
+def create_faiss_index(train_vectors: np.ndarray, index_config: IndexConfig):
+    """按配置创建（并训练）支持 add_with_ids 的索引，样本不足以训练时退化为精确索引"""
+    num_vectors, dimension = train_vectors.shape
+    index_type = index_config.index_type
+    if index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dimension, index_config.hnsw_m)
+        base.hnsw.efConstruction = index_config.ef_construction
+        base.hnsw.efSearch = index_config.ef_search
+        return faiss.IndexIDMap2(base)
+
+    if index_type in ("ivf", "ivfpq"):
+        nlist = min(index_config.nlist, num_vectors // IVF_MIN_POINTS_PER_CENTROID)
+        # PQ 码本同样需要每个中心约 39 个样本，样本太少时压缩没有意义
+        pq_train_size = 2 ** index_config.pq_nbits * IVF_MIN_POINTS_PER_CENTROID
+        if index_type == "ivfpq" and (num_vectors < pq_train_size or dimension % index_config.pq_m):
+            nlist = 0
+        if nlist < 1:
+            print(f"训练样本不足（{num_vectors} 条），{index_type} 索引退化为 flat")
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, index_config.pq_m, index_config.pq_nbits)
+        index.train(train_vectors)
+        index.nprobe = min(index_config.nprobe, nlist)
+        return index
+
+    if index_type != "flat":
+        raise ValueError(f"未知的索引类型: {index_type}")
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+
+def _base_index(index):
+    # IndexIDMap 包装的 HNSW 等索引需要取出内部索引才能设置参数
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def apply_search_params(index, index_config: IndexConfig):
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(index_config.nprobe, base.nlist)
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = index_config.ef_search
+
+
+def load_embedding_model(timings: Optional[Dict] = None):
+    """加载进程内的 SentenceTransformer，返回 (模型, 模型名)；传入 timings 时记录 sentence_transformers 的导入耗时"""
+    if timings is not None and not sentence_transformers.is_loaded:
+        start = time.perf_counter()
+        # 访问属性触发导入（含 torch），与模型加载分开计时
+        sentence_transformers.SentenceTransformer
+        timings["import_sentence_transformers"] = time.perf_counter() - start
+    model_options = [
+        {"name": "all-MiniLM-L6-v2", "local_path": "./local_models/all-MiniLM-L6-v2"},
+        {"name": "bert-base-nli-mean-tokens", "local_path": "./local_models/bert-base-nli-mean-tokens"}
+    ]
+    for model_option in model_options:
+        try:
+            if os.path.exists(model_option["local_path"]):
+                model = sentence_transformers.SentenceTransformer(model_option["local_path"])
+            else:
+                os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com/'
+                model = sentence_transformers.SentenceTransformer(model_option["name"])
+            print(f"模型加载成功: {model_option['name']}")
+            return model, model_option["name"]
+        except Exception as e:
+            print(f"加载模型失败: {e}")
+    raise RuntimeError("所有模型加载失败")
+
+
+def normalize_filters(filters: Optional[Dict]) -> Tuple:
+    """把过滤条件规范成可哈希的元组，值可以是单个值或列表（表示 IN）"""
+    if not filters:
+        return ()
+    normalized = []
+    for field, value in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"不支持的过滤字段: {field}")
+        if value is None:
+            continue
+        values = tuple(sorted(value)) if isinstance(value, (list, tuple, set)) else (value,)
+        normalized.append((field, values))
+    return tuple(sorted(normalized))
+
+
+def scope_to_index(filters: Tuple) -> Optional[Tuple]:
+    """索引中只有正文块：content_type 条件包含正文时恒成立，直接去掉；不包含时范围为空，返回 None"""
+    scoped = []
+    for field, values in filters:
+        if field == 'content_type':
+            if INDEXED_CONTENT_TYPE not in values:
+                return None
+            continue
+        scoped.append((field, values))
+    return tuple(scoped)
 
 
 class FaissBookSearcher:
-    def __init__(self, db_path="faiss/tensorflow_books.db"):
+    def __init__(self, db_path="faiss/tensorflow_books.db", index_path: Optional[str] = None, rebuild: bool = False,
+                 index_config: Optional[IndexConfig] = None):
         print("🔍 正在初始化 FaissBookSearcher...")
-        self.importer = BookImporter(db_path)
-        if not self.importer.faiss_index:
+        # 各初始化阶段耗时（秒），供启动分析与就绪检查展示
+        self.init_timings = {}
+        start = time.perf_counter()
+        self.importer = BookImporter(db_path, index_path=index_path, index_config=index_config)
+        self.init_timings["load_model"] = time.perf_counter() - start
+        self.init_timings.update(self.importer.init_timings)
+        # 优先以 mmap 方式加载磁盘上的索引，多个 worker 共享同一份页缓存
+        start = time.perf_counter()
+        if rebuild or not self.importer.load_faiss_index():
             self.importer.build_faiss_index()
+            self.init_timings["build_index"] = time.perf_counter() - start
+        else:
+            self.init_timings["load_index"] = time.perf_counter() - start
 
-    def search(self, queries: List[str], k=5):
-        results = []
-        seen_contents = set()  # 避免重复内容
+    def search(self, queries: List[str], k=5, filters: Optional[Dict] = None) -> List[Dict]:
+        """多条查询一次编码、一次检索，跨查询去重后按距离返回前 k 条
 
-        for query in queries:
-            result_ids = self.importer.search(query, k=k)
-            print(f"🔍 查询 '{query}' 得到 IDs: {result_ids}")  # 打印 ID 列表
-            for cid in result_ids:
-                if cid in seen_contents:
-                    continue
-                self.importer.db.cursor.execute("SELECT content FROM contents WHERE id = ?", (cid,))
-                content = self.importer.db.cursor.fetchone()
-                print(f"📄 查询 ID={cid} 的结果：{content}")  # 打印查询结果
-                if content:
-                    results.append(content[0])
-                    seen_contents.add(cid)
-        return results[:k]
+        filters 限定检索范围，如 {"book_id": 3, "chapter": "2"}；索引中只有正文块，不会返回标题行。
+        返回 [{"id", "title", "content", "distance"}, ...]，distance 为 L2 距离，越小越相关
+        """
+        if isinstance(queries, str):
+            queries = [queries]
+        if not queries:
+            return []
+
+        distances, ids = self.importer.search_batch(queries, k=k, filters=filters)
+        flat_ids, flat_distances = ids.ravel(), distances.ravel()
+        valid = flat_ids != -1
+        flat_ids, flat_distances = flat_ids[valid], flat_distances[valid]
+        if flat_ids.size == 0:
+            return []
+
+        # 按 (id, 距离) 排序后取每个 id 的第一条，即该内容在所有查询中的最小距离
+        order = np.lexsort((flat_distances, flat_ids))
+        flat_ids, flat_distances = flat_ids[order], flat_distances[order]
+        first = np.ones(flat_ids.size, dtype=bool)
+        first[1:] = flat_ids[1:] != flat_ids[:-1]
+        unique_ids, best_distances = flat_ids[first], flat_distances[first]
+
+        top = np.argsort(best_distances, kind="stable")[:k]
+        top_ids = [int(cid) for cid in unique_ids[top]]
+        rows = self.importer.db.get_contents(top_ids)
+
+        results = []
+        for cid, distance in zip(top_ids, best_distances[top]):
+            row = rows.get(cid)
+            if row:
+                results.append({"id": cid, "title": row[0], "content": row[1], "distance": float(distance)})
+        return results
 
 
 @dataclass
@@ -46,13 +244,141 @@ class BookContent:
     parent_id: Optional[int] = None
     id: Optional[int] = None
 
+class _ReaderHandle:
+    """持有线程专用的只读连接；线程结束时 threading.local 释放本对象，finalizer 随之关闭连接"""
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+class ReadWriteLock:
+    """读者之间不互斥，写者独占；有写者等待时新读者排队，避免写者饥饿。写锁可重入，持写锁的线程也可读"""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        if self._writer == threading.get_ident():
+            yield
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+            else:
+                self._waiting_writers += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._waiting_writers -= 1
+                self._writer, self._writer_depth = me, 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer_depth -= 1
+                if not self._writer_depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
 class TensorFlowBookDatabase:
+    """书籍内容库
+
+    self.conn / self.cursor 是唯一的写连接，所有写操作持有 _write_lock；
+    读操作使用每个线程各自的只读连接（WAL 模式下读写互不阻塞），可被多个 web 线程并发调用；
+    线程结束时其只读连接随之关闭，每请求一个线程的服务器不会累积连接。
+    """
+
     def __init__(self, db_path: str):
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                    cached_statements=SQLITE_CACHED_STATEMENTS)
         self.cursor = self.conn.cursor()
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        # 仍存活线程的只读连接，close() 时统一关闭
+        self._readers = weakref.WeakSet()
+        self._readers_lock = threading.Lock()
+        # WAL 模式下读写互不阻塞，synchronous=NORMAL 只在检查点时 fsync
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.cursor.execute('PRAGMA synchronous=NORMAL')
         self._create_tables()
 
+    def reader(self) -> sqlite3.Connection:
+        """返回当前线程专用的只读连接，首次调用时创建"""
+        handle = getattr(self._local, 'handle', None)
+        if handle is None:
+            if self.db_path == ':memory:':
+                # 内存库无法被其他连接打开，只能共用写连接
+                return self.conn
+            uri = 'file:' + pathname2url(os.path.abspath(self.db_path)) + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                   cached_statements=SQLITE_CACHED_STATEMENTS)
+            conn.execute('PRAGMA query_only=ON')
+            handle = _ReaderHandle(conn)
+            weakref.finalize(handle, conn.close)
+            self._local.handle = handle
+            with self._readers_lock:
+                self._readers.add(handle)
+        return handle.conn
+
+    def open_reader_count(self) -> int:
+        with self._readers_lock:
+            return len(self._readers)
+
+    def _read(self, sql: str, params=()) -> List[Tuple]:
+        if self.db_path == ':memory:':
+            with self._write_lock:
+                return self.conn.execute(sql, params).fetchall()
+        return self.reader().execute(sql, params).fetchall()
+
+    def iter_batches(self, sql: str, params=(), batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[List[Tuple]]:
+        """用只读连接分批读取大结果集，避免 fetchall() 把整张表读进内存"""
+        cursor = self.reader().cursor()
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def transaction(self):
+        with self._write_lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                self.conn.rollback()
+                raise
+            else:
+                self.conn.commit()
+
     def _create_tables(self):
         self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS books (
@@ -76,28 +402,208 @@ class TensorFlowBookDatabase:
                 FOREIGN KEY (parent_id) REFERENCES contents (id)
             )
         ''')
-        self.conn.commit()
-
-    def insert_book(self, title: str, description: str) -> int:
+        # 内容向量缓存：按 (内容哈希, 模型名) 存 float32 向量，未变化/重复的文本无需重新编码
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                content_hash TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (content_hash, model_name)
+            ) WITHOUT ROWID
+        ''')
+        # 检索过滤按 书 -> 章 -> 类型 取 id 集合
         self.cursor.execute(
-            'INSERT INTO books (title, description) VALUES (?, ?)',
-            (title, description)
+            'CREATE INDEX IF NOT EXISTS idx_contents_scope ON contents (book_id, chapter, content_type)'
         )
         self.conn.commit()
-        return self.cursor.lastrowid
+
+    def insert_book(self, title: str, description: str) -> int:
+        with self.transaction():
+            self.cursor.execute(
+                'INSERT INTO books (title, description) VALUES (?, ?)',
+                (title, description)
+            )
+            return self.cursor.lastrowid
 
     def insert_content(self, content: BookContent) -> int:
-        self.cursor.execute(
-            '''INSERT INTO contents 
-               (book_id, chapter, section, title, content_type, content, parent_id) 
-               VALUES (?, ?, ?, ?, ?, ?, ?)''',
-            (content.book_id, content.chapter, content.section, content.title,
-             content.content_type, content.content, content.parent_id)
+        with self.transaction():
+            self.cursor.execute(
+                '''INSERT INTO contents 
+                   (book_id, chapter, section, title, content_type, content, parent_id) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                (content.book_id, content.chapter, content.section, content.title,
+                 content.content_type, content.content, content.parent_id)
+            )
+            return self.cursor.lastrowid
+
+    def _next_content_id(self) -> int:
+        # AUTOINCREMENT 不复用已删除的 id，需同时参考 sqlite_sequence
+        self.cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'contents'")
+        row = self.cursor.fetchone()
+        seq = row[0] if row else 0
+        self.cursor.execute('SELECT MAX(id) FROM contents')
+        max_id = self.cursor.fetchone()[0] or 0
+        return max(seq, max_id) + 1
+
+    def insert_book_contents(self, title: str, description: str, rows: Iterable[Tuple],
+                             batch_size: int = IMPORT_BATCH_SIZE, replace: bool = False) -> Tuple[int, int, List[int]]:
+        """在一个事务内写入书籍及其全部内容，返回 (book_id, 内容块数, 被替换的旧 content id)
+
+        rows 为 BookContentParser.iter_book_rows 产出的行，其中的序号与父序号
+        在写锁内换算成连续的 content id，因此可以用 executemany 批量写入。
+        replace=True 时在同一事务内先删除同名的旧书，解析中途出错会整体回滚，旧书保持不变。
+        """
+        count = 0
+        replaced_ids = []
+        with self.transaction():
+            if replace:
+                self.cursor.execute('SELECT id FROM books WHERE title = ? ORDER BY id DESC LIMIT 1', (title,))
+                row = self.cursor.fetchone()
+                if row is not None:
+                    replaced_ids = self._delete_book_rows(row[0])
+            self.cursor.execute(
+                'INSERT INTO books (title, description) VALUES (?, ?)',
+                (title, description)
+            )
+            book_id = self.cursor.lastrowid
+            base_id = self._next_content_id()
+            batch = []
+            for index, chapter, section, block_title, content_type, content, parent_index in rows:
+                parent_id = base_id + parent_index if parent_index is not None else None
+                batch.append((base_id + index, book_id, chapter, section, block_title, content_type, content, parent_id))
+                if len(batch) >= batch_size:
+                    self._insert_content_rows(batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self._insert_content_rows(batch)
+                count += len(batch)
+        return book_id, count, replaced_ids
+
+    def _insert_content_rows(self, batch: List[Tuple]):
+        self.cursor.executemany(
+            '''INSERT INTO contents
+               (id, book_id, chapter, section, title, content_type, content, parent_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            batch
         )
-        self.conn.commit()
-        return self.cursor.lastrowid
+
+    def get_book_id(self, title: str) -> Optional[int]:
+        rows = self._read('SELECT id FROM books WHERE title = ? ORDER BY id DESC LIMIT 1', (title,))
+        return rows[0][0] if rows else None
+
+    def get_content_ids(self, book_id: int) -> List[int]:
+        return [row[0] for row in self._read('SELECT id FROM contents WHERE book_id = ?', (book_id,))]
+
+    def delete_book(self, book_id: int) -> List[int]:
+        """删除书籍及其全部内容，返回被删除的 content id"""
+        with self.transaction():
+            return self._delete_book_rows(book_id)
+
+    def _delete_book_rows(self, book_id: int) -> List[int]:
+        # 需在写事务内调用；在事务内读取 id，保证与实际删除的行一致
+        self.cursor.execute('SELECT id FROM contents WHERE book_id = ?', (book_id,))
+        content_ids = [row[0] for row in self.cursor.fetchall()]
+        self.cursor.execute('DELETE FROM contents WHERE book_id = ?', (book_id,))
+        self.cursor.execute('DELETE FROM books WHERE id = ?', (book_id,))
+        return content_ids
+
+    def delete_contents(self, content_ids: List[int]) -> List[int]:
+        """在一个事务内删除内容块，仍被其他内容块作为父节点引用的跳过，返回实际删除的 id"""
+        deleted = []
+        with self.transaction():
+            # 分段执行，避免超过 SQLite 的参数个数上限
+            for start in range(0, len(content_ids), 500):
+                chunk = list(content_ids[start:start + 500])
+                placeholders = ','.join('?' * len(chunk))
+                self.cursor.execute(
+                    f'SELECT DISTINCT parent_id FROM contents WHERE parent_id IN ({placeholders})', chunk)
+                referenced = {row[0] for row in self.cursor.fetchall()}
+                chunk = [cid for cid in chunk if cid not in referenced]
+                if chunk:
+                    self.cursor.execute(
+                        f"DELETE FROM contents WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                    deleted.extend(chunk)
+        return deleted
+
+    def get_book_ids(self, content_ids: List[int]) -> Dict[int, int]:
+        """返回 {content id: book id}，不存在的 id 不包含在内"""
+        found = {}
+        for start in range(0, len(content_ids), 500):
+            chunk = list(content_ids[start:start + 500])
+            found.update(self._read(
+                f"SELECT id, book_id FROM contents WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    def get_contents(self, content_ids: List[int]) -> Dict[int, Tuple[str, str]]:
+        """一次查询取回多条内容，返回 {id: (title, content)}"""
+        if not content_ids:
+            return {}
+        placeholders = ','.join('?' * len(content_ids))
+        with metrics.span("sqlite_fetch"):
+            rows = self._read(
+                f'SELECT id, title, content FROM contents WHERE id IN ({placeholders})',
+                list(content_ids)
+            )
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def existing_content_ids(self, content_ids: List[int]) -> Set[int]:
+        """返回其中仍存在的 content id（AUTOINCREMENT 不复用 id，可据此判断内容是否被删除或重新导入）"""
+        if not content_ids:
+            return set()
+        placeholders = ','.join('?' * len(content_ids))
+        return {row[0] for row in self._read(f'SELECT id FROM contents WHERE id IN ({placeholders})',
+                                             list(content_ids))}
+
+    def get_filtered_ids(self, filters: Tuple) -> List[int]:
+        """返回满足过滤条件的 content id，filters 为 normalize_filters 的结果"""
+        clauses, params = [], []
+        for field, values in filters:
+            clauses.append(f"{field} IN ({','.join('?' * len(values))})")
+            params.extend(values)
+        where = ' AND '.join(clauses) or '1'
+        return [row[0] for row in self._read(f'SELECT id FROM contents WHERE {where}', params)]
+
+    def get_embeddings(self, model_name: str, content_hashes: List[str]) -> Dict[str, bytes]:
+        """返回 {内容哈希: 向量字节}，仅包含已缓存的哈希"""
+        found = {}
+        # 分段查询，避免超过 SQLite 的参数个数上限
+        for start in range(0, len(content_hashes), 500):
+            chunk = content_hashes[start:start + 500]
+            rows = self._read(
+                f"SELECT content_hash, vector FROM embeddings WHERE model_name = ? "
+                f"AND content_hash IN ({','.join('?' * len(chunk))})",
+                [model_name, *chunk]
+            )
+            found.update(rows)
+        return found
+
+    def put_embeddings(self, model_name: str, items: List[Tuple[str, bytes]]):
+        if not items:
+            return
+        with self.transaction():
+            self.cursor.executemany(
+                'INSERT OR REPLACE INTO embeddings (content_hash, model_name, vector) VALUES (?, ?, ?)',
+                [(content_hash, model_name, vector) for content_hash, vector in items]
+            )
+
+    def prune_embeddings(self, keep_model: str) -> int:
+        """删除其他模型的缓存向量，切换模型后旧向量不会再被使用"""
+        with self.transaction():
+            self.cursor.execute('DELETE FROM embeddings WHERE model_name != ?', (keep_model,))
+            return self.cursor.rowcount
+
+    def count_contents(self, content_type: Optional[str] = None) -> int:
+        if content_type is None:
+            return self._read('SELECT COUNT(*) FROM contents')[0][0]
+        return self._read('SELECT COUNT(*) FROM contents WHERE content_type = ?', (content_type,))[0][0]
 
     def close(self):
+        with self._readers_lock:
+            for handle in list(self._readers):
+                handle.conn.close()
+            self._readers = weakref.WeakSet()
+        self._local = threading.local()
         if self.conn:
             self.conn.close()
 
@@ -122,28 +628,47 @@ class BookContentParser:
         return level, section, title_text
 
     def split_content_blocks(self, content: str) -> List[Dict]:
-        blocks, current_text = [], []
-        lines = content.split('\n')
+        return list(self.iter_content_blocks(content.split('\n')))
 
-        i = 0
-        while i < len(lines):
-            line = lines[i].rstrip()
+    def iter_content_blocks(self, lines: Iterable[str]) -> Iterator[Dict]:
+        """逐行解析，边读边产出内容块；lines 可以直接是打开的文件对象"""
+        current_text = []
+        for line in lines:
+            line = line.rstrip()
             level, section, title_text = self.parse_title_level(line)
             if level > 0:
                 if current_text:
-                    blocks.append({'type': 'text', 'content': '\n'.join(current_text).strip()})
+                    yield {'type': 'text', 'content': '\n'.join(current_text).strip()}
                     current_text = []
-                blocks.append({'type': 'title', 'level': level, 'chapter': section.split('.')[0] if section else "", 'section': section, 'content': title_text})
+                yield {'type': 'title', 'level': level, 'chapter': section.split('.')[0] if section else "", 'section': section, 'content': title_text}
             else:
                 current_text.append(line)
-            i += 1
 
         if current_text:
-            blocks.append({'type': 'text', 'content': '\n'.join(current_text).strip()})
-        return blocks
+            yield {'type': 'text', 'content': '\n'.join(current_text).strip()}
 
     def build_hierarchy(self, blocks: List[Dict]) -> List[Dict]:
-        hierarchy, stack = [], []
+        return list(self.iter_hierarchy(blocks))
+
+    def iter_book_rows(self, lines: Iterable[str]) -> Iterator[Tuple]:
+        """产出 (序号, chapter, section, title, content_type, content, 父序号) 行
+
+        父节点总在子节点之前出现，只需保留标题栈即可解析父序号，内存占用与书籍大小无关。
+        """
+        for index, block in enumerate(self.iter_hierarchy(self.iter_content_blocks(lines))):
+            block['index'] = index
+            parent = block['parent']
+            parent_index = parent['index'] if parent else None
+            if block['type'] == 'title':
+                yield index, block['chapter'], block['section'], block['content'], 'title', block['content'], parent_index
+            else:
+                title = parent['content'] if parent else ""
+                chapter = parent['chapter'] if parent else ""
+                section = parent['section'] if parent else ""
+                yield index, chapter, section, title, 'text', block['content'], parent_index
+
+    def iter_hierarchy(self, blocks: Iterable[Dict]) -> Iterator[Dict]:
+        stack = []
         for block in blocks:
             if block['type'] == 'title':
                 while stack and stack[-1]['level'] >= block['level']:
@@ -152,89 +677,430 @@ class BookContentParser:
                 stack.append(block)
             else:
                 block['parent'] = stack[-1] if stack else None
-            hierarchy.append(block)
-        return hierarchy
+            yield block
+
+def _parse_book_file(path: str) -> List[Tuple]:
+    # 供进程池调用，需为模块级函数。进程池只能整体返回结果，一本书的全部行会在子进程中
+    # 物化为列表并整体传回父进程，内存峰值约为单本书内容的两倍
+    with open(path, "r", encoding="utf-8") as f:
+        return list(BookContentParser().iter_book_rows(f))
+
 
 class BookImporter:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, index_path: Optional[str] = None, index_config: Optional[IndexConfig] = None):
         self.db = TensorFlowBookDatabase(db_path)
+        self.index_config = index_config or IndexConfig.from_config()
         self.parser = BookContentParser()
-        self.content_id_map = {}
-        self.id_to_vector_index = {}
+        # 索引以 contents.id 作为向量 id（IndexIDMap2），检索结果可直接对应到内容行
         self.faiss_index = None
+        self._index_mmapped = False
+        # faiss 索引不支持边检索边增删：检索持读锁可并发执行，原地增删向量与替换索引持写锁
+        self._index_lock = ReadWriteLock()
+        # 索引每次重建或增删向量时递增，检索结果缓存以此区分新旧索引
+        self.index_version = 0
+        self.query_embedding_cache = LRUCache(
+            _config_value('QUERY_EMBEDDING_CACHE_SIZE', 2048), _config_value('QUERY_CACHE_TTL', 3600))
+        self.search_result_cache = LRUCache(
+            _config_value('SEARCH_RESULT_CACHE_SIZE', 2048), _config_value('QUERY_CACHE_TTL', 3600))
+        # 过滤条件 -> 已构建好的 IDSelector（范围为空时为 False），随索引版本失效；
+        # 选择器构建与范围内 id 数成正比，缓存后同一范围的检索只付出索引内部的过滤开销
+        self.selector_cache = LRUCache(128)
+        # 删除内容后的回调（参数为被删除的 content id），如让语义回答缓存失效
+        self.removal_listeners = []
+        # 索引文件默认与数据库放在一起
+        self.index_path = index_path or os.path.splitext(db_path)[0] + ".faiss"
+        self._model_lock = threading.Lock()
+        # 模型加载阶段的耗时（使用编码服务时不导入 sentence_transformers，也就没有对应项）
+        self.init_timings = {}
         self._load_embedding_model()
 
     def _load_embedding_model(self):
-        model_options = [
-            {"name": "all-MiniLM-L6-v2", "local_path": "./local_models/all-MiniLM-L6-v2"},
-            {"name": "bert-base-nli-mean-tokens", "local_path": "./local_models/bert-base-nli-mean-tokens"}
-        ]
-        for model_option in model_options:
+        # 优先使用本机共享的编码服务，服务未启动时退回进程内模型
+        socket_path = _config_value('EMBEDDING_SERVER_SOCKET', None)
+        if socket_path and os.path.exists(socket_path):
+            client = EmbeddingClient(socket_path)
             try:
-                if os.path.exists(model_option["local_path"]):
-                    self.embedding_model = SentenceTransformer(model_option["local_path"])
-                else:
-                    os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com/'
-                    self.embedding_model = SentenceTransformer(model_option["name"])
-                print(f"模型加载成功: {model_option['name']}")
+                self.embedding_model_name = client.info()["model_name"]
+                self.embedding_model = client
+                print(f"使用向量编码服务: {socket_path}（模型 {self.embedding_model_name}）")
                 return
-            except Exception as e:
-                print(f"加载模型失败: {e}")
-        raise RuntimeError("所有模型加载失败")
+            except EmbeddingServerError as e:
+                print(f"连接向量编码服务失败，改用进程内模型: {e}")
+        self.embedding_model, self.embedding_model_name = load_embedding_model(self.init_timings)
 
-    def import_book(self, book_title: str, book_description: str, content: str):
-        book_id = self.db.insert_book(book_title, book_description)
-        blocks = self.parser.split_content_blocks(content)
-        hierarchy = self.parser.build_hierarchy(blocks)
+    def import_book(self, book_title: str, book_description: str, content: str,
+                    replace: bool = False, update_index: bool = True) -> int:
+        rows = self.parser.iter_book_rows(content.split('\n'))
+        return self._import_rows(book_title, book_description, rows, replace, update_index)
 
-        for block in hierarchy:
-            parent_id = self.content_id_map.get(id(block['parent']), None)
-            if block['type'] == 'title':
-                content_obj = BookContent(book_id, block['chapter'], block['section'], block['content'], 'title', block['content'], parent_id)
+    def import_book_file(self, path: str, book_title: Optional[str] = None, book_description: str = "",
+                         replace: bool = False, update_index: bool = True) -> int:
+        """流式导入单个 markdown/txt 文件，边读边解析边批量写入"""
+        book_title = book_title or os.path.splitext(os.path.basename(path))[0]
+        with open(path, "r", encoding="utf-8") as f:
+            return self._import_rows(book_title, book_description, self.parser.iter_book_rows(f), replace, update_index)
+
+    def import_directory(self, dir_path: str, workers: Optional[int] = None, suffixes=(".md", ".txt"),
+                         replace: bool = False, update_index: bool = True) -> List[int]:
+        """并行解析目录下的全部书籍，由当前进程逐本写入（SQLite 同一时刻只允许一个写者）
+
+        并行的粒度是整本书：每本书解析完成后整体传回当前进程再写入，内存占用与单本书大小及
+        workers 数量成正比，而不是像 import_book 那样与书籍大小无关。超大的单本书应改用 import_book 流式导入。
+        """
+        paths = sorted(
+            os.path.join(dir_path, name) for name in os.listdir(dir_path)
+            if name.lower().endswith(tuple(suffixes))
+        )
+        update_index = update_index and self._has_index()
+        book_ids = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_parse_book_file, path): path for path in paths}
+            for future in as_completed(futures):
+                book_title = os.path.splitext(os.path.basename(futures[future]))[0]
+                book_ids.append(self._import_rows(book_title, "", future.result(), replace, update_index,
+                                                  save_index=False))
+        if update_index and book_ids:
+            self.save_faiss_index()
+        print(f"目录 {dir_path} 导入完成，共 {len(book_ids)} 本书")
+        return book_ids
+
+    def _import_rows(self, book_title: str, book_description: str, rows: Iterable[Tuple],
+                     replace: bool, update_index: bool, save_index: bool = True) -> int:
+        # 在写入数据库之前确认索引是否存在（加载时会校验向量数与内容行数）
+        update_index = update_index and self._has_index()
+        # replace=True 时旧书的删除与新内容的写入在同一事务内，提交后再更新索引
+        book_id, count, replaced_ids = self.db.insert_book_contents(book_title, book_description, rows,
+                                                                    replace=replace)
+        if replaced_ids:
+            for listener in self.removal_listeners:
+                listener(replaced_ids)
+            print(f"已替换同名书籍的 {len(replaced_ids)} 个旧内容块")
+        print(f"成功导入 {count} 个内容块")
+
+        if update_index:
+            if replaced_ids and not self._index_supports_removal():
+                # 不支持删除向量的索引按库中现有内容重建，新书已包含在内
+                self.build_faiss_index(save=save_index)
             else:
-                title = block['parent']['content'] if block['parent'] else ""
-                chapter = block['parent']['chapter'] if block['parent'] else ""
-                section = block['parent']['section'] if block['parent'] else ""
-                content_obj = BookContent(book_id, chapter, section, title, 'text', block['content'], parent_id)
-
-            content_id = self.db.insert_content(content_obj)
-            self.content_id_map[id(block)] = content_id
-        print(f"成功导入 {len(hierarchy)} 个内容块")
-
-    def build_faiss_index(self):
-        self.db.cursor.execute("SELECT id, content FROM contents")
-        rows = self.db.cursor.fetchall()
-        if not rows:
+                # 已有索引时只移除旧向量、增量编码本书新增的内容，无需全量重建
+                self.remove_from_index(replaced_ids, save=False)
+                self._index_book(book_id, save=save_index)
+        return book_id
+
+    def _index_book(self, book_id: int, batch_size: int = EMBEDDING_BATCH_SIZE, save: bool = True):
+        for rows in self.db.iter_batches(
+                "SELECT id, content FROM contents WHERE book_id = ? AND content_type = ? ORDER BY id",
+                (book_id, INDEXED_CONTENT_TYPE), batch_size):
+            self.add_to_index([row[0] for row in rows], [row[1] or "" for row in rows], save=False)
+        if save and self.faiss_index is not None:
+            self.save_faiss_index()
+
+    def delete_book(self, book_id: int, update_index: bool = True):
+        update_index = update_index and self._has_index()
+        content_ids = self.db.delete_book(book_id)
+        if update_index:
+            self.remove_from_index(content_ids)
+        for listener in self.removal_listeners:
+            listener(content_ids)
+        print(f"已删除书籍 {book_id}，共 {len(content_ids)} 个内容块")
+
+    def delete_contents(self, content_ids: List[int], update_index: bool = True) -> List[int]:
+        """删除指定内容块（仍被引用为父节点的跳过），索引只更新一次，返回实际删除的 id"""
+        update_index = update_index and self._has_index()
+        deleted = self.db.delete_contents(content_ids)
+        if deleted:
+            if update_index:
+                # 不支持删除向量的索引（HNSW）在这里整体重建一次
+                self.remove_from_index(deleted)
+            for listener in self.removal_listeners:
+                listener(deleted)
+        print(f"已删除 {len(deleted)} 个内容块")
+        return deleted
+
+    def _has_index(self) -> bool:
+        return self.faiss_index is not None or self.load_faiss_index()
+
+    def _encode_batches(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+        with metrics.span("encode"):
+            try:
+                vectors = self.embedding_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+            except EmbeddingServerUnavailable as e:
+                # 编码服务中途退出时加载同一模型的进程内实例继续工作；服务返回的单次请求错误直接抛出
+                print(f"向量编码服务不可用，改用进程内模型: {e}")
+                self._switch_to_local_model()
+                vectors = self.embedding_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def _switch_to_local_model(self):
+        """加载进程内模型替换编码服务；模型名或向量维度与当前索引不一致时拒绝切换"""
+        with self._model_lock:
+            if not isinstance(self.embedding_model, EmbeddingClient):
+                return
+            model, model_name = load_embedding_model()
+            if model_name != self.embedding_model_name:
+                raise EmbeddingServerError(
+                    f"编码服务不可用，进程内模型 {model_name} 与索引使用的 {self.embedding_model_name} 不一致")
+            index, dim = self.faiss_index, model.get_sentence_embedding_dimension()
+            if index is not None and dim != index.d:
+                raise EmbeddingServerError(f"编码服务不可用，进程内模型维度 {dim} 与索引维度 {index.d} 不一致")
+            self.embedding_model = model
+
+    @staticmethod
+    def _content_hash(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def embed_contents(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+        """编码书籍内容，优先复用数据库中按内容哈希缓存的向量，只编码从未见过的文本"""
+        hashes = [self._content_hash(text) for text in texts]
+        cached = self.db.get_embeddings(self.embedding_model_name, list(set(hashes)))
+        vectors = {content_hash: np.frombuffer(blob, dtype=np.float32) for content_hash, blob in cached.items()}
+
+        # 同一批内的重复文本（重复标题、样板段落）也只编码一次
+        missing = {}
+        for content_hash, text in zip(hashes, texts):
+            if content_hash not in vectors:
+                missing.setdefault(content_hash, text)
+        if missing:
+            encoded = self._encode_batches(list(missing.values()), batch_size)
+            new_items = []
+            for content_hash, vector in zip(missing, encoded):
+                vectors[content_hash] = vector
+                new_items.append((content_hash, vector.tobytes()))
+            self.db.put_embeddings(self.embedding_model_name, new_items)
+        return np.ascontiguousarray(np.vstack([vectors[content_hash] for content_hash in hashes]), dtype=np.float32)
+
+    def _bump_index_version(self):
+        self.index_version += 1
+        # 旧版本的结果不会再被命中，直接清空以释放内存
+        self.search_result_cache.clear()
+        self.selector_cache.clear()
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.split()).lower()
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """查询向量优先取缓存，未命中的查询合并为一次 encode"""
+        keys = [self._normalize_query(q) for q in queries]
+        cached = [self.query_embedding_cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            vectors = self._encode_batches([keys[i] for i in missing])
+            for i, vector in zip(missing, vectors):
+                self.query_embedding_cache.set(keys[i], vector)
+                cached[i] = vector
+        return np.ascontiguousarray(np.vstack(cached), dtype=np.float32)
+
+    def cache_stats(self) -> Dict[str, Dict]:
+        return {
+            "index_version": self.index_version,
+            "query_embedding": self.query_embedding_cache.stats(),
+            "search_result": self.search_result_cache.stats(),
+        }
+
+    def _index_supports_removal(self) -> bool:
+        # HNSW 不支持删除向量
+        return not isinstance(_base_index(self.faiss_index), faiss.IndexHNSW)
+
+    def _ensure_writable_index(self):
+        # mmap 加载的索引是只读的，修改前先完整读入内存
+        if self._index_mmapped:
+            self.faiss_index = faiss.read_index(self.index_path)
+            apply_search_params(self.faiss_index, self.index_config)
+            self._index_mmapped = False
+
+    def build_faiss_index(self, batch_size: int = EMBEDDING_BATCH_SIZE, save: bool = True):
+        # 全量重建时清理其他模型遗留的缓存向量
+        pruned = self.db.prune_embeddings(self.embedding_model_name)
+        if pruned:
+            print(f"已清理 {pruned} 条其他模型的缓存向量")
+        index = None
+        total = 0
+        # 需要训练的索引（IVF/IVF-PQ）先缓存足够的样本，训练后再依次写入
+        train_size = self.index_config.train_size()
+        pending_ids, pending_vectors, pending_count = [], [], 0
+        # 只读连接分批读取，避免 fetchall() 把整张表读进内存
+        for rows in self.db.iter_batches("SELECT id, content FROM contents WHERE content_type = ? ORDER BY id",
+                                         (INDEXED_CONTENT_TYPE,), batch_size):
+            content_ids = np.array([row[0] for row in rows], dtype=np.int64)
+            vectors = self.embed_contents([row[1] or "" for row in rows], batch_size)
+            total += len(rows)
+            if index is None:
+                pending_ids.append(content_ids)
+                pending_vectors.append(vectors)
+                pending_count += len(rows)
+                if pending_count < train_size:
+                    continue
+                content_ids, vectors = np.concatenate(pending_ids), np.vstack(pending_vectors)
+                pending_ids, pending_vectors = [], []
+                index = create_faiss_index(vectors, self.index_config)
+            index.add_with_ids(vectors, content_ids)
+
+        if index is None and pending_vectors:
+            content_ids, vectors = np.concatenate(pending_ids), np.vstack(pending_vectors)
+            index = create_faiss_index(vectors, self.index_config)
+            index.add_with_ids(vectors, content_ids)
+
+        if index is None:
             print("数据库无内容，无法建立索引")
             return
+        with self._index_lock.write():
+            self.faiss_index = index
+            self._index_mmapped = False
+            self._bump_index_version()
+        print(f"Faiss索引建立完成，包含 {total} 个向量")
 
-        vectors = []
-        self.id_to_vector_index = {}
-        for idx, (content_id, content) in enumerate(rows):
-            vector = self.embedding_model.encode(content)
-            vectors.append(vector)
-            self.id_to_vector_index[content_id] = idx
+        if save:
+            self.save_faiss_index()
 
-        dimension = len(vectors[0])
-        index = faiss.IndexFlatL2(dimension)
-        index.add(np.array(vectors))
-        self.faiss_index = index
+    def add_to_index(self, content_ids: List[int], texts: List[str], save: bool = True):
+        if not content_ids:
+            return
+        vectors = self.embed_contents(texts)
+        ids = np.array(content_ids, dtype=np.int64)
+        with self._index_lock.write():
+            if self.faiss_index is None:
+                self.faiss_index = create_faiss_index(vectors, self.index_config)
+            self._ensure_writable_index()
+            # 先移除同 id 的旧向量，保证重复添加时每个 id 只对应一个向量
+            if self._index_supports_removal():
+                self.faiss_index.remove_ids(ids)
+            self.faiss_index.add_with_ids(vectors, ids)
+            self._bump_index_version()
+        print(f"Faiss索引新增 {len(content_ids)} 个向量")
+        if save:
+            self.save_faiss_index()
 
+    def remove_from_index(self, content_ids: List[int], save: bool = True):
+        if not content_ids or self.faiss_index is None:
+            return
+        if not self._index_supports_removal():
+            # 数据库中的行已删除，直接按剩余内容重建
+            print("当前索引类型不支持删除向量，重建索引")
+            self.build_faiss_index(save=save)
+            return
+        with self._index_lock.write():
+            self._ensure_writable_index()
+            removed = self.faiss_index.remove_ids(np.array(content_ids, dtype=np.int64))
+            self._bump_index_version()
+        print(f"Faiss索引移除 {removed} 个向量")
+        if save:
+            self.save_faiss_index()
 
-        print(f"Faiss索引建立完成，包含 {len(vectors)} 个向量")
+    def save_faiss_index(self):
+        if self.faiss_index is None:
+            raise RuntimeError("请先调用 build_faiss_index() 构建索引")
+        index_dir = os.path.dirname(self.index_path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        # 先写临时文件再替换，避免其他 worker 读到写了一半的索引
+        tmp_index_path = self.index_path + ".tmp"
+        with self._index_lock.read():
+            faiss.write_index(self.faiss_index, tmp_index_path)
+        os.replace(tmp_index_path, self.index_path)
+        print(f"Faiss索引已保存到 {self.index_path}")
 
-    def search(self, query: str, k: int = 5):
+    def load_faiss_index(self, mmap: bool = True) -> bool:
+        if not os.path.exists(self.index_path):
+            return False
+        flag_options = [0]
+        if mmap:
+            # IO_FLAG_MMAP_IFC 仅在较新的 faiss 中提供，用于 mmap 扁平/HNSW 索引的向量数据；
+            # IVF 索引与其不兼容，只能用 IO_FLAG_MMAP 映射倒排表，因此依次尝试
+            flag_options = [faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY, 0]
+            if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+                flag_options.insert(0, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        index, error = None, None
+        for flags in flag_options:
+            try:
+                index = faiss.read_index(self.index_path, flags)
+                mmap = flags != 0
+                break
+            except Exception as e:
+                error = e
+        if index is None:
+            print(f"加载Faiss索引失败: {error}")
+            return False
+        # 旧版本的索引文件包含标题块，数量对不上时同样重建
+        if index.ntotal != self.db.count_contents(INDEXED_CONTENT_TYPE):
+            print("Faiss索引与数据库内容不一致，需要重建")
+            return False
+        apply_search_params(index, self.index_config)
+        with self._index_lock.write():
+            self.faiss_index = index
+            self._index_mmapped = mmap
+            self._bump_index_version()
+        print(f"已从 {self.index_path} 加载Faiss索引，包含 {index.ntotal} 个向量")
+        return True
+
+    def _search_params(self, filters: Tuple):
+        """把过滤条件转换为 faiss 的 IDSelector，在索引内部跳过范围外的向量
+
+        返回 (SearchParameters, selector)，调用方在检索结束前需持有 selector；范围为空时返回 (None, None)
+        """
+        cache_key = (filters, self.index_version)
+        selector = self.selector_cache.get(cache_key)
+        if selector is None:
+            scope = filters + (('content_type', (INDEXED_CONTENT_TYPE,)),)
+            content_ids = np.array(self.db.get_filtered_ids(scope), dtype=np.int64)
+            # IDSelectorBatch 会复制 id 集合，无需保持数组存活
+            selector = faiss.IDSelectorBatch(content_ids.size, faiss.swig_ptr(content_ids)) \
+                if content_ids.size else False
+            self.selector_cache.set(cache_key, selector)
+        if selector is False:
+            return None, None
+        # SearchParameters 每次新建：IndexIDMap 检索时会临时改写其中的 sel，不能在线程间共用
+        base = _base_index(self.faiss_index)
+        # 传入 SearchParameters 会覆盖索引自身的 nprobe/efSearch，需要显式带上
+        if isinstance(base, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe), selector
+        if isinstance(base, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch), selector
+        return faiss.SearchParameters(sel=selector), selector
+
+    def search_batch(self, queries: List[str], k: int = 5,
+                     filters: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """所有查询一次编码、一次矩阵检索，返回 (distances, ids)，形状均为 (len(queries), k)
+
+        filters 按 book_id/chapter/section/content_type 限定范围，在 faiss 检索内部生效。
+        结果按 (规范化查询, k, 过滤条件, 索引版本) 缓存，索引变更后旧结果自动失效
+        """
         if self.faiss_index is None:
             raise RuntimeError("请先调用 build_faiss_index() 构建索引")
-        query_embedding = self.embedding_model.encode(query)
-        distances, indices = self.faiss_index.search(query_embedding.reshape(1, -1), k)
-        result_ids = []
-        for idx in indices[0]:
-            for content_id, vector_index in self.id_to_vector_index.items():
-                if vector_index == idx:
-                    result_ids.append(content_id)
-                    break
-        return result_ids
+        filters = scope_to_index(normalize_filters(filters))
+        if filters is None:
+            # 只要求标题等未建索引的类型
+            empty_ids = np.full((len(queries), k), -1, dtype=np.int64)
+            return np.full(empty_ids.shape, np.inf, dtype=np.float32), empty_ids
+        keys = [(self._normalize_query(q), k, filters, self.index_version) for q in queries]
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        ids = np.empty((len(queries), k), dtype=np.int64)
+        missing = []
+        for i, key in enumerate(keys):
+            cached = self.search_result_cache.get(key)
+            if cached is None:
+                missing.append(i)
+            else:
+                distances[i], ids[i] = cached
+        if missing:
+            # selector 需在检索结束前保持引用，缓存淘汰不会释放正在使用的选择器
+            params, selector = self._search_params(filters) if filters else (None, None)
+            if filters and params is None:
+                # 过滤范围内没有任何内容
+                distances[missing], ids[missing] = np.inf, -1
+                return distances, ids
+            query_embeddings = self._encode_queries([queries[i] for i in missing])
+            with self._index_lock.read(), metrics.span("faiss_search"):
+                found_distances, found_ids = self.faiss_index.search(query_embeddings, k, params=params)
+            for row, i in enumerate(missing):
+                distances[i], ids[i] = found_distances[row], found_ids[row]
+                self.search_result_cache.set(keys[i], (found_distances[row].copy(), found_ids[row].copy()))
+        return distances, ids
+
+    def search(self, query: str, k: int = 5, filters: Optional[Dict] = None):
+        _, ids = self.search_batch([query], k=k, filters=filters)
+        # 向量 id 即 contents.id，-1 表示结果不足 k 个
+        return [int(cid) for cid in ids[0] if cid != -1]
 
     def close(self):
         self.db.close()
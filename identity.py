@@ -0,0 +1,111 @@
+# 请求内用户身份解析：每个请求只查询一次用户，g.user 与 flask-login 的 current_user 共用同一实例
+#
+# 可选的进程内短 TTL 缓存（USER_CACHE_TTL > 0 时启用）保存用户行的列值，命中时通过
+# merge(load=False) 还原为绑定到当前 session 的实例，不访问数据库；教师/学生资料更新或删除时失效。
+from flask import g, session
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+
+from cache import LRUCache
+from exts import db
+from models import Student, Teacher
+
+USER_MODELS = {'teacher': Teacher, 'student': Student}
+
+_MISSING = object()
+
+
+def _config_value(name, default):
+    import config
+    return getattr(config, name, default)
+
+
+user_cache = LRUCache(_config_value('USER_CACHE_SIZE', 4096), _config_value('USER_CACHE_TTL', 0))
+
+
+def _user_type(user):
+    for user_type, model in USER_MODELS.items():
+        if isinstance(user, model):
+            return user_type
+    return None
+
+
+def _record(user):
+    return {attr.key: getattr(user, attr.key) for attr in user.__mapper__.column_attrs}
+
+
+def load_identity(user_type, user_id):
+    """按用户类型和 id 加载用户，优先取缓存；类型未知或 id 为空时返回 None"""
+    model = USER_MODELS.get(user_type)
+    if model is None or user_id is None:
+        return None
+    user_id = int(user_id)
+    key = (user_type, user_id)
+
+    if user_cache.ttl:
+        record = user_cache.get(key)
+        if record is not None:
+            user = model(**record)
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+
+    user = db.session.get(model, user_id)
+    if user is not None and user_cache.ttl:
+        user_cache.set(key, _record(user))
+    return user
+
+
+def get_request_user():
+    """当前请求的用户，整个请求内只解析一次（结果为 None 也会记住）"""
+    user = g.get('_identity', _MISSING)
+    if user is _MISSING:
+        user = load_identity(session.get('user_type'), session.get('user_id'))
+        g._identity = user
+    return user
+
+
+def load_user(user_id):
+    """flask-login 的 user_loader：与 g.user 是同一用户时直接复用，不再查询"""
+    user_type = session.get('user_type')
+    if user_type in USER_MODELS:
+        if str(session.get('user_id')) == str(user_id):
+            return get_request_user()
+        return load_identity(user_type, user_id)
+    # 没有 user_type 时依次尝试教师、学生
+    return load_identity('teacher', user_id) or load_identity('student', user_id)
+
+
+def init_app(app):
+    """注册 flask-login 的 user_loader 和把当前用户绑定到 g.user 的 before_request 钩子，返回 LoginManager"""
+    from flask_login import LoginManager
+
+    login_manager = LoginManager(app)
+    # 与 g.user 共用同一次查询的结果，见 load_user
+    login_manager.user_loader(load_user)
+
+    # 请求前钩子：用户身份绑定到 g 对象（每个请求只查询一次）
+    @app.before_request
+    def bind_request_user():
+        g.user = get_request_user()
+
+    return login_manager
+
+
+def login_test_client(client, user_type, user_id):
+    """让 Flask 测试客户端以指定用户登录（测试与基准测试使用），写入与登录视图相同的 session 键"""
+    with client.session_transaction() as client_session:
+        client_session['user_id'] = user_id
+        client_session['user_type'] = user_type
+        client_session['_user_id'] = str(user_id)
+
+
+def invalidate_user(user):
+    user_cache.pop((_user_type(user), user.id))
+
+
+@event.listens_for(Teacher, 'after_update')
+@event.listens_for(Teacher, 'after_delete')
+@event.listens_for(Student, 'after_update')
+@event.listens_for(Student, 'after_delete')
+def _invalidate_on_change(mapper, connection, target):
+    invalidate_user(target)
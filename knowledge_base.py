@@ -0,0 +1,132 @@
+# 知识库检索器的延迟初始化：应用启动时不加载模型和索引，
+# 每个进程在处理第一个请求时启动后台线程完成初始化，路由通过 get_searcher() 获取实例
+import os
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+from lazy_import import lazy_import
+
+faiss_indexer = lazy_import("faiss_indexer")
+
+STATE_PENDING = "pending"
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+
+
+class KnowledgeBaseNotReady(RuntimeError):
+    """检索器仍在初始化或初始化失败"""
+
+
+class KnowledgeBase:
+    def __init__(self, db_path: Optional[str] = None, retry_delay: float = 5.0, max_retry_delay: float = 300.0):
+        self.db_path = db_path
+        # 初始化失败后等待 retry_delay 秒再由下一个请求触发重试，每次失败等待时间翻倍，不超过 max_retry_delay
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.state = STATE_PENDING
+        self.error = None
+        self.timings = {}
+        self._searcher = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def _started(self) -> bool:
+        if self._pid != os.getpid():
+            return False
+        return self.state != STATE_FAILED or time.monotonic() < self._retry_at
+
+    def start(self, db_path: Optional[str] = None):
+        """在后台线程中初始化；按进程判断，gunicorn fork 出的 worker 会各自重新启动，失败后按退避时间重试"""
+        if self._started():
+            return
+        with self._lock:
+            if self._started():
+                return
+            self._pid = os.getpid()
+            if db_path or not self.db_path:
+                import config
+                self.db_path = db_path or config.KNOWLEDGE_BASE_DB
+            self.state = STATE_LOADING
+            self.error = None
+            self._ready.clear()
+            threading.Thread(target=self._initialize, name="knowledge-base-init", daemon=True).start()
+
+    def _initialize(self):
+        started = time.perf_counter()
+        try:
+            # sentence_transformers（torch）只在未使用编码服务、需要进程内模型时才导入，由 BookImporter 计时
+            t0 = time.perf_counter()
+            __import__("faiss")
+            self.timings["import_faiss"] = time.perf_counter() - t0
+            searcher = faiss_indexer.FaissBookSearcher(self.db_path)
+            self.timings.update(searcher.init_timings)
+            self._searcher = searcher
+            self._failures = 0
+            self.state = STATE_READY
+        except Exception as e:
+            traceback.print_exc()
+            self.error = str(e)
+            delay = min(self.retry_delay * 2 ** self._failures, self.max_retry_delay)
+            self._failures += 1
+            self._retry_at = time.monotonic() + delay
+            self.state = STATE_FAILED
+        finally:
+            self.timings["total"] = time.perf_counter() - started
+            self._ready.set()
+
+    def get_searcher(self, timeout: Optional[float] = 0):
+        """返回已就绪的检索器；timeout 为等待秒数（None 表示一直等待），超时抛出 KnowledgeBaseNotReady"""
+        self.start()
+        self._ready.wait(timeout)
+        if self.state != STATE_READY:
+            raise KnowledgeBaseNotReady(self.error or "知识库正在加载，请稍后再试")
+        return self._searcher
+
+    def status(self) -> Dict:
+        return {
+            "state": self.state,
+            "ready": self.state == STATE_READY,
+            "error": self.error,
+            "failures": self._failures,
+            "timings": {name: round(seconds, 3) for name, seconds in self.timings.items()},
+        }
+
+
+knowledge_base = KnowledgeBase()
+
+
+def init_app(app):
+    """注册首个请求时启动后台初始化的钩子，以及 /ready 就绪检查端点"""
+    from flask import jsonify
+
+    db_path = app.config.get("KNOWLEDGE_BASE_DB")
+
+    @app.before_request
+    def _start_knowledge_base():
+        knowledge_base.start(db_path)
+
+    @app.route("/ready")
+    def ready():
+        status = knowledge_base.status()
+        return jsonify({"retrieval": status}), 200 if status["ready"] else 503
+
+
+def get_searcher(timeout: Optional[float] = 0):
+    return knowledge_base.get_searcher(timeout)
+
+
+def get_importer():
+    """返回用于编码和读写知识库的 BookImporter：检索器已就绪时复用，否则直接创建，不加载 faiss 索引
+
+    批量任务（推荐、去重）只需要编码模型和向量缓存，不必等待整个检索器初始化
+    """
+    if knowledge_base.state == STATE_READY:
+        return knowledge_base._searcher.importer
+    import config
+    return faiss_indexer.BookImporter(knowledge_base.db_path or config.KNOWLEDGE_BASE_DB)
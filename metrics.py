@@ -0,0 +1,268 @@
+# 热点路径耗时统计与 Prometheus 指标
+#
+# span("encode") 等计时块把耗时记入按阶段区分的直方图，请求内的耗时同时累加到当前请求上；
+# SQLAlchemy 游标事件统计每个请求的 SQL 条数与耗时；/metrics 以 Prometheus 文本格式输出。
+# 指标保存在进程内，多 worker 部署时每个进程分别被抓取。
+# 设置 PROFILE_SLOW_REQUEST_MS 后，对每个请求开启 cProfile，超过阈值的请求把结果写入 PROFILE_DIR；
+# 未设置时不注册任何分析钩子。
+# Server-Timing 响应头只在 SERVER_TIMING_HEADER 开启或调试模式下添加，避免向线上用户暴露内部耗时。
+# 流式响应（如 /qa/stream 的 SSE）的请求指标在响应关闭时记录，包含生成器中执行的 SQL 与耗时。
+import bisect
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional, Tuple
+
+# 单位为秒，覆盖从亚毫秒级的缓存命中到数十秒的大模型回复
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # {标签值: [各桶计数（非累计）, 总和, 次数]}
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((key, ([*series[0]], series[1], series[2])) for key, series in self._series.items())
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                labels = _format_labels(self.labels, label_values, 'le="%s"' % le)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {count}"
+
+
+stage_seconds = Histogram("edu_stage_seconds", "热点阶段耗时（编码、faiss 检索、SQLite 读取、星火调用等）", ["stage"])
+request_seconds = Histogram("edu_request_seconds", "HTTP 请求处理耗时", ["endpoint", "method"])
+requests_total = Counter("edu_requests_total", "HTTP 请求数", ["endpoint", "method", "status"])
+sql_seconds = Histogram("edu_sql_query_seconds", "单条 SQL 执行耗时", ["statement"])
+request_sql_queries = Histogram("edu_request_sql_queries", "每个请求执行的 SQL 条数", ["endpoint"],
+                                buckets=SQL_COUNT_BUCKETS)
+request_sql_seconds = Histogram("edu_request_sql_seconds", "每个请求的 SQL 总耗时", ["endpoint"])
+REGISTRY = [stage_seconds, request_seconds, requests_total, sql_seconds, request_sql_queries, request_sql_seconds]
+
+
+class RequestStats:
+    """单个请求内累计的 SQL 与各阶段耗时，保存在 g 上"""
+    __slots__ = ("start", "sql_count", "sql_seconds", "stages", "profiler")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.stages = {}
+        self.profiler = None
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    from flask import g, has_request_context
+    if not has_request_context():
+        return None
+    return g.get("_request_stats")
+
+
+def record(stage: str, seconds: float):
+    """记录一次阶段耗时；在请求内调用时同时累加到该请求"""
+    stage_seconds.observe(seconds, stage)
+    stats = current_request_stats()
+    if stats is not None:
+        stats.stages[stage] = stats.stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def render_latest() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# ---- SQLAlchemy ----
+
+_sql_listening = False
+
+
+def _statement_kind(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("_query_start")
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    sql_seconds.observe(seconds, _statement_kind(statement))
+    stats = current_request_stats()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += seconds
+
+
+def instrument_sqlalchemy():
+    """在 Engine 类上监听游标事件，覆盖应用创建的所有数据库连接（只注册一次）"""
+    global _sql_listening
+    if _sql_listening:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _sql_listening = True
+
+
+# ---- Flask ----
+
+def _endpoint_label(request) -> str:
+    # 使用路由端点名而不是 URL，避免路径参数导致标签数量无限增长
+    return request.endpoint or "unmatched"
+
+
+def _server_timing(stats: RequestStats, total: float) -> str:
+    parts = [f"sql;dur={stats.sql_seconds * 1000:.1f};desc=\"{stats.sql_count} queries\""]
+    parts.extend(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stats.stages.items())
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _dump_profile(profiler, profile_dir: str, endpoint: str, seconds: float):
+    os.makedirs(profile_dir, exist_ok=True)
+    name = re.sub(r"[^\w.-]", "_", endpoint)
+    path = os.path.join(profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{seconds * 1000:.0f}ms.prof")
+    profiler.dump_stats(path)
+    print(f"慢请求 {endpoint} 耗时 {seconds * 1000:.0f}ms，性能分析已写入 {path}")
+
+
+def _observe_request(stats: RequestStats, endpoint: str, method: str, status: int):
+    total = time.perf_counter() - stats.start
+    request_seconds.observe(total, endpoint, method)
+    requests_total.inc(endpoint, method, status)
+    request_sql_queries.observe(stats.sql_count, endpoint)
+    request_sql_seconds.observe(stats.sql_seconds, endpoint)
+
+
+def init_app(app):
+    """注册请求计时钩子与 /metrics；需在其他 before_request 钩子之前调用，才能统计到身份查询等 SQL"""
+    from flask import Response, g, request
+
+    instrument_sqlalchemy()
+    slow_ms = float(app.config.get("PROFILE_SLOW_REQUEST_MS") or 0)
+    profile_dir = app.config.get("PROFILE_DIR") or os.path.join(app.root_path, "profiles")
+    server_timing = bool(app.config.get("SERVER_TIMING_HEADER"))
+
+    @app.before_request
+    def start_request_stats():
+        g._request_stats = RequestStats()
+
+    @app.after_request
+    def finish_request_stats(response):
+        stats = g.get("_request_stats")
+        if stats is None:
+            return response
+        endpoint, method, status = _endpoint_label(request), request.method, response.status_code
+        if response.is_streamed:
+            # 流式响应此时只返回了响应头，生成器中的 SQL 要等响应关闭后才计全
+            response.call_on_close(lambda: _observe_request(stats, endpoint, method, status))
+        else:
+            _observe_request(stats, endpoint, method, status)
+        if server_timing or app.debug:
+            # 流式响应的响应头先于内容发送，只包含生成响应头之前的耗时
+            response.headers["Server-Timing"] = _server_timing(stats, time.perf_counter() - stats.start)
+        return response
+
+    if slow_ms > 0:
+        import cProfile
+
+        @app.before_request
+        def start_profiler():
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # 同一线程已有其他分析器在运行
+                return
+            g._request_stats.profiler = profiler
+
+        # teardown 在流式响应结束后才执行，分析结果包含生成器中的耗时
+        @app.teardown_request
+        def stop_profiler(exc):
+            stats = g.get("_request_stats")
+            if stats is None or stats.profiler is None:
+                return
+            stats.profiler.disable()
+            seconds = time.perf_counter() - stats.start
+            if seconds * 1000 >= slow_ms:
+                _dump_profile(stats.profiler, profile_dir, _endpoint_label(request), seconds)
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return Response(render_latest(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,42 @@
+"""错题保存录入时解析出的知识点；题目内容索引
+
+学情汇总按 wrong_question.topic 增减，不再在删除、修改时按题库重新解析（题库变化后会计到别的知识点上）。
+已有错题按当前题库补上知识点，升级后执行 flask rebuild-analytics 使汇总表与之一致。
+
+Revision ID: 0b370c228417
+Revises: 6ada861c44ac
+Create Date: 2026-10-18 10:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b370c228417'
+down_revision = '6ada861c44ac'
+branch_labels = None
+depends_on = None
+
+UNCATEGORIZED_TOPIC = '未分类'
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'ix_questions_question_text' not in {index['name'] for index in inspector.get_indexes('questions')}:
+        op.create_index('ix_questions_question_text', 'questions', ['question_text'], mysql_length=255)
+    if 'topic' not in {column['name'] for column in inspector.get_columns('wrong_question')}:
+        op.add_column('wrong_question', sa.Column('topic', sa.String(length=100), nullable=True))
+
+    questions = sa.table('questions', sa.column('question_text', sa.Text), sa.column('topic', sa.String))
+    wrong_question = sa.table('wrong_question', sa.column('question_text', sa.Text), sa.column('topic', sa.String))
+    bank_topic = sa.select(sa.func.min(questions.c.topic)) \
+        .where(questions.c.question_text == wrong_question.c.question_text).scalar_subquery()
+    op.execute(wrong_question.update().where(wrong_question.c.topic.is_(None))
+               .values(topic=sa.func.coalesce(bank_topic, UNCATEGORIZED_TOPIC)))
+
+
+def downgrade():
+    with op.batch_alter_table('wrong_question') as batch_op:
+        batch_op.drop_column('topic')
+    op.drop_index('ix_questions_question_text', table_name='questions')
@@ -0,0 +1,63 @@
+"""practice_history 每个学生每天一行：合并重复行后加唯一约束
+
+PracticeHistory.record_practice 的 upsert 依赖 (student_id, date) 唯一约束定位当天的行。
+旧版本没有该约束，get_weekly_practice 并发补 0 等情况会使同一天出现多行；先把同一天的
+多行合并为 id 最小的一行（次数相加），再创建约束。
+
+Revision ID: 3ef487d5cdd6
+Revises: f372727d9876
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3ef487d5cdd6'
+down_revision = 'f372727d9876'
+branch_labels = None
+depends_on = None
+
+CONSTRAINT = 'uq_practice_history_student_date'
+
+practice_history = sa.table(
+    'practice_history',
+    sa.column('id', sa.Integer),
+    sa.column('student_id', sa.Integer),
+    sa.column('count', sa.Integer),
+    sa.column('date', sa.Date),
+)
+
+
+def merge_duplicates(connection):
+    """把同一学生同一天的多行合并为 id 最小的一行，返回删除的行数"""
+    t = practice_history
+    groups = connection.execute(
+        sa.select(t.c.student_id, t.c.date, sa.func.min(t.c.id), sa.func.sum(t.c.count))
+        .group_by(t.c.student_id, t.c.date)
+        .having(sa.func.count() > 1)
+    ).all()
+    removed = 0
+    for student_id, day, keep_id, total in groups:
+        connection.execute(t.update().where(t.c.id == keep_id).values(count=total or 0))
+        removed += connection.execute(
+            t.delete().where(t.c.student_id == student_id, t.c.date == day, t.c.id != keep_id)
+        ).rowcount
+    return removed
+
+
+def upgrade():
+    connection = op.get_bind()
+    existing = {constraint['name'] for constraint in sa.inspect(connection).get_unique_constraints('practice_history')}
+    if CONSTRAINT in existing:
+        return
+    merge_duplicates(connection)
+    # SQLite 不支持 ALTER TABLE ADD CONSTRAINT，batch 模式下会重建表；MySQL 直接执行 ALTER
+    with op.batch_alter_table('practice_history') as batch_op:
+        batch_op.create_unique_constraint(CONSTRAINT, ['student_id', 'date'])
+
+
+def downgrade():
+    with op.batch_alter_table('practice_history') as batch_op:
+        batch_op.drop_constraint(CONSTRAINT, type_='unique')
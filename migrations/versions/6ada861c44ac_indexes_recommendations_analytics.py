@@ -0,0 +1,73 @@
+"""查询索引、推荐结果缓存列、学情分析汇总表
+
+执行 flask db upgrade 前用旧的 flask upgrade-db 补过结构的数据库，已存在的索引、列和表会跳过。
+新建的汇总表为空，升级后执行一次 flask rebuild-analytics 从明细表回填。
+
+Revision ID: 6ada861c44ac
+Revises: 3ef487d5cdd6
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6ada861c44ac'
+down_revision = '3ef487d5cdd6'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_wrong_question_student_recorded', 'wrong_question', ['student_id', 'recorded_at']),
+    ('ix_tasks_student_completed', 'tasks', ['student_id', 'completed']),
+    ('ix_questions_topic', 'questions', ['topic']),
+    ('ix_questions_type', 'questions', ['type']),
+]
+COLUMNS = [
+    ('recommended_topic', sa.Column('question_ids_json', sa.Text(), nullable=True)),
+    ('recommended_topic', sa.Column('fingerprint', sa.String(length=40), nullable=True)),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+    for table, column in COLUMNS:
+        if column.name not in {existing['name'] for existing in inspector.get_columns(table)}:
+            op.add_column(table, column)
+
+    if not inspector.has_table('student_topic_stat'):
+        op.create_table(
+            'student_topic_stat',
+            sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), primary_key=True),
+            sa.Column('topic', sa.String(length=100), primary_key=True),
+            sa.Column('wrong_count', sa.Integer(), nullable=False),
+        )
+    if not inspector.has_table('student_task_stat'):
+        op.create_table(
+            'student_task_stat',
+            sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), primary_key=True),
+            sa.Column('task_count', sa.Integer(), nullable=False),
+            sa.Column('completed_count', sa.Integer(), nullable=False),
+        )
+    if not inspector.has_table('student_weekly_practice'):
+        op.create_table(
+            'student_weekly_practice',
+            sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), primary_key=True),
+            sa.Column('week_start', sa.Date(), primary_key=True),
+            sa.Column('count', sa.Integer(), nullable=False),
+        )
+
+
+def downgrade():
+    op.drop_table('student_weekly_practice')
+    op.drop_table('student_task_stat')
+    op.drop_table('student_topic_stat')
+    with op.batch_alter_table('recommended_topic') as batch_op:
+        for _, column in reversed(COLUMNS):
+            batch_op.drop_column(column.name)
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
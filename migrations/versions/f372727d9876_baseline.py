@@ -0,0 +1,95 @@
+"""初始表结构
+
+已有数据库（此前没有 alembic_version 表）直接执行 flask db upgrade 即可，已存在的表会跳过。
+
+Revision ID: f372727d9876
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f372727d9876'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _create_table(name, *columns):
+    if not sa.inspect(op.get_bind()).has_table(name):
+        op.create_table(name, *columns)
+
+
+def upgrade():
+    _create_table(
+        'teacher',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False, unique=True),
+        sa.Column('password', sa.String(length=200), nullable=False),
+        sa.Column('subject', sa.String(length=100), nullable=True),
+        sa.Column('teacher_id', sa.String(length=50), nullable=False, unique=True),
+    )
+    _create_table(
+        'student',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False, unique=True),
+        sa.Column('password', sa.String(length=200), nullable=False),
+        sa.Column('student_id', sa.String(length=50), nullable=False, unique=True),
+    )
+    _create_table(
+        'questions',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('question_text', sa.Text(), nullable=False),
+        sa.Column('topic', sa.String(length=100), nullable=True),
+        sa.Column('correct_answer', sa.Text(), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        'student_question',
+        sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), primary_key=True),
+        sa.Column('question_id', sa.Integer(), sa.ForeignKey('questions.id'), primary_key=True),
+        sa.Column('added_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        'wrong_question',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), nullable=False),
+        sa.Column('question_text', sa.Text(), nullable=False),
+        sa.Column('correct_answer', sa.Text(), nullable=False),
+        sa.Column('error_reason', sa.Text(), nullable=False),
+        sa.Column('recorded_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        'recommended_topic',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), nullable=True),
+        sa.Column('topics_json', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        'practice_history',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), nullable=True),
+        sa.Column('count', sa.Integer(), nullable=True),
+        sa.Column('date', sa.Date(), nullable=True),
+    )
+    _create_table(
+        'tasks',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('completed', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade():
+    for name in ('tasks', 'practice_history', 'recommended_topic', 'wrong_question', 'student_question',
+                 'questions', 'student', 'teacher'):
+        op.drop_table(name)
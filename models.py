@@ -5,51 +5,113 @@ from datetime import datetime, timedelta, timezone
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from sqlalchemy.orm import relationship
+from sqlalchemy import func
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+
+def upsert_increment(connection, table, keys, increments):
+    """按 keys 定位一行，不存在则插入，存在则各计数列加上 increments；单条语句，并发下不丢失计数"""
+    values = {**keys, **increments}
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        stmt = mysql.insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(
+            **{name: table.c[name] + stmt.inserted[name] for name in increments}
+        )
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + stmt.excluded[name] for name in increments}
+        )
+    elif dialect == 'postgresql':
+        stmt = postgresql.insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + stmt.excluded[name] for name in increments}
+        )
+    else:
+        update_or_insert(connection, table, keys, increments)
+        return
+    connection.execute(stmt)
+
+
+def update_or_insert(connection, table, keys, increments):
+    """没有 upsert 语法的数据库：先累加，未命中再插入；并发插入同一行触发唯一约束时改为再累加一次"""
+    update = table.update().where(*[table.c[name] == value for name, value in keys.items()]).values(
+        **{name: table.c[name] + value for name, value in increments.items()}
+    )
+    if connection.execute(update).rowcount:
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(table.insert().values(**keys, **increments))
+    except IntegrityError:
+        connection.execute(update)
+
+
+def week_start(day):
+    # 以周一作为一周的开始
+    return day - timedelta(days=day.weekday())
+
 
 class PracticeHistory(db.Model):
+    # 每个学生每天一行，练习次数通过 record_practice 原子累加
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'date', name='uq_practice_history_student_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'))
     count = db.Column(db.Integer)
     date = db.Column(db.Date)
 
+    @staticmethod
+    def _today():
+        return datetime.now(timezone(timedelta(hours=8))).date()
+
+    @classmethod
+    def record_practice(cls, student_id, count=1, day=None):
+        """当天练习次数 +count，不存在则插入；单条 upsert 语句，并发提交不会丢失计数
+
+        不提交事务，由调用方与同一请求中的其他写入一起提交
+        """
+        day = day or cls._today()
+        connection = db.session.connection()
+        upsert_increment(connection, cls.__table__, {'student_id': student_id, 'date': day}, {'count': count})
+        # Core 语句不会触发 ORM 事件，周汇总在同一事务内直接累加
+        upsert_increment(connection, StudentWeeklyPractice.__table__,
+                         {'student_id': student_id, 'week_start': week_start(day)}, {'count': count})
+
     @classmethod
     def get_weekly_practice(cls, student_id):
-        today = datetime.now(timezone(timedelta(hours=8))).date()
-        # 查询最近7天记录
-        records = cls.query.filter(
-            cls.student_id == student_id,
-            cls.date >= today - timedelta(days=6),
+        return cls.get_weekly_practice_for_students([student_id])[student_id]
+
+    @classmethod
+    def get_weekly_practice_for_students(cls, student_ids):
+        """一次 GROUP BY 查询返回多个学生最近7天的练习次数，缺失日期在内存中补 0（只读，不写库）
+
+        返回 {student_id: {"labels": [...], "data": [...]}}，顺序从早到晚
+        """
+        student_ids = list(student_ids)
+        today = cls._today()
+        days = [today - timedelta(days=i) for i in range(6, -1, -1)]
+        labels = [day.strftime('%m-%d') for day in days]
+        if not student_ids:
+            return {}
+
+        rows = db.session.query(cls.student_id, cls.date, func.sum(cls.count)).filter(
+            cls.student_id.in_(student_ids),
+            cls.date >= days[0],
             cls.date <= today
-        ).all()
-
-        # 构建日期到练习次数的映射
-        record_map = {record.date: record.count for record in records}
-
-        # 补全缺失日期，默认为 0
-        labels = []
-        data = []
-        for i in range(7):
-            day = today - timedelta(days=i)
-            labels.append(day.strftime('%m-%d'))
-            data.append(record_map.get(day, None))  # 先设为 None 表示可能缺失
-
-        # 补全缺失的记录
-        for i in range(7):
-            day = today - timedelta(days=i)
-            if data[i] is None:
-                # 插入默认记录
-                new_record = PracticeHistory(
-                    student_id=student_id,
-                    count=0,
-                    date=day
-                )
-                db.session.add(new_record)
-                data[i] = 0  # 补为0
-
-        db.session.commit()  # 提交新增的默认记录
-
-        # 返回顺序：从早到晚（倒序）
-        return {"labels": labels[::-1], "data": data[::-1]}
+        ).group_by(cls.student_id, cls.date).all()
+
+        counts = {(student_id, day): int(total or 0) for student_id, day, total in rows}
+        return {
+            student_id: {"labels": list(labels), "data": [counts.get((student_id, day), 0) for day in days]}
+            for student_id in student_ids
+        }
 
 class Teacher(db.Model, UserMixin):
     __tablename__ = 'teacher'
@@ -84,6 +146,10 @@ class Student(db.Model, UserMixin):
 
 class WrongQuestion(db.Model):
     __tablename__ = 'wrong_question'
+    # 错题本按学生、时间倒序分页
+    __table_args__ = (
+        db.Index('ix_wrong_question_student_recorded', 'student_id', 'recorded_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)  # 主键ID
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)  # 所属学生ID
@@ -91,31 +157,65 @@ class WrongQuestion(db.Model):
     correct_answer = db.Column(db.Text, nullable=False)  # 正确答案
     error_reason = db.Column(db.Text, nullable=False)
     recorded_at = db.Column(db.DateTime, default=datetime.utcnow)  # 记录时间
+    # 录入时按题目内容对应到的题库知识点（未匹配为“未分类”），之后题库变化不影响已有错题，见 analytics.py
+    topic = db.Column(db.String(100), nullable=True)
 
     # 与 Student 表的关联，反向引用到 Student 的错题记录
     student = db.relationship("Student", back_populates="wrong_questions")
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'student_id': self.student_id,
+            'question_text': self.question_text,
+            'correct_answer': self.correct_answer,
+            'error_reason': self.error_reason,
+            'topic': self.topic,
+            'recorded_at': self.recorded_at.isoformat() if self.recorded_at else None
+        }
+
 class RecommendedTopic(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'))
     topics_json = db.Column(db.Text)  # 存储 JSON 字符串
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # recommender.py 生成：推荐题目 id 列表（JSON）与生成时错题集合的指纹，指纹不变则不重新计算
+    question_ids_json = db.Column(db.Text)
+    fingerprint = db.Column(db.String(40))
     student = db.relationship('Student', back_populates='recommended_topics')
 
 
 
 class Question(db.Model):
     __tablename__ = 'questions'  # 表名
+    # 错题录入时按题目内容查找知识点；MySQL 的 TEXT 列只能建前缀索引
+    __table_args__ = (
+        db.Index('ix_questions_question_text', 'question_text', mysql_length=255),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     question_text = db.Column(db.Text, nullable=False)  # 题目内容
-    topic = db.Column(db.String(100), nullable=True)  # 所属知识点/章节
+    topic = db.Column(db.String(100), nullable=True, index=True)  # 所属知识点/章节
     correct_answer = db.Column(db.Text, nullable=False)  # 正确答案
-    type = db.Column(db.String(50), nullable=True)  # 题目类型：选择题、简答题等
+    type = db.Column(db.String(50), nullable=True, index=True)  # 题目类型：选择题、简答题等
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'question_text': self.question_text,
+            'topic': self.topic,
+            'correct_answer': self.correct_answer,
+            'type': self.type,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
 
 class Task(db.Model):
     __tablename__ = 'tasks'
+    # 任务列表按学生和完成状态筛选
+    __table_args__ = (
+        db.Index('ix_tasks_student_completed', 'student_id', 'completed'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
@@ -135,3 +235,34 @@ class Task(db.Model):
         }
 
 
+# ---- 学情分析汇总表：由 analytics.py 中的 ORM 事件在写入时增量维护，flask rebuild-analytics 全量重算 ----
+
+class StudentTopicStat(db.Model):
+    """每个学生在各知识点上的错题数"""
+    __tablename__ = 'student_topic_stat'
+
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    topic = db.Column(db.String(100), primary_key=True)
+    wrong_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class StudentTaskStat(db.Model):
+    """每个学生的任务总数与已完成数"""
+    __tablename__ = 'student_task_stat'
+
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    task_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def completion_rate(self):
+        return self.completed_count / self.task_count if self.task_count else 0.0
+
+
+class StudentWeeklyPractice(db.Model):
+    """每个学生每周（周一开始）的练习总次数"""
+    __tablename__ = 'student_weekly_practice'
+
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    week_start = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
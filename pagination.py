@@ -0,0 +1,84 @@
+# 基于游标的分页（keyset pagination）：按排序列的最后一行取值定位下一页，
+# 不使用 OFFSET，数据量增长后每页的查询代价不变
+import base64
+import json
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """游标无法解析或与排序列不匹配"""
+
+
+def encode_cursor(values: Sequence) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> List:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise InvalidCursor('无效的分页游标') from None
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor('无效的分页游标')
+    decoded = []
+    for column, value in zip(columns, values):
+        if value is not None and column.type.python_type is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise InvalidCursor('无效的分页游标') from None
+        decoded.append(value)
+    return decoded
+
+
+def _equal(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def _after(columns: Sequence, values: Sequence):
+    # 降序排列时“下一页”即 (c1, c2, ...) 按字典序小于游标，展开为 OR 条件以便命中复合索引。
+    # NULL 按 MySQL/SQLite 的规则视为最小值、降序时排在最后：游标值非空时，可空列的 NULL 行也在“之后”；
+    # 游标值为 NULL 时不存在更小的值，该列只参与后续列的相等条件
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        if value is None:
+            continue
+        equal = [_equal(columns[j], values[j]) for j in range(i)]
+        less = column < value
+        if getattr(column, 'nullable', True):
+            less = or_(less, column.is_(None))
+        clauses.append(and_(*equal, less))
+    return or_(*clauses)
+
+
+def parse_limit(raw, default: int = DEFAULT_PAGE_SIZE) -> int:
+    try:
+        limit = int(raw) if raw not in (None, '') else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_page(query, columns: Sequence, cursor: Optional[str], limit: int,
+                serialize: Callable = lambda row: row.to_dict()) -> Dict:
+    """按 columns 降序返回一页：{"items": [...], "next_cursor": str 或 None}
+
+    columns 的最后一列须唯一且非空（通常为主键），保证排序稳定；其余列中的 NULL 视为最小值，排在最后
+    """
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, columns)))
+    rows = query.order_by(*[column.desc() for column in columns]).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return {"items": [serialize(row) for row in rows], "next_cursor": next_cursor}
@@ -0,0 +1,197 @@
+# 知识点/题目推荐：按错题语义为整个班级批量打分，每个学生只保留一条当前推荐
+#
+# 学生画像为其错题（题目 + 错因）向量的均值，与题库向量做一次矩阵乘法得到全部候选题目的相似度，
+# 再按知识点汇总得到推荐知识点。向量由知识库的 BookImporter 编码，并按内容哈希持久缓存，
+# 题库与错题不变时不会重复编码；学生的错题集合与题库版本都不变时直接复用已有推荐。
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from exts import db
+from models import Question, RecommendedTopic, Student, WrongQuestion
+
+# 每次参与矩阵运算的学生数，限制相似度矩阵的内存占用
+STUDENT_CHUNK_SIZE = 256
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _digest(parts: Iterable[str]) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def bank_version(rows) -> str:
+    """题库内容哈希（id、题目、知识点），题目被修改、删除或新增时都会变化"""
+    return _digest(f"{row[0]}\x01{row[1] or ''}\x01{row[2] or ''}" for row in rows)
+
+
+def wrong_set_fingerprint(wrong_rows, version: str) -> str:
+    """学生错题（id、题目、错因）与题库版本的指纹，任一变化都需要重新推荐"""
+    return _digest([version] + sorted(f"{row[0]}\x01{row[2] or ''}\x01{row[3] or ''}" for row in wrong_rows))
+
+
+class TopicRecommender:
+    def __init__(self, encoder=None, top_topics: int = 3, top_questions: int = 10):
+        # encoder 需提供 embed_contents(texts) -> np.ndarray，默认使用知识库的 BookImporter
+        self._encoder = encoder
+        self.top_topics = top_topics
+        self.top_questions = top_questions
+        self._bank = None
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            import knowledge_base
+            self._encoder = knowledge_base.get_importer()
+        return self._encoder
+
+    @staticmethod
+    def _bank_rows():
+        """返回 (题库行, 题库版本)；只读取文本计算哈希，不编码"""
+        rows = db.session.query(Question.id, Question.question_text, Question.topic).order_by(Question.id).all()
+        return rows, bank_version(rows)
+
+    def _question_bank(self, rows, version: str):
+        """题库向量与知识点矩阵，题库版本未变化时复用"""
+        if self._bank is not None and self._bank["version"] == version:
+            return self._bank
+
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        texts = [row[1] or "" for row in rows]
+        vectors = _normalize(self.encoder.embed_contents(texts)) if rows else np.zeros((0, 1), dtype=np.float32)
+
+        topics = sorted({row[2] for row in rows if row[2]})
+        topic_index = {topic: i for i, topic in enumerate(topics)}
+        # 题目 -> 知识点的 one-hot 矩阵，按列归一化后与相似度相乘即为各知识点的平均相似度
+        membership = np.zeros((len(rows), len(topics)), dtype=np.float32)
+        for i, row in enumerate(rows):
+            if row[2]:
+                membership[i, topic_index[row[2]]] = 1.0
+        membership /= np.maximum(membership.sum(axis=0, keepdims=True), 1.0)
+
+        # 题库中可能有多道题文本相同，同一文本对应全部下标
+        text_index = {}
+        for i, text in enumerate(texts):
+            text_index.setdefault(text, []).append(i)
+
+        self._bank = {
+            "version": version,
+            "ids": ids,
+            "vectors": vectors,
+            "topics": topics,
+            "membership": membership,
+            "text_index": text_index,
+        }
+        return self._bank
+
+    def recommend(self, student_ids: Optional[Iterable[int]] = None, force: bool = False) -> Dict[int, RecommendedTopic]:
+        """为一批学生（默认全部）更新推荐，只重新计算错题或题库有变化的学生，返回 {student_id: 推荐}"""
+        if student_ids is None:
+            student_ids = [row[0] for row in db.session.query(Student.id)]
+        student_ids = list(student_ids)
+        if not student_ids:
+            return {}
+
+        wrong = {student_id: [] for student_id in student_ids}
+        for row in db.session.query(WrongQuestion.id, WrongQuestion.student_id, WrongQuestion.question_text,
+                                    WrongQuestion.error_reason).filter(WrongQuestion.student_id.in_(student_ids)):
+            wrong[row[1]].append(row)
+
+        current = {}
+        for rec in RecommendedTopic.query.filter(RecommendedTopic.student_id.in_(student_ids)) \
+                .order_by(RecommendedTopic.updated_at, RecommendedTopic.id):
+            current.setdefault(rec.student_id, []).append(rec)
+
+        # 题库变化（题目修改、知识点调整）后已有推荐同样失效，题库版本计入每个学生的指纹
+        bank_rows, version = self._bank_rows()
+        fingerprints = {student_id: wrong_set_fingerprint(rows, version) for student_id, rows in wrong.items()}
+        stale = [
+            student_id for student_id in student_ids
+            if force or not current.get(student_id) or current[student_id][-1].fingerprint != fingerprints[student_id]
+        ]
+
+        results = {student_id: recs[-1] for student_id, recs in current.items() if student_id not in stale}
+        if stale:
+            scored = self._score([student_id for student_id in stale if wrong[student_id]], wrong, bank_rows, version)
+            for student_id in stale:
+                topics, question_ids = scored.get(student_id, ([], []))
+                results[student_id] = self._store(student_id, current.get(student_id, []), topics, question_ids,
+                                                  fingerprints[student_id])
+            db.session.commit()
+        return results
+
+    def _score(self, student_ids: List[int], wrong: Dict[int, list], bank_rows, version: str) -> Dict[int, tuple]:
+        if not student_ids or not bank_rows:
+            return {}
+        bank = self._question_bank(bank_rows, version)
+
+        # 全部错题一次编码，按学生求均值得到画像
+        owners, texts = [], []
+        for position, student_id in enumerate(student_ids):
+            for row in wrong[student_id]:
+                owners.append(position)
+                texts.append(f"{row[2] or ''} {row[3] or ''}".strip())
+        vectors = _normalize(self.encoder.embed_contents(texts))
+        owners = np.array(owners)
+        profiles = np.zeros((len(student_ids), vectors.shape[1]), dtype=np.float32)
+        np.add.at(profiles, owners, vectors)
+        profiles = _normalize(profiles)
+
+        results = {}
+        k = min(self.top_questions, len(bank["ids"]))
+        for start in range(0, len(student_ids), STUDENT_CHUNK_SIZE):
+            chunk = student_ids[start:start + STUDENT_CHUNK_SIZE]
+            scores = profiles[start:start + len(chunk)] @ bank["vectors"].T
+
+            # 知识点得分为该知识点下题目相似度的平均值，在屏蔽已做错的题目之前计算
+            topic_scores = scores @ bank["membership"] if bank["topics"] else None
+
+            # 已经做错的原题不再推荐
+            for offset, student_id in enumerate(chunk):
+                done = [i for row in wrong[student_id] for i in bank["text_index"].get(row[2], ())]
+                scores[offset, done] = -np.inf
+
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for offset, student_id in enumerate(chunk):
+                picks = top[offset][np.argsort(-scores[offset, top[offset]])]
+                picks = picks[np.isfinite(scores[offset, picks])]
+                topics = []
+                if topic_scores is not None:
+                    order = np.argsort(-topic_scores[offset])[:self.top_topics]
+                    topics = [bank["topics"][i] for i in order]
+                results[student_id] = (topics, [int(question_id) for question_id in bank["ids"][picks]])
+        return results
+
+    @staticmethod
+    def _store(student_id: int, existing: List[RecommendedTopic], topics: List[str], question_ids: List[int],
+               fingerprint: str) -> RecommendedTopic:
+        # 每个学生只保留最新一条推荐，历史遗留的多条记录一并清理
+        if existing:
+            rec = existing[-1]
+            for old in existing[:-1]:
+                db.session.delete(old)
+        else:
+            rec = RecommendedTopic(student_id=student_id)
+            db.session.add(rec)
+        rec.topics_json = json.dumps(topics, ensure_ascii=False)
+        rec.question_ids_json = json.dumps(question_ids)
+        rec.fingerprint = fingerprint
+        rec.updated_at = datetime.utcnow()
+        return rec
+
+
+recommender = TopicRecommender()
+
+
+def recommend_for_students(student_ids: Optional[Iterable[int]] = None, force: bool = False):
+    return recommender.recommend(student_ids, force)
@@ -0,0 +1,336 @@
+# 星火大模型（SparkAI）流式客户端
+#
+# 基于 asyncio + websockets：预先建立并保持若干条已鉴权的连接以省去握手耗时，
+# 全局并发数受信号量限制（超出时排队，排队超时返回繁忙），逐个 token 产出回复。
+# Flask 视图通过 stream_sync() 在后台事件循环中消费，客户端断开时取消对应请求。
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import queue
+import threading
+import time
+from collections import deque
+from email.utils import formatdate
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+import metrics
+from answer_cache import get_answer_cache
+from lazy_import import lazy_import
+
+websockets = lazy_import("websockets")
+
+
+class SparkError(RuntimeError):
+    """星火接口返回错误或连接异常"""
+
+
+class SparkBusyError(SparkError):
+    """并发已满且排队超时"""
+
+
+class SparkTimeoutError(SparkError):
+    """首个 token 或整段回复超时"""
+
+
+def build_auth_url(url: str, api_key: str, api_secret: str) -> str:
+    """按讯飞 hmac-sha256 规则签名，签名含当前时间，每次建连都需重新生成"""
+    parsed = urlparse(url)
+    date = formatdate(usegmt=True)
+    signature_origin = f"host: {parsed.netloc}\ndate: {date}\nGET {parsed.path} HTTP/1.1"
+    signature = base64.b64encode(
+        hmac.new(api_secret.encode("utf-8"), signature_origin.encode("utf-8"), hashlib.sha256).digest()
+    ).decode("utf-8")
+    authorization_origin = (
+        f'api_key="{api_key}", algorithm="hmac-sha256", '
+        f'headers="host date request-line", signature="{signature}"'
+    )
+    authorization = base64.b64encode(authorization_origin.encode("utf-8")).decode("utf-8")
+    return url + "?" + urlencode({"authorization": authorization, "date": date, "host": parsed.netloc})
+
+
+class SparkStreamClient:
+    def __init__(self, url: str, app_id: str, api_key: str, api_secret: str, domain: str,
+                 max_concurrency: int = 8, queue_timeout: float = 10.0, first_token_timeout: float = 10.0,
+                 request_timeout: float = 60.0, warm_connections: int = 2, max_idle: float = 30.0,
+                 temperature: float = 0.5, max_tokens: int = 2048):
+        self.url = url
+        self.app_id = app_id
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.domain = domain
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.first_token_timeout = first_token_timeout
+        self.request_timeout = request_timeout
+        self.warm_connections = warm_connections
+        self.max_idle = max_idle
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self._semaphore = None
+        self._spare = deque()
+        self._refilling = 0
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "SparkStreamClient":
+        import config
+        return cls(
+            config.SPARKAI_URL, config.SPARKAI_APP_ID, config.SPARKAI_API_KEY, config.SPARKAI_API_SECRET,
+            config.SPARKAI_DOMAIN,
+            max_concurrency=config.SPARKAI_MAX_CONCURRENCY,
+            queue_timeout=config.SPARKAI_QUEUE_TIMEOUT,
+            first_token_timeout=config.SPARKAI_FIRST_TOKEN_TIMEOUT,
+            request_timeout=config.SPARKAI_REQUEST_TIMEOUT,
+            warm_connections=config.SPARKAI_WARM_CONNECTIONS,
+        )
+
+    def _payload(self, messages: List[Dict], uid: Optional[str]) -> str:
+        return json.dumps({
+            "header": {"app_id": self.app_id, "uid": uid or "edu_web_app"},
+            "parameter": {"chat": {"domain": self.domain, "temperature": self.temperature,
+                                   "max_tokens": self.max_tokens}},
+            "payload": {"message": {"text": messages}},
+        }, ensure_ascii=False)
+
+    async def _connect(self):
+        return await websockets.connect(
+            build_auth_url(self.url, self.api_key, self.api_secret),
+            open_timeout=self.first_token_timeout, max_size=None,
+        )
+
+    async def _acquire_connection(self) -> Tuple[object, bool]:
+        """返回 (连接, 是否为预热连接)；闲置过久的预热连接可能已被服务端关闭，直接丢弃"""
+        while self._spare:
+            ws, opened_at = self._spare.popleft()
+            if time.monotonic() - opened_at < self.max_idle:
+                return ws, True
+            await ws.close()
+        return await self._connect(), False
+
+    async def _refill(self):
+        # 调用方已将 _refilling 加一，避免同一时刻重复补充
+        try:
+            ws = await self._connect()
+            self._spare.append((ws, time.monotonic()))
+        except Exception:
+            # 预热失败不影响当前请求，下次请求时再直接建连
+            pass
+        finally:
+            self._refilling -= 1
+
+    def _schedule_refill(self):
+        # 星火每条连接只服务一次问答，用掉一条就在后台补一条
+        loop = asyncio.get_running_loop()
+        while len(self._spare) + self._refilling < self.warm_connections:
+            self._refilling += 1
+            loop.create_task(self._refill())
+
+    async def warm_up(self):
+        self._schedule_refill()
+
+    @staticmethod
+    def _parse_frame(raw) -> Tuple[List[str], bool]:
+        """解析一帧回复，返回 (内容片段, 是否为最后一帧)；格式不符时抛出 SparkError"""
+        try:
+            data = json.loads(raw)
+            header = data.get("header", {})
+            if header.get("code", 0) != 0:
+                raise SparkError(f"星火接口错误 {header.get('code')}: {header.get('message')}")
+            choices = data.get("payload", {}).get("choices", {})
+            contents = [item["content"] for item in choices.get("text", []) if item.get("content")]
+            return contents, choices.get("status") == 2 or header.get("status") == 2
+        except (ValueError, AttributeError, TypeError, KeyError) as e:
+            # JSON 解析失败或帧结构不符合协议，统一按接口错误上报，SSE 可以正常结束
+            raise SparkError(f"星火接口返回了无法解析的数据: {e}") from e
+
+    async def _exchange(self, ws, payload: str) -> AsyncIterator[str]:
+        """在一条连接上发送请求并逐段产出回复，连接由调用方关闭"""
+        await ws.send(payload)
+        deadline = time.monotonic() + self.request_timeout
+        timeout = self.first_token_timeout
+        while True:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                raise SparkTimeoutError("星火接口响应超时") from None
+            contents, done = self._parse_frame(raw)
+            for content in contents:
+                yield content
+            if done:
+                return
+            timeout = deadline - time.monotonic()
+
+    async def stream(self, messages: List[Dict], uid: Optional[str] = None) -> AsyncIterator[str]:
+        """逐段产出回复内容；调用方取消（学生离开页面）时连接会被关闭并释放并发名额"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise SparkBusyError("当前提问人数较多，请稍后再试") from None
+
+        try:
+            payload = self._payload(messages, uid)
+            ws, pooled = await self._acquire_connection()
+            self._schedule_refill()
+            while True:
+                received = False
+                try:
+                    async for token in self._exchange(ws, payload):
+                        received = True
+                        yield token
+                    break
+                except (OSError, websockets.exceptions.WebSocketException):
+                    # 预热连接可能在闲置期间被服务端断开：尚未产出内容时换一条新连接重试一次
+                    if not pooled or received:
+                        raise
+                    pooled = False
+                finally:
+                    await ws.close()
+                ws = await self._connect()
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            raise SparkError(f"星火接口连接失败: {e}") from e
+        finally:
+            self._semaphore.release()
+
+    async def complete(self, messages: List[Dict], uid: Optional[str] = None) -> str:
+        return "".join([token async for token in self.stream(messages, uid)])
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="spark-client", daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self.warm_up(), self._loop)
+        return self._loop
+
+    def stream_sync(self, messages: List[Dict], uid: Optional[str] = None) -> Iterator[str]:
+        """供同步的 Flask 视图使用：在后台事件循环中运行 stream()，生成器被关闭时取消请求"""
+        loop = self._ensure_loop()
+        tokens = queue.Queue()
+
+        async def pump():
+            try:
+                async for token in self.stream(messages, uid):
+                    tokens.put(("token", token))
+                tokens.put(("done", None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                tokens.put(("error", e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
+        start = time.perf_counter()
+        first_token = True
+        try:
+            while True:
+                kind, value = tokens.get()
+                if kind == "token":
+                    if first_token:
+                        # 首个 token 的等待包含排队、取连接和模型首包延迟
+                        metrics.record("spark_first_token", time.perf_counter() - start)
+                        first_token = False
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            # 正常结束时 future 已完成，cancel 无副作用；客户端断开时据此中止上游请求
+            future.cancel()
+            metrics.record("spark", time.perf_counter() - start)
+
+    def close(self):
+        if self._loop is not None:
+            async def _close_spare():
+                while self._spare:
+                    ws, _ = self._spare.popleft()
+                    await ws.close()
+            asyncio.run_coroutine_threadsafe(_close_spare(), self._loop).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> SparkStreamClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SparkStreamClient.from_config()
+    return _client
+
+
+def build_messages(question: str, history: Optional[List[Dict]] = None, k: int = 3) -> Tuple[List[Dict], List[int]]:
+    """拼接对话，返回 (messages, 引用的 content id)；知识库已就绪时附上检索到的教材片段作为参考"""
+    import knowledge_base
+
+    messages, content_ids = [], []
+    try:
+        results = knowledge_base.get_searcher(timeout=0).search(question, k=k)
+        if results:
+            content_ids = [item["id"] for item in results]
+            passages = "\n\n".join(item["content"] for item in results)
+            messages.append({"role": "system", "content": "请参考以下教材内容回答学生的问题：\n" + passages})
+    except knowledge_base.KnowledgeBaseNotReady:
+        pass
+    messages.extend(history or [])
+    messages.append({"role": "user", "content": question})
+    return messages, content_ids
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def init_app(app):
+    """注册 /qa/stream：以 Server-Sent Events 逐段推送星火回复"""
+    from flask import Response, g, jsonify, request, stream_with_context
+
+    @app.route("/qa/stream", methods=["POST"])
+    def qa_stream():
+        if g.user is None:
+            return jsonify({"error": "请先登录"}), 401
+        payload = request.get_json(silent=True) or request.form
+        question = (payload.get("question") or "").strip()
+        if not question:
+            return jsonify({"error": "问题不能为空"}), 400
+        history = payload.get("history") if request.is_json else None
+        # 多轮对话的回答依赖上下文，只对单轮提问使用语义缓存
+        cache = None if history else get_answer_cache()
+        if cache is not None:
+            cached = cache.get(question)
+            if cached is not None:
+                def cached_events():
+                    yield _sse("token", {"content": cached.answer})
+                    yield _sse("done", {"cached": True})
+                return Response(cached_events(), mimetype="text/event-stream",
+                                headers={"Cache-Control": "no-cache"})
+
+        messages, content_ids = build_messages(question, history)
+        uid = f"{type(g.user).__name__.lower()}-{g.user.id}"
+
+        def events():
+            # 浏览器断开时 WSGI 服务器关闭本生成器，stream_sync 随之取消上游请求
+            try:
+                tokens = []
+                for token in get_client().stream_sync(messages, uid):
+                    tokens.append(token)
+                    yield _sse("token", {"content": token})
+                if cache is not None:
+                    cache.put(question, "".join(tokens), content_ids)
+                yield _sse("done", {})
+            except SparkBusyError as e:
+                yield _sse("error", {"error": str(e), "busy": True})
+            except SparkError as e:
+                yield _sse("error", {"error": str(e)})
+
+        return Response(stream_with_context(events()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
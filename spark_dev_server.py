@@ -0,0 +1,129 @@
+# 本地模拟的星火 websocket 服务，用于联调和测试 spark_client.py
+#
+# 按星火接口的帧格式逐个 token 回复，不校验签名。问题文本即回复内容的来源：
+# 回复为 "答:" 加问题本身，按字符拆成若干帧，每帧间隔 token_delay 秒。
+# 统计当前/峰值并发数、被客户端中途断开的请求数，可主动断开所有空闲连接以模拟服务端回收连接。
+# malformed=True 时在首帧之后发送一帧非 JSON 数据，用于测试客户端对协议错误的处理。
+#   python spark_dev_server.py --port 8765
+#   SPARKAI_URL=ws://127.0.0.1:8765/v3.5/chat flask run
+import argparse
+import asyncio
+import json
+import threading
+from typing import Optional
+
+from lazy_import import lazy_import
+
+websockets = lazy_import("websockets")
+
+
+def _frame(text: str, status: int, code: int = 0, message: str = "Success") -> str:
+    return json.dumps({
+        "header": {"code": code, "message": message, "status": status},
+        "payload": {"choices": {"status": status, "text": [{"content": text, "role": "assistant"}]}},
+    }, ensure_ascii=False)
+
+
+class SparkDevServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token_delay: float = 0.02,
+                 first_token_delay: float = 0.0, chunk_size: int = 2, malformed: bool = False):
+        self.host = host
+        self.port = port
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.chunk_size = chunk_size
+        self.malformed = malformed
+        self.requests = 0
+        self.active = 0
+        self.peak = 0
+        self.cancelled = 0
+        self._idle = set()
+        self._server = None
+        self._loop = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/v3.5/chat"
+
+    def reply_for(self, question: str) -> str:
+        return "答:" + question
+
+    async def _handler(self, ws):
+        # 连接建立后到收到请求之前视为空闲，close_idle() 会断开这些连接
+        self._idle.add(ws)
+        try:
+            raw = await ws.recv()
+        except websockets.exceptions.ConnectionClosed:
+            return
+        finally:
+            self._idle.discard(ws)
+        request = json.loads(raw)
+        question = request["payload"]["message"]["text"][-1]["content"]
+        self.requests += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.first_token_delay)
+            reply = self.reply_for(question)
+            chunks = [reply[i:i + self.chunk_size] for i in range(0, len(reply), self.chunk_size)]
+            for i, chunk in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(self.token_delay)
+                if i and self.malformed:
+                    await ws.send("{not json")
+                    return
+                await ws.send(_frame(chunk, 2 if i == len(chunks) - 1 else 1))
+        except websockets.exceptions.ConnectionClosed:
+            self.cancelled += 1
+        finally:
+            self.active -= 1
+
+    async def close_idle(self):
+        for ws in list(self._idle):
+            await ws.close()
+
+    def close_idle_sync(self):
+        asyncio.run_coroutine_threadsafe(self.close_idle(), self._loop).result(timeout=5)
+
+    async def serve(self, started: Optional[threading.Event] = None):
+        async with websockets.serve(self._handler, self.host, self.port) as server:
+            self._server = server
+            self.port = next(iter(server.sockets)).getsockname()[1]
+            if started is not None:
+                started.set()
+            await server.wait_closed()
+
+    def start(self) -> "SparkDevServer":
+        """在后台线程中启动，返回后 url 即可连接（port=0 时使用随机端口）"""
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_until_complete, args=(self.serve(self._ready),),
+                         name="spark-dev-server", daemon=True).start()
+        if not self._ready.wait(5):
+            raise RuntimeError("模拟星火服务启动失败")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的星火 websocket 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--token-delay", type=float, default=0.05, help="相邻两帧的间隔（秒）")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="首帧前的等待（秒）")
+    args = parser.parse_args()
+
+    server = SparkDevServer(args.host, args.port, args.token_delay, args.first_token_delay)
+    print(f"模拟星火服务已启动: {server.url}")
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
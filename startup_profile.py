@@ -0,0 +1,85 @@
+# 启动耗时分析：分别统计各模块导入耗时和知识库初始化各阶段耗时
+#
+# 用法：python startup_profile.py [--skip-knowledge-base] [--json startup.json]
+# 更细的导入耗时可配合 python -X importtime startup_profile.py 查看
+import argparse
+import importlib
+import json
+import sys
+import time
+
+# 按依赖顺序导入，后面的模块只统计自身新增的耗时
+IMPORT_STEPS = [
+    "flask",
+    "flask_sqlalchemy",
+    "flask_login",
+    "flask_migrate",
+    "numpy",
+    "models",
+    "faiss_indexer",
+    "knowledge_base",
+    "app",
+]
+
+
+def profile_imports():
+    timings = {}
+    for module_name in IMPORT_STEPS:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            timings[module_name] = {"error": str(e)}
+            continue
+        timings[module_name] = {"seconds": round(time.perf_counter() - start, 3)}
+    # 导入 app 不应触发重量级依赖，否则说明有模块在顶层导入了它们
+    timings["heavy_modules_loaded_at_boot"] = [
+        name for name in ("faiss", "torch", "sentence_transformers") if name in sys.modules
+    ]
+    return timings
+
+
+def profile_knowledge_base(db_path=None, timeout=None):
+    from knowledge_base import KnowledgeBase, KnowledgeBaseNotReady
+
+    kb = KnowledgeBase()
+    kb.start(db_path)
+    try:
+        kb.get_searcher(timeout)
+    except KnowledgeBaseNotReady:
+        pass
+    return kb.status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="应用启动耗时分析")
+    parser.add_argument("--skip-knowledge-base", action="store_true", help="只统计模块导入耗时")
+    parser.add_argument("--db", help="知识库数据库路径，默认使用 config.KNOWLEDGE_BASE_DB")
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    result = {"imports": profile_imports()}
+    print("模块导入耗时：")
+    for name, info in result["imports"].items():
+        if name == "heavy_modules_loaded_at_boot":
+            continue
+        value = f"{info['seconds']:.3f}s" if "seconds" in info else f"失败: {info['error']}"
+        print(f"  {name:<20} {value}")
+    heavy = result["imports"]["heavy_modules_loaded_at_boot"]
+    print(f"启动时已加载的重量级模块：{', '.join(heavy) if heavy else '无'}")
+
+    if not args.skip_knowledge_base:
+        result["knowledge_base"] = profile_knowledge_base(args.db)
+        print(f"知识库初始化（{result['knowledge_base']['state']}）：")
+        for name, seconds in result["knowledge_base"]["timings"].items():
+            print(f"  {name:<30} {seconds:.3f}s")
+        if result["knowledge_base"]["error"]:
+            print(f"  错误: {result['knowledge_base']['error']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
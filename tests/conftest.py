@@ -0,0 +1,108 @@
+import hashlib
+import os
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 测试不连接本机的向量编码服务
+os.environ["EMBEDDING_SERVER_SOCKET"] = ""
+
+
+class HashEncoder:
+    """按文本哈希生成确定性向量，接口与 SentenceTransformer.encode 兼容"""
+
+    def __init__(self, dim: int = 32):
+        self.dim = dim
+        self.calls = 0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, sentences, batch_size=None, convert_to_numpy=True, **kwargs):
+        self.calls += 1
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+            vectors[i] = np.random.default_rng(seed).standard_normal(self.dim)
+        return vectors[0] if single else vectors
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    import faiss_indexer
+    model = HashEncoder()
+    monkeypatch.setattr(faiss_indexer, "load_embedding_model", lambda timings=None: (model, "hash-encoder"))
+    return model
+
+
+@pytest.fixture
+def importer(tmp_path, encoder):
+    from faiss_indexer import BookImporter, IndexConfig
+    importer = BookImporter(str(tmp_path / "books.db"), index_config=IndexConfig())
+    yield importer
+    importer.close()
+
+
+def make_book(chapters: int = 2, sections: int = 3, tag: str = "") -> str:
+    lines = []
+    for chapter in range(1, chapters + 1):
+        lines.append(f"# {chapter} 第{chapter}章{tag}")
+        for section in range(1, sections + 1):
+            lines.append(f"## {chapter}.{section} 小节{tag}")
+            lines.append(f"第 {chapter}.{section} 节正文{tag}，介绍张量与梯度。")
+    return "\n".join(lines)
+
+
+def create_test_app(db_uri: str):
+    """SQLite 上可独立运行的应用部分，按 app.py 的方式注册身份解析钩子、JSON 分页接口和维护命令
+
+    维护命令模块导入 analytics，错题录入时解析知识点的 ORM 事件随之注册，与线上一致
+    """
+    from flask import Flask
+
+    import commands
+    import identity
+    from api import bp as api_bp
+    from exts import db
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=db_uri, SECRET_KEY="test", TESTING=True)
+    db.init_app(app)
+    identity.init_app(app)
+    app.register_blueprint(api_bp)
+    commands.init_app(app)
+    return app
+
+
+@pytest.fixture
+def web_app(tmp_path):
+    """不保持应用上下文，每个测试请求与线上一样使用独立的 session"""
+    from exts import db
+    app = create_test_app(f"sqlite:///{tmp_path / 'app.db'}")
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@contextmanager
+def recorded_queries(app):
+    """记录块内在该应用数据库上执行的 SQL 语句"""
+    from sqlalchemy import event
+
+    from exts import db
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
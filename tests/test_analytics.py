@@ -0,0 +1,74 @@
+import pytest
+
+
+@pytest.fixture
+def ctx(web_app):
+    from exts import db
+    from models import Student
+    with web_app.app_context():
+        db.session.add(Student(id=1, name="学生", email="s@example.com", password="x", student_id="S1"))
+        db.session.commit()
+        yield db.session
+
+
+def topic_counts():
+    import analytics
+    return analytics.topic_wrong_counts().get(1, {})
+
+
+def wrong(text):
+    from models import WrongQuestion
+    return WrongQuestion(student_id=1, question_text=text, correct_answer="A", error_reason="粗心")
+
+
+def test_topic_is_resolved_once_at_insert(ctx):
+    from models import Question
+    wq = wrong("1+1=?")
+    ctx.add(wq)
+    ctx.commit()
+    assert wq.topic == "未分类"
+
+    # 错题录入之后题库才收录同一道题，删除错题时仍按录入时的知识点扣减
+    ctx.add(Question(question_text="1+1=?", topic="代数", correct_answer="2"))
+    ctx.commit()
+    ctx.delete(wq)
+    ctx.commit()
+
+    assert topic_counts() == {}
+
+
+def test_changing_question_text_moves_the_count(ctx):
+    from models import Question
+    ctx.add_all([Question(question_text="x+1=2", topic="方程", correct_answer="1"),
+                 Question(question_text="三角形内角和", topic="几何", correct_answer="180")])
+    wq = wrong("x+1=2")
+    ctx.add(wq)
+    ctx.commit()
+    assert topic_counts() == {"方程": 1}
+
+    wq.question_text = "三角形内角和"
+    ctx.commit()
+    assert wq.topic == "几何"
+    assert topic_counts() == {"几何": 1}
+
+    wq.topic = "代数"
+    ctx.commit()
+    assert topic_counts() == {"代数": 1}
+
+
+def test_rebuild_matches_incremental_counts(ctx):
+    import analytics
+    from exts import db
+    from models import Question, WrongQuestion
+    ctx.add(Question(question_text="1+1=?", topic="代数", correct_answer="2"))
+    ctx.add_all([wrong("1+1=?"), wrong("1+1=?"), wrong("未收录的题")])
+    ctx.commit()
+    # 批量写入不触发事件，也没有知识点，重算时补上
+    ctx.execute(db.insert(WrongQuestion), [{"student_id": 1, "question_text": "1+1=?", "correct_answer": "A",
+                                            "error_reason": "粗心"}])
+    ctx.commit()
+
+    analytics.rebuild_summaries()
+
+    assert topic_counts() == {"代数": 3, "未分类": 1}
+    assert WrongQuestion.query.filter(WrongQuestion.topic.is_(None)).count() == 0
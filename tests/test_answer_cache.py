@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from answer_cache import SemanticAnswerCache
+from conftest import make_book
+from faiss_indexer import BookImporter, IndexConfig
+
+
+def text_ids(importer, book_id):
+    return [row[0] for batch in importer.db.iter_batches(
+        "SELECT id FROM contents WHERE book_id = ? AND content_type = 'text' ORDER BY id", (book_id,))
+        for row in batch]
+
+
+@pytest.fixture
+def book(importer):
+    book_id = importer.import_book("教材", "", make_book())
+    return text_ids(importer, book_id)
+
+
+def test_hit_and_miss(importer, book):
+    cache = SemanticAnswerCache(importer)
+    cache.put("什么是张量", "张量是多维数组", book[:2])
+
+    entry = cache.get("什么是张量")
+    assert entry.answer == "张量是多维数组"
+    assert entry.content_ids == sorted(book[:2])
+    assert cache.get("梯度下降怎么实现") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_empty_cache_misses_without_encoding(importer, encoder):
+    cache = SemanticAnswerCache(importer)
+    calls = encoder.calls
+
+    assert cache.get("什么是张量") is None
+    assert encoder.calls == calls
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_entry_is_removed(importer, book):
+    cache = SemanticAnswerCache(importer, ttl=0.05)
+    cache.put("什么是张量", "张量是多维数组", book[:1])
+    time.sleep(0.1)
+
+    assert cache.get("什么是张量") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted(importer, book):
+    cache = SemanticAnswerCache(importer, max_size=2)
+    cache.put("问题一", "回答一", book[:1])
+    cache.put("问题二", "回答二", book[:1])
+    assert cache.get("问题一").answer == "回答一"
+
+    cache.put("问题三", "回答三", book[:1])
+
+    assert len(cache) == 2
+    assert cache.get("问题二") is None
+    assert cache.get("问题一").answer == "回答一"
+    assert cache.get("问题三").answer == "回答三"
+
+
+def test_delete_contents_invalidates_referencing_entries(importer, book):
+    cache = SemanticAnswerCache(importer)
+    cache.put("什么是张量", "张量是多维数组", [book[0]])
+    cache.put("什么是梯度", "梯度是导数", [book[1]])
+
+    assert importer.delete_contents([book[0]]) == [book[0]]
+
+    assert len(cache) == 1
+    assert cache.get("什么是张量") is None
+    assert cache.get("什么是梯度").answer == "梯度是导数"
+
+
+def test_reimport_by_another_importer_is_detected_on_hit(importer, book):
+    cache = SemanticAnswerCache(importer)
+    cache.put("什么是张量", "张量是多维数组", book[:2])
+
+    # 其他进程重新导入同名教材：本进程的 removal_listeners 收不到通知，命中时按 content id 复查
+    other = BookImporter(importer.db.db_path, index_config=IndexConfig())
+    try:
+        other.import_book("教材", "", make_book(tag="新版"), replace=True)
+    finally:
+        other.close()
+
+    assert cache.get("什么是张量") is None
+    assert len(cache) == 0
@@ -0,0 +1,61 @@
+import pytest
+
+from identity import login_test_client
+
+
+@pytest.fixture
+def people(web_app):
+    from exts import db
+    from models import Student, Teacher
+    with web_app.app_context():
+        db.session.add_all([
+            Teacher(id=1, name="老师", email="t@example.com", password="x", teacher_id="T1"),
+            Student(id=1, name="学生", email="s@example.com", password="x", student_id="S1"),
+        ])
+        db.session.commit()
+    return web_app
+
+
+@pytest.mark.parametrize("path", ["/api/wrong-questions", "/api/tasks"])
+def test_anonymous_request_is_unauthorized(people, path):
+    assert people.test_client().get(path).status_code == 401
+
+
+@pytest.mark.parametrize("path", ["/api/wrong-questions", "/api/tasks"])
+def test_teacher_without_student_id_is_a_bad_request(people, path):
+    client = people.test_client()
+    login_test_client(client, "teacher", 1)
+
+    response = client.get(path)
+
+    assert response.status_code == 400
+    assert "student_id" in response.get_json()["error"]
+    assert client.get(f"{path}?student_id=1").status_code == 200
+
+
+def test_wrong_questions_pages_through_null_timestamps(people):
+    from datetime import datetime
+
+    from exts import db
+    from models import WrongQuestion
+    with people.app_context():
+        for i in range(5):
+            db.session.add(WrongQuestion(student_id=1, question_text=f"题目{i}", correct_answer="A",
+                                         error_reason="粗心", recorded_at=datetime(2026, 10, 10 + i)))
+        db.session.commit()
+        # 旧数据可能没有记录时间
+        db.session.execute(WrongQuestion.__table__.update()
+                           .where(WrongQuestion.id.in_([2, 4])).values(recorded_at=None))
+        db.session.commit()
+    client = people.test_client()
+    login_test_client(client, "student", 1)
+
+    ids, cursor = [], None
+    while True:
+        page = client.get("/api/wrong-questions?limit=2" + (f"&cursor={cursor}" if cursor else "")).get_json()
+        ids.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert ids == [5, 3, 1, 4, 2]
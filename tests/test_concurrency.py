@@ -0,0 +1,124 @@
+import gc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+from conftest import make_book
+from faiss_indexer import ReadWriteLock
+
+THREADS = 16
+
+
+def _queries(n):
+    return [f"张量 梯度 查询 {i}" for i in range(n)]
+
+
+def test_concurrent_search_matches_serial(importer):
+    for i in range(4):
+        importer.import_book(f"教材{i}", "", make_book(chapters=3, sections=5, tag=str(i)))
+    importer.build_faiss_index(save=False)
+    queries = _queries(200)
+    expected = {q: importer.search(q, k=5) for q in queries}
+    filtered = {q: importer.search(q, k=5, filters={"book_id": 2}) for q in queries}
+
+    def worker(offset):
+        mismatches = 0
+        for i in range(400):
+            query = queries[(offset * 37 + i) % len(queries)]
+            # 清掉结果缓存，保证每次都真正进入 faiss 检索与 SQLite 读取
+            importer.search_result_cache.clear()
+            if importer.search(query, k=5) != expected[query]:
+                mismatches += 1
+            if importer.search(query, k=5, filters={"book_id": 2}) != filtered[query]:
+                mismatches += 1
+            importer.db.get_contents(expected[query])
+        return mismatches
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        assert sum(pool.map(worker, range(THREADS))) == 0
+
+
+def test_search_while_index_is_updated(importer):
+    importer.import_book("常驻", "", make_book(chapters=2, sections=4))
+    importer.build_faiss_index(save=False)
+    stable_ids = set(importer.db.get_content_ids(1))
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        try:
+            for round_no in range(20):
+                importer.import_book("临时", "", make_book(tag=f"r{round_no}"), replace=True)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            stop.set()
+
+    def reader(offset):
+        seen = 0
+        while not stop.is_set():
+            for query in _queries(20):
+                ids = importer.search(query, k=3, filters={"book_id": 1})
+                assert set(ids) <= stable_ids
+                seen += 1
+            # 命中结果缓存时读线程是纯 Python 循环，稍作让步，避免写线程长时间抢不到 GIL
+            time.sleep(0.001)
+        return seen
+
+    writer_thread = threading.Thread(target=writer)
+    with ThreadPoolExecutor(THREADS) as pool:
+        futures = [pool.submit(reader, i) for i in range(THREADS)]
+        writer_thread.start()
+        writer_thread.join()
+        assert all(future.result() > 0 for future in futures)
+    assert not errors
+    assert importer.faiss_index.ntotal == importer.db.count_contents("text")
+
+
+def test_reader_connections_closed_when_threads_exit(importer):
+    importer.import_book("教材", "", make_book())
+
+    def short_lived_request():
+        importer.db.get_contents([1, 2, 3])
+
+    for _ in range(100):
+        thread = threading.Thread(target=short_lived_request)
+        thread.start()
+        thread.join()
+    gc.collect()
+    assert importer.db.open_reader_count() <= 1
+
+
+def test_readers_do_not_block_each_other():
+    lock = ReadWriteLock()
+    inside, release = threading.Event(), threading.Event()
+
+    def hold_read():
+        with lock.read():
+            inside.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_read)
+    holder.start()
+    assert inside.wait(5)
+    acquired = threading.Event()
+
+    def second_reader():
+        with lock.read():
+            acquired.set()
+
+    threading.Thread(target=second_reader).start()
+    assert acquired.wait(1)
+
+    written = threading.Event()
+
+    def writer():
+        with lock.write():
+            written.set()
+
+    threading.Thread(target=writer).start()
+    assert not written.wait(0.2)
+    release.set()
+    assert written.wait(5)
+    holder.join()
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import recorded_queries
+
+
+def seed(app, students):
+    from exts import db
+    from models import RecommendedTopic, Student, Task, WrongQuestion
+
+    now = datetime(2026, 10, 1)
+    with app.app_context():
+        for s in range(1, students + 1):
+            db.session.add(Student(id=s, name=f"学生{s}", email=f"s{s}@example.com", password="x",
+                                   student_id=f"S{s}"))
+            for j in range(3):
+                db.session.add(WrongQuestion(student_id=s, question_text=f"题目{j}", correct_answer="A",
+                                             error_reason="概念混淆", recorded_at=now + timedelta(minutes=j)))
+                db.session.add(Task(student_id=s, name=f"任务{j}", completed=j == 0))
+            for j in range(2):
+                db.session.add(RecommendedTopic(student_id=s, topics_json=f'["知识点{j}"]',
+                                                updated_at=now + timedelta(days=j)))
+        db.session.commit()
+
+
+@pytest.mark.parametrize("students", [3, 60])
+def test_overviews_use_a_fixed_number_of_queries(web_app, students):
+    import dashboard_queries
+    seed(web_app, students)
+
+    with web_app.app_context(), recorded_queries(web_app) as statements:
+        overviews = dashboard_queries.load_student_overviews()
+        for overview in overviews:
+            assert len(overview.wrong_questions) == 3
+            assert overview.wrong_questions[0].question_text == "题目2"
+            assert sum(task.completed for task in overview.tasks) == 1
+            assert overview.topics == ["知识点1"]
+            assert overview.student.name
+
+    assert len(overviews) == students
+    assert len(statements) == 4
+
+
+@pytest.mark.parametrize("students", [3, 60])
+def test_summaries_use_a_single_query(web_app, students):
+    import dashboard_queries
+    seed(web_app, students)
+
+    with web_app.app_context(), recorded_queries(web_app) as statements:
+        summaries = dashboard_queries.student_summaries()
+
+    assert [(s.wrong_count, s.task_count, s.completed_task_count) for s in summaries] == [(3, 3, 1)] * students
+    assert len(statements) == 1
+
+
+def test_summaries_limit_is_applied_in_the_query(web_app):
+    import dashboard_queries
+    seed(web_app, 60)
+
+    with web_app.app_context(), recorded_queries(web_app) as statements:
+        summaries = dashboard_queries.student_summaries(limit=50)
+
+    assert [s.student_id for s in summaries] == list(range(1, 51))
+    assert all(s.wrong_count == 3 for s in summaries)
+    assert len(statements) == 1
+    assert "LIMIT" in statements[0].upper()
@@ -0,0 +1,86 @@
+import numpy as np
+
+import dedup
+from faiss_indexer import BookImporter, IndexConfig
+
+BOOK_A = "# 1 第1章\n## 1.1 小节\n张量是多维数组。\n## 1.2 小节\n张量是多维数组。\n## 1.3 小节\n梯度下降。"
+BOOK_B = "# 1 第1章\n## 1.1 小节\n张量是多维数组。"
+
+
+def text_ids(importer, book_id):
+    return [row[0] for batch in importer.db.iter_batches(
+        "SELECT id FROM contents WHERE book_id = ? AND content_type = 'text' ORDER BY id", (book_id,))
+        for row in batch]
+
+
+def find_and_merge(importer):
+    clusters = list(dedup.find_near_duplicates(dedup.content_batches(importer), importer, 0.99))
+    return clusters, dedup.merge_content_duplicates(importer, clusters)
+
+
+def test_merges_only_within_the_same_book(importer):
+    book_a = importer.import_book("A", "", BOOK_A)
+    book_b = importer.import_book("B", "", BOOK_B)
+    importer.build_faiss_index(save=False)
+    a_ids, b_ids = text_ids(importer, book_a), text_ids(importer, book_b)
+    removed_events = []
+    importer.removal_listeners.append(removed_events.append)
+
+    clusters, (removed, skipped) = find_and_merge(importer)
+
+    assert [cluster["size"] for cluster in clusters] == [3]
+    assert (removed, skipped) == (1, 0)
+    assert removed_events == [[a_ids[1]]]
+    assert text_ids(importer, book_a) == [a_ids[0], a_ids[2]]
+    assert text_ids(importer, book_b) == b_ids
+    assert importer.faiss_index.ntotal == 3
+    assert importer.search("张量是多维数组。", k=1, filters={"book_id": book_b}) == [b_ids[0]]
+
+
+def test_hnsw_index_is_rebuilt_once(tmp_path, encoder, monkeypatch):
+    importer = BookImporter(str(tmp_path / "books.db"), index_config=IndexConfig(index_type="hnsw"))
+    try:
+        for i in range(3):
+            importer.import_book(f"书{i}", "", BOOK_A.replace("梯度下降", f"梯度下降{i}"), update_index=False)
+        # 同一本书内再制造大量重复块，删除数超过旧实现的 500 条分段
+        importer.import_book("大书", "", "# 1 第1章\n" + "".join(
+            f"## 1.{i} 小节\n重复段落。\n" for i in range(1, 1202)), update_index=False)
+        importer.build_faiss_index(save=False)
+        builds = []
+        original = importer.build_faiss_index
+        monkeypatch.setattr(importer, "build_faiss_index",
+                            lambda *args, **kwargs: builds.append(1) or original(*args, **kwargs))
+
+        _, (removed, _) = find_and_merge(importer)
+
+        assert removed == 3 + 1200
+        assert len(builds) == 1
+        assert importer.faiss_index.ntotal == importer.db.count_contents("text")
+    finally:
+        importer.close()
+
+
+def test_asymmetric_range_search_still_finds_pairs(importer, monkeypatch):
+    book = importer.import_book("A", "", BOOK_A)
+    original = dedup.create_faiss_index
+
+    def one_sided_index(vectors, index_config):
+        # 模拟近似索引的不对称结果：每次查询只返回 id 最小的一条，id 较小的一端查不到另一端
+        index = original(vectors, index_config)
+        range_search = index.range_search
+
+        def search(x, radius):
+            lims, distances, labels = range_search(x, radius)
+            kept = [lims[i] + int(np.argmin(labels[lims[i]:lims[i + 1]])) for i in range(len(x))
+                    if lims[i + 1] > lims[i]]
+            counts = [1 if lims[i + 1] > lims[i] else 0 for i in range(len(x))]
+            return np.concatenate([[0], np.cumsum(counts)]), distances[kept], labels[kept]
+
+        index.range_search = search
+        return index
+
+    monkeypatch.setattr(dedup, "create_faiss_index", one_sided_index)
+    clusters = list(dedup.find_near_duplicates(dedup.content_batches(importer), importer, 0.99))
+
+    a_ids = text_ids(importer, book)
+    assert clusters == [{"canonical": a_ids[0], "duplicates": [a_ids[1]], "size": 2}]
@@ -0,0 +1,90 @@
+import pytest
+
+from conftest import HashEncoder, make_book
+from embedding_server import EmbeddingClient, EmbeddingServerError, EmbeddingServerUnavailable, MicroBatcher
+
+
+class BrokenClient(EmbeddingClient):
+    def __init__(self, error):
+        super().__init__("/nonexistent.sock")
+        self.error = error
+
+    def encode(self, sentences, batch_size=None, convert_to_numpy=True, **kwargs):
+        raise self.error
+
+
+class PickyEncoder(HashEncoder):
+    """含有"坏"字的文本编码失败，记录每次 encode 的文本数"""
+
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def encode(self, sentences, batch_size=None, convert_to_numpy=True, **kwargs):
+        self.batch_sizes.append(len(sentences))
+        if any("坏" in text for text in sentences):
+            raise ValueError("无法编码")
+        return super().encode(sentences)
+
+
+@pytest.fixture
+def indexed(importer):
+    importer.import_book("教材", "", make_book())
+    importer.build_faiss_index(save=False)
+    return importer
+
+
+def test_falls_back_when_server_is_unreachable(indexed):
+    indexed.embedding_model = BrokenClient(EmbeddingServerUnavailable("连接被拒绝"))
+    expected = indexed.search_batch(["张量"])[1]
+    indexed.search_result_cache.clear()
+    indexed.query_embedding_cache.clear()
+
+    assert indexed.search_batch(["张量"])[1].tolist() == expected.tolist()
+    assert isinstance(indexed.embedding_model, HashEncoder)
+    assert indexed.embedding_model_name == "hash-encoder"
+
+
+def test_request_error_does_not_switch_model(indexed):
+    client = BrokenClient(EmbeddingServerError("文本过长"))
+    indexed.embedding_model = client
+
+    with pytest.raises(EmbeddingServerError):
+        indexed.search_batch(["新的查询"])
+    assert indexed.embedding_model is client
+
+
+def test_refuses_fallback_to_a_different_model(indexed, monkeypatch):
+    import faiss_indexer
+    monkeypatch.setattr(faiss_indexer, "load_embedding_model", lambda timings=None: (HashEncoder(), "other-model"))
+    client = BrokenClient(EmbeddingServerUnavailable("连接被拒绝"))
+    indexed.embedding_model = client
+
+    with pytest.raises(EmbeddingServerError, match="不一致"):
+        indexed.search_batch(["新的查询"])
+    assert indexed.embedding_model is client
+    assert indexed.embedding_model_name == "hash-encoder"
+
+
+def test_refuses_fallback_with_a_different_dimension(indexed, monkeypatch):
+    import faiss_indexer
+    monkeypatch.setattr(faiss_indexer, "load_embedding_model",
+                        lambda timings=None: (HashEncoder(dim=16), "hash-encoder"))
+    indexed.embedding_model = BrokenClient(EmbeddingServerUnavailable("连接被拒绝"))
+
+    with pytest.raises(EmbeddingServerError, match="维度"):
+        indexed.search_batch(["新的查询"])
+
+
+def test_failed_batch_only_fails_the_bad_request():
+    model = PickyEncoder()
+    batcher = MicroBatcher(model, max_batch_size=64, max_wait=0.5)
+
+    good = batcher.submit(["张量", "变量"])
+    bad = batcher.submit(["坏文本"])
+
+    assert good.result(timeout=5).tolist() == HashEncoder().encode(["张量", "变量"]).tolist()
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
+    # 先合并编码一次，失败后逐个请求重新编码
+    assert model.batch_sizes == [3, 2, 1]
@@ -0,0 +1,59 @@
+import pytest
+
+from conftest import recorded_queries
+from identity import login_test_client
+
+
+@pytest.fixture
+def student_app(web_app):
+    from flask import g
+    from flask_login import current_user
+
+    from exts import db
+    from models import Student
+
+    with web_app.app_context():
+        db.session.add(Student(id=1, name="学生", email="s@example.com", password="x", student_id="S1"))
+        db.session.commit()
+
+    # 视图同时使用 g.user 和 flask-login 的 current_user
+    @web_app.route("/whoami")
+    def whoami():
+        assert current_user.id == g.user.id
+        return {"id": g.user.id}
+
+    return web_app
+
+
+@pytest.fixture
+def user_queries(student_app):
+    with recorded_queries(student_app) as statements:
+        yield statements
+
+
+def count_user_queries(client, path, statements):
+    counts = []
+    for _ in range(3):
+        statements.clear()
+        assert client.get(path).status_code == 200
+        counts.append(sum("FROM student" in statement or "FROM teacher" in statement for statement in statements))
+    return counts
+
+
+def test_one_user_query_per_request_without_cache(student_app, user_queries):
+    client = student_app.test_client()
+    login_test_client(client, "student", 1)
+
+    assert count_user_queries(client, "/whoami", user_queries) == [1, 1, 1]
+    assert count_user_queries(client, "/api/tasks", user_queries) == [1, 1, 1]
+
+
+def test_cached_user_needs_no_query(student_app, user_queries, monkeypatch):
+    import identity
+    from cache import LRUCache
+    monkeypatch.setattr(identity, "user_cache", LRUCache(16, 60))
+    client = student_app.test_client()
+    login_test_client(client, "student", 1)
+
+    assert count_user_queries(client, "/whoami", user_queries) == [1, 0, 0]
+    assert count_user_queries(client, "/api/tasks", user_queries) == [0, 0, 0]
@@ -0,0 +1,40 @@
+import pytest
+
+from conftest import make_book
+
+
+def _failing_lines(book: str):
+    for i, line in enumerate(book.split("\n")):
+        if i == 5:
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+        yield line
+
+
+def test_replace_keeps_old_book_when_new_content_fails(importer):
+    book_id = importer.import_book("教材", "", make_book())
+    importer.build_faiss_index()
+    old_ids = importer.db.get_content_ids(book_id)
+    vectors = importer.faiss_index.ntotal
+
+    rows = importer.parser.iter_book_rows(_failing_lines(make_book(tag="v2")))
+    with pytest.raises(UnicodeDecodeError):
+        importer._import_rows("教材", "", rows, replace=True, update_index=True)
+
+    assert importer.db.get_book_id("教材") == book_id
+    assert importer.db.get_content_ids(book_id) == old_ids
+    assert importer.faiss_index.ntotal == vectors
+
+
+def test_replace_swaps_book_and_index(importer):
+    removed = []
+    importer.removal_listeners.append(removed.extend)
+    old_id = importer.import_book("教材", "", make_book())
+    importer.build_faiss_index()
+    old_ids = importer.db.get_content_ids(old_id)
+
+    new_id = importer.import_book("教材", "", make_book(tag="v2"), replace=True)
+
+    assert new_id != old_id
+    assert sorted(removed) == sorted(old_ids)
+    assert importer.db.get_content_ids(old_id) == []
+    assert importer.faiss_index.ntotal == importer.db.count_contents("text")
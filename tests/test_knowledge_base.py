@@ -0,0 +1,105 @@
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from conftest import HashEncoder, make_book
+
+
+@pytest.fixture
+def embedding_server(tmp_path, monkeypatch):
+    import config
+    from embedding_server import EmbeddingServer
+    socket_path = str(tmp_path / "embedding.sock")
+    server = EmbeddingServer(socket_path, HashEncoder(), "hash-encoder")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(config, "EMBEDDING_SERVER_SOCKET", socket_path)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sentence_transformers_sentinel(monkeypatch):
+    """用记录属性访问的假模块替换 sentence_transformers，无论真实的包是否安装都能检测到使用"""
+    import faiss_indexer
+    from lazy_import import lazy_import
+    accessed = []
+    sentinel = types.ModuleType("sentence_transformers")
+    sentinel.__getattr__ = lambda name: accessed.append(name)
+    monkeypatch.setitem(sys.modules, "sentence_transformers", sentinel)
+    monkeypatch.setattr(faiss_indexer, "sentence_transformers", lazy_import("sentence_transformers"))
+    return accessed
+
+
+def test_initialize_with_server_does_not_import_sentence_transformers(tmp_path, embedding_server,
+                                                                       sentence_transformers_sentinel):
+    import faiss_indexer
+    from faiss_indexer import BookImporter, IndexConfig
+    from knowledge_base import STATE_READY, KnowledgeBase
+
+    db_path = str(tmp_path / "books.db")
+    importer = BookImporter(db_path, index_config=IndexConfig())
+    importer.import_book("教材", "", make_book())
+    importer.close()
+
+    kb = KnowledgeBase(db_path)
+    searcher = kb.get_searcher(timeout=30)
+
+    assert kb.state == STATE_READY
+    assert searcher.search("张量")
+    assert sentence_transformers_sentinel == []
+    assert not faiss_indexer.sentence_transformers.is_loaded
+    assert "import_sentence_transformers" not in kb.timings
+    assert "import_faiss" in kb.timings
+
+
+def test_failed_initialization_is_retried_after_backoff(tmp_path, encoder, monkeypatch):
+    import faiss_indexer
+    from faiss_indexer import BookImporter, FaissBookSearcher, IndexConfig
+    from knowledge_base import STATE_FAILED, STATE_READY, KnowledgeBase, KnowledgeBaseNotReady
+
+    db_path = str(tmp_path / "books.db")
+    importer = BookImporter(db_path, index_config=IndexConfig())
+    importer.import_book("教材", "", make_book())
+    importer.close()
+    attempts = []
+
+    def flaky_searcher(path):
+        attempts.append(path)
+        if len(attempts) == 1:
+            raise OSError("索引文件暂时不可读")
+        return FaissBookSearcher(path)
+
+    monkeypatch.setattr(faiss_indexer, "FaissBookSearcher", flaky_searcher)
+    kb = KnowledgeBase(db_path, retry_delay=0.2)
+    with pytest.raises(KnowledgeBaseNotReady, match="暂时不可读"):
+        kb.get_searcher(timeout=30)
+    assert kb.state == STATE_FAILED
+
+    # 退避时间内不重试
+    with pytest.raises(KnowledgeBaseNotReady):
+        kb.get_searcher(timeout=30)
+    assert len(attempts) == 1
+
+    time.sleep(0.25)
+    assert kb.get_searcher(timeout=30).search("张量")
+    assert kb.state == STATE_READY
+    assert len(attempts) == 2
+
+
+def test_get_importer_does_not_load_the_searcher(tmp_path, encoder, monkeypatch):
+    import knowledge_base
+    from knowledge_base import STATE_PENDING, KnowledgeBase
+
+    kb = KnowledgeBase(str(tmp_path / "books.db"))
+    monkeypatch.setattr(knowledge_base, "knowledge_base", kb)
+    importer = knowledge_base.get_importer()
+    try:
+        assert importer.embed_contents(["张量"]).shape == (1, encoder.dim)
+        assert importer.faiss_index is None
+        assert kb.state == STATE_PENDING
+    finally:
+        importer.close()
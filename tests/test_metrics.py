@@ -0,0 +1,120 @@
+import time
+
+import pytest
+
+import metrics
+
+
+def series(histogram, *labels):
+    """返回 (次数, 总和)，没有观测值时为 (0, 0)"""
+    _, total, count = histogram._series.get(labels, (None, 0, 0))
+    return count, total
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    def make(**config):
+        from flask import Flask, Response, stream_with_context
+        from sqlalchemy import text
+
+        from exts import db
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'metrics.db'}", TESTING=True, **config)
+        db.init_app(app)
+        metrics.init_app(app)
+
+        @app.route("/two-queries")
+        def two_queries():
+            db.session.execute(text("SELECT 1"))
+            db.session.execute(text("SELECT 2"))
+            return "ok"
+
+        @app.route("/streamed")
+        def streamed():
+            def events():
+                for i in range(3):
+                    yield f"data: {db.session.execute(text('SELECT :i'), {'i': i}).scalar()}\n\n"
+            return Response(stream_with_context(events()), mimetype="text/event-stream")
+
+        @app.route("/slow")
+        def slow():
+            time.sleep(0.2)
+            return "ok"
+
+        return app
+    return make
+
+
+def test_histogram_and_counter_render_prometheus_text():
+    histogram = metrics.Histogram("test_seconds", "测试耗时", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, "encode")
+    histogram.observe(0.5, "encode")
+    counter = metrics.Counter("test_total", "测试次数", ["path"])
+    counter.inc('a"b')
+    counter.inc('a"b', amount=2)
+
+    assert list(histogram.render()) == [
+        "# HELP test_seconds 测试耗时",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="encode",le="0.1"} 1',
+        'test_seconds_bucket{stage="encode",le="1"} 2',
+        'test_seconds_bucket{stage="encode",le="+Inf"} 2',
+        'test_seconds_sum{stage="encode"} 0.55',
+        'test_seconds_count{stage="encode"} 2',
+    ]
+    assert list(counter.render())[2] == 'test_total{path="a\\"b"} 3'
+
+
+def test_metrics_endpoint_serves_the_registry(make_app):
+    client = make_app().test_client()
+    client.get("/two-queries")
+
+    response = client.get("/metrics")
+
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert "# TYPE edu_request_sql_queries histogram" in body
+    assert 'edu_requests_total{endpoint="two_queries",method="GET",status="200"}' in body
+
+
+def test_sql_queries_are_counted_per_request(make_app):
+    client = make_app().test_client()
+    before = series(metrics.request_sql_queries, "two_queries")
+
+    assert client.get("/two-queries").status_code == 200
+
+    count, total = series(metrics.request_sql_queries, "two_queries")
+    assert (count - before[0], total - before[1]) == (1, 2)
+
+
+def test_streamed_response_counts_sql_when_closed(make_app):
+    client = make_app().test_client()
+    before = series(metrics.request_sql_queries, "streamed")
+
+    response = client.get("/streamed")
+    assert response.get_data(as_text=True) == "data: 0\n\ndata: 1\n\ndata: 2\n\n"
+    response.close()
+
+    count, total = series(metrics.request_sql_queries, "streamed")
+    assert (count - before[0], total - before[1]) == (1, 3)
+
+
+def test_server_timing_header_requires_the_flag(make_app):
+    assert "Server-Timing" not in make_app().test_client().get("/two-queries").headers
+
+    header = make_app(SERVER_TIMING_HEADER=True).test_client().get("/two-queries").headers["Server-Timing"]
+    assert header.startswith('sql;dur=')
+    assert 'desc="2 queries"' in header
+
+
+def test_slow_requests_are_profiled(make_app, tmp_path):
+    profile_dir = tmp_path / "profiles"
+    client = make_app(PROFILE_SLOW_REQUEST_MS=100, PROFILE_DIR=str(profile_dir)).test_client()
+
+    client.get("/two-queries")
+    assert not profile_dir.exists() or not list(profile_dir.iterdir())
+
+    client.get("/slow")
+    profiles = [path.name for path in profile_dir.iterdir()]
+    assert len(profiles) == 1
+    assert "-slow-" in profiles[0] and profiles[0].endswith(".prof")
@@ -0,0 +1,90 @@
+import os
+
+import pytest
+import sqlalchemy as sa
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+
+@pytest.fixture
+def migrate_app(tmp_path):
+    from flask import Flask
+    from flask_migrate import Migrate
+
+    import models  # noqa: F401 注册模型
+    from exts import db
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'app.db'}")
+    db.init_app(app)
+    Migrate(app, db, directory=MIGRATIONS)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def upgrade():
+    from flask_migrate import upgrade as flask_db_upgrade
+    flask_db_upgrade(directory=MIGRATIONS)
+
+
+def test_upgrade_creates_model_tables_and_indexes(migrate_app):
+    from exts import db
+
+    upgrade()
+
+    inspector = sa.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        assert inspector.has_table(table.name), table.name
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= existing, table.name
+
+
+def test_upgrade_skips_structure_added_by_the_old_upgrade_command(migrate_app):
+    from exts import db
+
+    # 旧的 flask upgrade-db 已按模型建好全部表和索引，但没有 alembic_version
+    db.create_all()
+    upgrade()
+
+    with db.engine.connect() as connection:
+        assert connection.execute(sa.text("SELECT count(*) FROM alembic_version")).scalar() == 1
+
+
+def test_models_match_migrations(migrate_app):
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+
+    from exts import db
+
+    upgrade()
+
+    with db.engine.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), db.metadata) == []
+
+
+def test_practice_history_duplicates_are_merged_before_adding_the_constraint(migrate_app):
+    from datetime import date
+
+    from flask_migrate import upgrade as flask_db_upgrade
+
+    from exts import db
+
+    flask_db_upgrade(directory=MIGRATIONS, revision="f372727d9876")
+    rows = [(1, 1, 2, date(2026, 10, 1)), (2, 1, 3, date(2026, 10, 1)), (3, 1, 0, date(2026, 10, 1)),
+            (4, 1, 5, date(2026, 10, 2)), (5, 2, 1, date(2026, 10, 1))]
+    with db.engine.begin() as connection:
+        connection.execute(sa.text("INSERT INTO student (id, name, email, password, student_id) VALUES "
+                                   "(1, 'a', 'a@x', 'x', 'S1'), (2, 'b', 'b@x', 'x', 'S2')"))
+        for row in rows:
+            connection.execute(sa.text("INSERT INTO practice_history (id, student_id, count, date) "
+                                       "VALUES (:id, :student_id, :count, :date)"),
+                               dict(zip(("id", "student_id", "count", "date"), row)))
+
+    upgrade()
+
+    with db.engine.connect() as connection:
+        merged = connection.execute(sa.text("SELECT id, student_id, count FROM practice_history ORDER BY id")).all()
+    assert [tuple(row) for row in merged] == [(1, 1, 5), (4, 1, 5), (5, 2, 1)]
+    constraints = sa.inspect(db.engine).get_unique_constraints("practice_history")
+    assert "uq_practice_history_student_date" in {constraint["name"] for constraint in constraints}
@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import recorded_queries
+
+
+@pytest.fixture
+def student(web_app):
+    from exts import db
+    from models import Student
+    with web_app.app_context():
+        db.session.add(Student(id=1, name="学生", email="s@example.com", password="x", student_id="S1"))
+        db.session.commit()
+        yield 1
+
+
+def practice_counts():
+    from exts import db
+    from models import PracticeHistory
+    return db.session.query(PracticeHistory.date, PracticeHistory.count).order_by(PracticeHistory.date).all()
+
+
+def test_record_practice_accumulates_one_row_per_day(student):
+    from exts import db
+    from models import PracticeHistory
+
+    PracticeHistory.record_practice(student, day=date(2026, 10, 12))
+    PracticeHistory.record_practice(student, count=2, day=date(2026, 10, 12))
+    PracticeHistory.record_practice(student, day=date(2026, 10, 13))
+    db.session.commit()
+
+    assert practice_counts() == [(date(2026, 10, 12), 3), (date(2026, 10, 13), 1)]
+
+
+def test_update_or_insert_fallback(student):
+    from exts import db
+    from models import PracticeHistory, update_or_insert
+
+    connection = db.session.connection()
+    keys = {"student_id": student, "date": date(2026, 10, 12)}
+    update_or_insert(connection, PracticeHistory.__table__, keys, {"count": 1})
+    update_or_insert(connection, PracticeHistory.__table__, keys, {"count": 4})
+    db.session.commit()
+
+    assert practice_counts() == [(date(2026, 10, 12), 5)]
+
+
+def test_record_practice_leaves_the_commit_to_the_caller(student):
+    from exts import db
+    from models import PracticeHistory
+
+    PracticeHistory.record_practice(student, day=date(2026, 10, 12))
+    db.session.rollback()
+
+    assert practice_counts() == []
+
+
+def test_weekly_practice_fills_missing_days_without_writing(web_app, student):
+    from exts import db
+    from models import PracticeHistory
+
+    today = PracticeHistory._today()
+    PracticeHistory.record_practice(student, count=2, day=today - timedelta(days=1))
+    db.session.commit()
+
+    with recorded_queries(web_app) as statements:
+        weekly = PracticeHistory.get_weekly_practice(student)
+
+    assert weekly["data"] == [0, 0, 0, 0, 0, 2, 0]
+    assert weekly["labels"][-1] == today.strftime("%m-%d")
+    assert all(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+    assert practice_counts() == [(today - timedelta(days=1), 2)]
+
+
+def test_weekly_practice_for_students_uses_one_group_by(web_app, student):
+    from exts import db
+    from models import PracticeHistory, Student
+
+    for student_id in (2, 3):
+        db.session.add(Student(id=student_id, name="学生", email=f"s{student_id}@example.com",
+                               password="x", student_id=f"S{student_id}"))
+        PracticeHistory.record_practice(student_id, count=student_id)
+    db.session.commit()
+
+    with recorded_queries(web_app) as statements:
+        weekly = PracticeHistory.get_weekly_practice_for_students([1, 2, 3])
+
+    assert len(statements) == 1
+    assert "GROUP BY" in statements[0].upper()
+    assert [weekly[student_id]["data"][-1] for student_id in (1, 2, 3)] == [0, 2, 3]
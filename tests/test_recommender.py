@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from conftest import HashEncoder
+
+
+class ContentEncoder(HashEncoder):
+    def embed_contents(self, texts):
+        return self.encode(list(texts))
+
+
+@pytest.fixture
+def bank(web_app):
+    from exts import db
+    from models import Question, Student, WrongQuestion
+    with web_app.app_context():
+        db.session.add_all([Student(id=s, name=f"学生{s}", email=f"s{s}@example.com", password="x",
+                                    student_id=f"S{s}") for s in (1, 2)])
+        db.session.add_all([Question(id=i, question_text=f"题目{i}", topic="代数" if i % 2 else "几何",
+                                     correct_answer="A") for i in range(1, 9)])
+        db.session.add_all([WrongQuestion(student_id=s, question_text=f"题目{s}", correct_answer="A",
+                                          error_reason="粗心") for s in (1, 2)])
+        db.session.commit()
+        yield db.session
+
+
+@pytest.fixture
+def recommender(bank):
+    from recommender import TopicRecommender
+    return TopicRecommender(encoder=ContentEncoder(), top_topics=2)
+
+
+def test_unchanged_students_are_skipped(recommender):
+    first = {student_id: rec.fingerprint for student_id, rec in recommender.recommend().items()}
+    calls = recommender.encoder.calls
+
+    second = {student_id: rec.fingerprint for student_id, rec in recommender.recommend().items()}
+
+    assert second == first
+    assert recommender.encoder.calls == calls
+
+
+def test_editing_the_bank_invalidates_recommendations(recommender, bank):
+    from models import Question
+    before = recommender.recommend()[1]
+    fingerprint = before.fingerprint
+
+    # 题目数量与最大 id 都不变，只调整知识点
+    for question in Question.query:
+        question.topic = "函数"
+    bank.commit()
+    after = recommender.recommend()[1]
+
+    assert after.fingerprint != fingerprint
+    assert json.loads(after.topics_json) == ["函数"]
+
+
+def test_editing_a_wrong_question_invalidates_only_that_student(recommender, bank):
+    from models import WrongQuestion
+    fingerprints = {student_id: rec.fingerprint for student_id, rec in recommender.recommend().items()}
+
+    wrong = WrongQuestion.query.filter_by(student_id=1).one()
+    wrong.error_reason = "概念混淆"
+    bank.commit()
+    after = {student_id: rec.fingerprint for student_id, rec in recommender.recommend().items()}
+
+    assert after[1] != fingerprints[1]
+    assert after[2] == fingerprints[2]
+
+
+def test_every_copy_of_a_wrong_question_is_excluded(recommender, bank):
+    from models import Question
+    bank.add(Question(id=9, question_text="题目1", topic="代数", correct_answer="A"))
+    bank.commit()
+
+    question_ids = json.loads(recommender.recommend([1])[1].question_ids_json)
+
+    assert sorted(question_ids) == [2, 3, 4, 5, 6, 7, 8]
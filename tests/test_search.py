@@ -0,0 +1,41 @@
+from conftest import make_book
+from faiss_indexer import FaissBookSearcher
+
+
+def _searcher(importer):
+    searcher = FaissBookSearcher.__new__(FaissBookSearcher)
+    searcher.importer = importer
+    return searcher
+
+
+def test_only_text_blocks_are_indexed(importer):
+    importer.import_book("教材", "", make_book())
+    importer.build_faiss_index(save=False)
+    title_ids = {row[0] for row in importer.db._read("SELECT id FROM contents WHERE content_type = 'title'")}
+
+    assert importer.faiss_index.ntotal == importer.db.count_contents("text")
+    results = _searcher(importer).search(["小节 张量", "第1章"], k=10)
+    assert results and not {item["id"] for item in results} & title_ids
+
+
+def test_content_type_filter_is_resolved_without_selector(importer):
+    importer.import_book("教材", "", make_book())
+    importer.build_faiss_index(save=False)
+
+    assert importer.search("张量", filters={"content_type": "text"}) == importer.search("张量")
+    assert importer.search("张量", filters={"content_type": "title"}) == []
+    assert len(importer.selector_cache) == 0
+
+
+def test_selector_is_cached_per_scope_and_index_version(importer):
+    book_id = importer.import_book("教材", "", make_book())
+    importer.import_book("另一本", "", make_book(tag="b"))
+    importer.build_faiss_index(save=False)
+    scope = (("book_id", (book_id,)),)
+
+    _, selector = importer._search_params(scope)
+    assert importer._search_params(scope)[1] is selector
+    assert set(importer.search("张量", k=20, filters={"book_id": book_id})) <= set(importer.db.get_content_ids(book_id))
+
+    importer.import_book("第三本", "", make_book(tag="c"))
+    assert importer._search_params(scope)[1] is not selector
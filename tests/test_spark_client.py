@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("websockets")
+
+from spark_client import SparkBusyError, SparkError, SparkStreamClient, SparkTimeoutError  # noqa: E402
+from spark_dev_server import SparkDevServer  # noqa: E402
+
+
+@pytest.fixture
+def spark():
+    """返回 start(server 参数, client 参数) -> (server, client)，测试结束后统一关闭"""
+    started = []
+
+    def start(server_options=None, **client_options):
+        server = SparkDevServer(**(server_options or {})).start()
+        client = SparkStreamClient(server.url, "app", "key", "secret", "generalv3.5", **client_options)
+        started.append((server, client))
+        return server, client
+
+    yield start
+    for server, client in started:
+        client.close()
+        server.stop()
+
+
+def ask(question):
+    return [{"role": "user", "content": question}]
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_streams_tokens_in_order(spark):
+    server, client = spark()
+
+    tokens = list(client.stream_sync(ask("什么是张量")))
+
+    assert len(tokens) > 1
+    assert "".join(tokens) == "答:什么是张量"
+    assert server.requests == 1
+
+
+def test_concurrency_limit_queues_then_reports_busy(spark):
+    server, client = spark({"token_delay": 0.1}, max_concurrency=2, queue_timeout=0.1, warm_connections=0)
+    results = []
+
+    def run():
+        try:
+            results.append("".join(client.stream_sync(ask("一个比较长的问题"))))
+        except SparkBusyError:
+            results.append("busy")
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert server.peak == 2
+    assert results.count("busy") == 2
+    assert results.count("答:一个比较长的问题") == 2
+
+
+def test_first_token_timeout(spark):
+    _, client = spark({"first_token_delay": 0.5}, first_token_timeout=0.1)
+
+    with pytest.raises(SparkTimeoutError):
+        list(client.stream_sync(ask("慢问题")))
+
+
+def test_closing_the_stream_cancels_upstream_and_frees_the_slot(spark):
+    server, client = spark({"token_delay": 0.2}, max_concurrency=1, queue_timeout=0.5)
+
+    tokens = client.stream_sync(ask("学生中途离开页面"))
+    next(tokens)
+    tokens.close()
+
+    assert wait_until(lambda: server.cancelled == 1)
+    assert wait_until(lambda: server.active == 0)
+    server.token_delay = 0
+    assert "".join(client.stream_sync(ask("下一位"))) == "答:下一位"
+
+
+def test_retries_once_when_pooled_connection_was_closed(spark):
+    server, client = spark(warm_connections=1)
+    assert "".join(client.stream_sync(ask("第一问"))) == "答:第一问"
+    assert wait_until(lambda: len(client._spare) == 1)
+
+    # 服务端回收空闲连接后，下一次请求取到的预热连接已失效
+    server.close_idle_sync()
+    assert "".join(client.stream_sync(ask("第二问"))) == "答:第二问"
+    assert server.requests == 2
+
+
+def test_malformed_frame_raises_spark_error(spark):
+    _, client = spark({"malformed": True})
+    tokens = []
+
+    with pytest.raises(SparkError, match="无法解析"):
+        for token in client.stream_sync(ask("坏帧")):
+            tokens.append(token)
+    assert tokens == ["答:"]